@@ -1,6 +1,83 @@
+import heapq
+import numpy as np
 import simpy
 from modular.Players import Customer
 
+
+def fifo_policy(customers_in_waitlist:list) -> int:
+    """First come, first served: take the customer who waited longest out of the waitlist.
+
+    `Queue.run` with this policy uses the batch engine (see `Queue._run_batch`).
+
+    Args:
+        customers_in_waitlist (list): Waiting customers as (customer_id, customer_data), in arrival order.
+
+    Returns:
+        int: customer_id of the chosen customer.
+    """
+    customer_id, _ = customers_in_waitlist.pop(0)
+    return customer_id
+
+
+def draw(generator, size:int) -> np.ndarray:
+    """Draw `size` numbers from a generator, in one call if it has a `batch` method (see Number_Generator).
+
+    Args:
+        generator (callable): Generator of numbers, e.g. Number_Generator.Exponential_Generator.
+        size (int): How many numbers to draw.
+
+    Returns:
+        np.ndarray: The numbers, in the order `size` calls would give them.
+    """
+    if hasattr(generator, "batch"):
+        return np.asarray(generator.batch(size), dtype=float)
+    return np.array([generator() for _ in range(size)], dtype=float)
+
+
+def lindley_waits(arrival:np.ndarray, interarrival:np.ndarray, service:np.ndarray, free:float=0.0) -> np.ndarray:
+    """Waiting times in the queue of FIFO customers at one server, by the Lindley recursion.
+
+    W[i] = max(0, W[i-1] + service[i-1] - interarrival[i]) is a random walk reflected at 0,
+    so with V = cumsum(service[i-1] - interarrival[i]) it is W = V - min(0, running minimum of V),
+    computed for all customers at once.
+
+    Args:
+        arrival (np.ndarray): Arrival times.
+        interarrival (np.ndarray): Time since the previous arrival of each customer.
+        service (np.ndarray): Service times.
+        free (float, optional): Time the server gets free of the customers before these. Defaults to 0.0.
+
+    Returns:
+        np.ndarray: Waiting time in the queue of each customer.
+    """
+    steps = np.empty(len(arrival))
+    steps[0] = free - arrival[0]
+    steps[1:] = service[:-1] - interarrival[1:]
+    walk = np.cumsum(steps)
+    return walk - np.minimum(np.minimum.accumulate(walk), 0.0)
+
+
+def multi_server_starts(arrival:np.ndarray, service:np.ndarray, free:list) -> np.ndarray:
+    """Service start times of FIFO customers at several servers.
+
+    Each customer takes the server that gets free first, or starts at arrival if one is idle.
+
+    Args:
+        arrival (np.ndarray): Arrival times.
+        service (np.ndarray): Service times.
+        free (list): Heap of the times the servers get free. Updated in place.
+
+    Returns:
+        np.ndarray: Service start time of each customer.
+    """
+    start = []
+    for arrival_time, service_time in zip(arrival.tolist(), service.tolist()):
+        begin = max(arrival_time, free[0])
+        heapq.heapreplace(free, begin + service_time)
+        start.append(begin)
+    return np.array(start)
+
+
 class Queue:
     def __init__(self, 
                  arrival_gen:float,
@@ -102,15 +179,26 @@ class Queue:
                 if detailed:
                     print(f"[DISPATCH] Customer {customer_id} goes to server according to the policy.")
 
-    def run(self, policy, report:bool=True, detailed:bool=False) -> None:
+    def run(self, policy=fifo_policy, report:bool=True, detailed:bool=False, fast:bool=True) -> None:
         """Starts the simulation by adding arrival process and dispatcher process to the environment.
 
+        With the FIFO policy the simulation does not need SimPy: it runs in the batch engine
+        (see `_run_batch`), with the same statistics and report. Other policies use SimPy.
+
         Args:
             policy (python function): This function is a python function where input=wait customers as a list of (customer_id, customer_data). 
                                       The output should be a int number which shows the customer_id of the chosen customer.
+                                      Defaults to fifo_policy.
             report (optional, bool): If you don't want to see the resport change it to False. Defaults to True.
             detailed (optional, bool): If you want to see every detail in the simulation process, change this to True. Defaults to False.
+            fast (optional, bool): Use the batch engine for the FIFO policy. Change it to False to run SimPy anyway. Defaults to True.
         """
+        if fast and policy is fifo_policy and not detailed:
+            self._run_batch()
+            self.finalize_remaining_customers()
+            self.report(print_=report)
+            return
+
         self.env.process(self._arrival_process(detailed=detailed))
         self.env.process(self._dispatcher_process(policy_function=policy, detailed=detailed))
 
@@ -127,6 +215,85 @@ class Queue:
         self.finalize_remaining_customers()
         self.report(print_=report)
     
+    def _run_batch(self, batch_size:int=65536) -> None:
+        """Run a FIFO simulation without SimPy.
+
+        Interarrival and service times are drawn `batch_size` customers at a time, in the
+        same order as the arrival process draws them. The service start times come from
+        the Lindley recursion (one server) or a heap of server free times (several servers).
+        Batches are drawn until no later customer can change the end of the simulation:
+        the first event at or after sim_time_limit, or the sim_customer_limit-th departure.
+        The statistics are then those the SimPy processes would have collected up to that
+        event. Only events at exactly the same time as the last one may be counted differently.
+
+        Args:
+            batch_size (optional, int): Customers drawn per batch. Defaults to 65536.
+        """
+        if self.sim_time_limit == float("inf") and self.sim_customer_limit == float("inf"):
+            raise ValueError("Set sim_time_limit or sim_customer_limit, the simulation would never end.")
+        free = [0.0] * self.capacity
+        arrivals, starts, services = [], [], []
+        clock = 0.0
+        known = 0
+        while True:
+            if self.arrival_gen is self.service_time_gen:
+                numbers = draw(self.arrival_gen, 2 * batch_size)
+                interarrival, service = numbers[0::2], numbers[1::2]
+            else:
+                interarrival = draw(self.arrival_gen, batch_size)
+                service = draw(self.service_time_gen, batch_size)
+            arrival = clock + np.cumsum(interarrival)
+            if self.capacity == 1:
+                start = arrival + lindley_waits(arrival, interarrival, service, free[0])
+                free[0] = start[-1] + service[-1]
+            else:
+                start = multi_server_starts(arrival, service, free)
+            arrivals.append(arrival)
+            starts.append(start)
+            services.append(service)
+            clock = arrival[-1]
+            known += batch_size
+
+            # Later customers arrive after `clock`, so an end time up to `clock` is final
+            if clock < self.sim_time_limit and known < self.sim_customer_limit:
+                continue
+            departure = np.concatenate(starts) + np.concatenate(services)
+            time_end = customer_end = float("inf")
+            if clock >= self.sim_time_limit:
+                arrival = np.concatenate(arrivals)
+                time_end = min(arrival[arrival >= self.sim_time_limit].min(),
+                               departure[departure >= self.sim_time_limit].min(initial=float("inf")))
+            if known >= self.sim_customer_limit:
+                last = int(self.sim_customer_limit) - 1
+                customer_end = np.partition(departure, last)[last]
+            if min(time_end, customer_end) <= clock:
+                break
+
+        self.limit_type = "T" if time_end <= customer_end else "C"
+        end = min(time_end, customer_end)
+        print(f"[INFO] {'Time' if self.limit_type == 'T' else 'Customer'} limit reached. The simulation finished successfuly.")
+        arrival = np.concatenate(arrivals)
+        start = np.concatenate(starts)
+        service = np.concatenate(services)
+        arrived = arrival <= end
+        completed = np.flatnonzero(departure <= end)
+        completed = completed[np.argsort(departure[completed], kind="stable")]
+
+        self.customer_id = int(arrived.sum())
+        self.stats["Wait_time_in_queue"] = (start - arrival)[completed]
+        self.stats["Wait_time_in_system"] = (departure - arrival)[completed]
+        self.stats["Waits_more"] = int((self.stats["Wait_time_in_queue"] > 4.5).sum())
+        self.stats["Integral_of_curve"] = float(self.stats["Wait_time_in_system"].sum())
+        self.stats["completed"] = len(completed)
+        # Customers who arrived but did not get to the server yet
+        waiting = np.flatnonzero(arrived & (start >= end))
+        self.customers_in_queue = [(customer_id, {"id": customer_id, "arrival_time": arrival_time,
+                                                  "service_time": service_time})
+                                   for customer_id, arrival_time, service_time
+                                   in zip(waiting.tolist(), arrival[waiting].tolist(), service[waiting].tolist())]
+        if end > self.env.now:
+            self.env.run(until=end)
+
     def finalize_remaining_customers(self):
         """It will take care of last people who are still in the queue. These people stats is not calculated. You can change this part as you wish.
            Here I want to find the total integral of the curve.
@@ -148,11 +315,13 @@ class Queue:
         elif self.limit_type == "T":
             total_time = self.sim_time_limit
         completed_customers = len(self.stats["Wait_time_in_queue"])
-        avg_waiting_time_in_queue = sum(self.stats["Wait_time_in_queue"]) / completed_customers
-        avg_waiting_time_in_system = sum(self.stats["Wait_time_in_system"]) / completed_customers
+        total_wait_queue = float(np.sum(self.stats["Wait_time_in_queue"]))
+        total_wait_system = float(np.sum(self.stats["Wait_time_in_system"]))
+        avg_waiting_time_in_queue = total_wait_queue / completed_customers
+        avg_waiting_time_in_system = total_wait_system / completed_customers
         percent_over_45 = 100 * self.stats["Waits_more"] / completed_customers
         avg_system_length = self.stats["Integral_of_curve"] / total_time
-        utilization = (sum(self.stats["Wait_time_in_system"]) - sum(self.stats["Wait_time_in_queue"])) / total_time
+        utilization = (total_wait_system - total_wait_queue) / total_time
         if print_:
             print(f"\n--- Simulation Report ---")
             print(f"Total customers arrived: {self.customer_id+1}")
@@ -1,8 +1,68 @@
 import numpy as np
 
-class General_Generator:
+VARIANCE_REDUCTION = [None, "common", "antithetic"]
+
+class Buffered_Generator:
+    """Base of the random generators: numbers are drawn a block at a time and given out one by one.
+
+    The buffer is refilled with `buffer_size` numbers when it is empty, so a seeded generator gives
+    the same numbers as drawing them block by block, whatever the buffer size and however calls
+    and `batch` are mixed.
+
+    With variance_reduction="common" the numbers come from the inverse CDF of one uniform number
+    each, so runs with the same seed use common random numbers even when the distributions differ
+    (e.g. two policies or two service rates). With "antithetic" they come from 1 - U instead of U:
+    a run with the same seed and "common" is its antithetic pair.
+    """
+    def __init__(self, seed:int=None, buffer_size:int=1024, variance_reduction:str=None):
+        """Args:
+            seed (int, optional): Random seed (numpy). Defaults to None.
+            buffer_size (int, optional): Numbers drawn each time the buffer is empty. Defaults to 1024.
+            variance_reduction (str, optional): None, "common" or "antithetic" (see above). Defaults to None.
+        """
+        if variance_reduction not in VARIANCE_REDUCTION:
+            raise ValueError(f"variance_reduction should be one of {VARIANCE_REDUCTION}, not {variance_reduction}")
+        if buffer_size < 1:
+            raise ValueError(f"buffer_size should be at least 1, not {buffer_size}")
+        self.seed = seed
+        self.rng = np.random.default_rng(seed=seed)
+        self.buffer_size = buffer_size
+        self.variance_reduction = variance_reduction
+        self._buffer = []
+        self._position = 0
+
+    def __call__(self):
+        if self._position == len(self._buffer):
+            self._buffer = self._draw(self.buffer_size).tolist()
+            self._position = 0
+        value = self._buffer[self._position]
+        self._position += 1
+        return value
+
+    def batch(self, size:int) -> np.ndarray:
+        """Draw `size` numbers at once, the same ones `size` calls would give."""
+        rest = self._buffer[self._position:self._position + size]
+        self._position += len(rest)
+        return np.concatenate([np.asarray(rest, dtype=float), self._draw(size - len(rest))]).astype(float)
+
+    def _draw(self, size:int) -> np.ndarray:
+        if self.variance_reduction is None:
+            return self._sample(size)
+        # The smallest uniform is `tiny`, so neither U nor 1 - U is 0
+        uniform = self.rng.uniform(np.finfo(float).tiny, 1.0, size)
+        if self.variance_reduction == "antithetic":
+            uniform = 1.0 - uniform
+        return self._inverse(uniform)
+
+    def _sample(self, size:int) -> np.ndarray:
+        raise NotImplementedError
+
+    def _inverse(self, uniform:np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+class General_Generator(Buffered_Generator):
     """Generating numbers according to any distribution, only by calling the object. According to SCIPY"""
-    def __init__(self, distribution, seed:int=None):
+    def __init__(self, distribution, seed:int=None, buffer_size:int=1024, variance_reduction:str=None):
         """Args:
             distribution (scipy distribution): You should first make your distirution using scipy, then pass it here to be set with a specefic seed,
                                                and can be used in the further classes for simulation.
@@ -12,27 +72,35 @@ class General_Generator:
                                                gamma, beta, weibull_max, weibull_min, t, chi2, triang
 
             seed (int, optional): Random seed (numpy). Defaults to None.
+            buffer_size (int, optional): Numbers drawn each time the buffer is empty. Defaults to 1024.
+            variance_reduction (str, optional): None, "common" or "antithetic" (see Buffered_Generator). Defaults to None.
         """
+        super().__init__(seed=seed, buffer_size=buffer_size, variance_reduction=variance_reduction)
         self.distribution = distribution
-        self.seed = seed
-        self.rng = np.random.default_rng(seed=seed)
 
-    def __call__(self):
-        return self.distribution.rvs(random_state=self.rng)
+    def _sample(self, size:int) -> np.ndarray:
+        return np.asarray(self.distribution.rvs(size=size, random_state=self.rng))
 
-class Exponential_Generator:
+    def _inverse(self, uniform:np.ndarray) -> np.ndarray:
+        return self.distribution.ppf(uniform)
+
+class Exponential_Generator(Buffered_Generator):
     """Generating numbers according to Exponential distribution, only by calling the object."""
-    def __init__(self, mean:float, seed:int=None) -> None:
+    def __init__(self, mean:float, seed:int=None, buffer_size:int=1024, variance_reduction:str=None) -> None:
         """Args:
             seed (int): Random seed (numpy). Defaults to None.
             mean (float): mean of the data.
+            buffer_size (int, optional): Numbers drawn each time the buffer is empty. Defaults to 1024.
+            variance_reduction (str, optional): None, "common" or "antithetic" (see Buffered_Generator). Defaults to None.
         """
+        super().__init__(seed=seed, buffer_size=buffer_size, variance_reduction=variance_reduction)
         self.mean = mean
-        self.seed = seed
-        self.rng = np.random.default_rng(seed=seed)
 
-    def __call__(self):
-        return self.rng.exponential(self.mean)
+    def _sample(self, size:int) -> np.ndarray:
+        return self.rng.exponential(self.mean, size)
+
+    def _inverse(self, uniform:np.ndarray) -> np.ndarray:
+        return -self.mean * np.log1p(-uniform)
 
 class Deterministic_Generator:
     """Generating a constant number(mean), only by calling the object."""
@@ -45,3 +113,6 @@ class Deterministic_Generator:
     def __call__(self):
         return self.mean
 
+    def batch(self, size:int) -> np.ndarray:
+        """Return `size` copies of the mean."""
+        return np.full(size, self.mean, dtype=float)
@@ -0,0 +1,216 @@
+import contextlib
+import io
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from Individual_Engine import fifo_policy
+
+# Metrics of `Queue.report_data` that are summarized
+METRICS = ["wait_time_queue", "wait_time_system", "number_system", "Utilization", "served", "arrived", "total_time"]
+# Per-customer series of `Queue.stats` used for batch means, and the metric they estimate
+SERIES = {"wait_time_queue": "Wait_time_in_queue", "wait_time_system": "Wait_time_in_system"}
+
+
+def confidence_interval(values, confidence:float=0.95) -> tuple:
+    """Mean and half-width of the Student t confidence interval of independent observations.
+
+    Args:
+        values (array like): The observations.
+        confidence (float, optional): Confidence level. Defaults to 0.95.
+
+    Returns:
+        tuple: (mean, half_width). The half-width is nan with fewer than 2 observations.
+    """
+    values = np.asarray(values, dtype=float)
+    mean = float(values.mean()) if len(values) else float("nan")
+    if len(values) < 2:
+        return mean, float("nan")
+    half_width = stats.t.ppf((1 + confidence) / 2, len(values) - 1) * values.std(ddof=1) / math.sqrt(len(values))
+    return mean, float(half_width)
+
+
+def batch_means(series, batches:int) -> np.ndarray:
+    """Means of `batches` equal consecutive batches of a series. The last len(series) % batches values are left out.
+
+    Args:
+        series (array like): Observations of one run, e.g. the waiting time of each customer.
+        batches (int): Number of batches.
+
+    Returns:
+        np.ndarray: The batch means, empty if the series is shorter than `batches`.
+    """
+    series = np.asarray(series, dtype=float)
+    size = len(series) // batches
+    if size == 0:
+        return np.empty(0)
+    return series[:size * batches].reshape(batches, size).mean(axis=1)
+
+
+def run_replication(queue_factory, seed:np.random.SeedSequence, policy=fifo_policy, batches:int=10,
+                    warmup:int=1000, confidence:float=0.95) -> dict:
+    """Run one Queue and return its report_data with the batch-means interval of its waiting times.
+
+    The interval comes from this run alone: the customers after the warm-up are cut into
+    `batches` consecutive batches, and the batch means are taken as independent observations.
+    That holds only if the batches are much longer than the correlation of the waiting times,
+    so the lag-1 autocorrelation of the batch means is returned too: if it is clearly
+    positive, use fewer batches or a longer run.
+
+    This is the work unit of `Replication_Manager`. It is a module-level function
+    so the process pool can pickle it.
+
+    Args:
+        queue_factory (python function): Makes the Queue of a replication from its SeedSequence.
+        seed (np.random.SeedSequence): Seed of the replication.
+        policy (python function, optional): Policy given to Queue.run. Defaults to fifo_policy.
+        batches (int, optional): Batch means per run. Defaults to 10.
+        warmup (int, optional): First customers (in completion order) left out of the batch means. Defaults to 1000.
+        confidence (float, optional): Confidence level of the interval. Defaults to 0.95.
+
+    Returns:
+        dict: report_data plus "<metric>_batch_mean", "<metric>_batch_half_width" and
+              "<metric>_batch_lag1" for the metrics in SERIES.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        queue = queue_factory(seed)
+        queue.run(policy=policy, report=False)
+    result = dict(queue.report_data)
+    for metric, series in SERIES.items():
+        means = batch_means(np.asarray(queue.stats[series], dtype=float)[warmup:], batches)
+        result[f"{metric}_batch_mean"], result[f"{metric}_batch_half_width"] = confidence_interval(means, confidence)
+        result[f"{metric}_batch_lag1"] = (float(np.corrcoef(means[:-1], means[1:])[0, 1])
+                                          if len(means) > 2 else float("nan"))
+    return result
+
+
+class Replication_Manager:
+    """Runs independent replications of a Queue on a process pool until the estimates are precise enough.
+
+    Every replication gets its own child of one `np.random.SeedSequence`, so the random
+    streams of the replications are independent. Two managers with the same seed give their
+    replications the same seeds: comparing two policies with them uses common random numbers.
+
+    Each metric of `Queue.report_data` is summarized by the mean over the replications and
+    the half-width of its confidence interval. Every run also gets its own batch-means
+    interval of the waiting times (see `run_replication` and `batch_intervals`): a single
+    long run estimator, so the intervals of several runs are not combined.
+
+    Attributes:
+        queue_factory (python function): Makes the Queue of a replication from its SeedSequence.
+        policy (python function): Policy given to Queue.run.
+        confidence (float): Confidence level of the intervals.
+        batches (int): Batch means per run.
+        warmup (int): First customers of each run left out of the batch means.
+        workers (int): Number of worker processes.
+        results (list): report_data of each finished replication, in replication order.
+
+    Example:
+        >>> def make_queue(seed):
+        ...     arrival_seed, service_seed = seed.spawn(2)
+        ...     return Queue(Exponential_Generator(1.0, arrival_seed), Exponential_Generator(0.8, service_seed),
+        ...                  sim_time_limit=10000)
+        >>> manager = Replication_Manager(make_queue, seed=42)
+        >>> manager.run(relative_precision=0.02, metrics=["wait_time_queue", "number_system"])
+        >>> manager.summary()
+    """
+    def __init__(self, queue_factory, policy=fifo_policy, seed:int=None, confidence:float=0.95,
+                 batches:int=10, warmup:int=1000, workers:int=None):
+        """Make the manager. queue_factory and policy have to be module-level functions, so the pool can pickle them.
+
+        Args:
+            queue_factory (python function): Makes the Queue of a replication from its np.random.SeedSequence.
+            policy (python function, optional): Policy given to Queue.run. Defaults to fifo_policy.
+            seed (int, optional): Entropy of the root SeedSequence. Defaults to None (fresh entropy).
+            confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+            batches (int, optional): Batch means per run. Defaults to 10.
+            warmup (int, optional): First customers of each run left out of the batch means. Defaults to 1000.
+            workers (int, optional): Worker processes. Defaults to None (one per CPU).
+        """
+        self.queue_factory = queue_factory
+        self.policy = policy
+        self.confidence = confidence
+        self.batches = batches
+        self.warmup = warmup
+        self.workers = workers or os.cpu_count()
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.results = []
+
+    def replicate(self, replications:int) -> None:
+        """Run `replications` more replications, each with the next child of the root SeedSequence.
+
+        Args:
+            replications (int): Number of replications to add.
+        """
+        if replications <= 0:
+            return
+        seeds = self.seed_sequence.spawn(replications)
+        with ProcessPoolExecutor(max_workers=min(self.workers, replications)) as pool:
+            futures = [pool.submit(run_replication, self.queue_factory, seed, self.policy, self.batches, self.warmup,
+                                   self.confidence) for seed in seeds]
+            self.results += [future.result() for future in futures]
+
+    def run(self, relative_precision:float=0.05, metrics:list=("wait_time_queue",), min_replications:int=10,
+            max_replications:int=1000) -> pd.DataFrame:
+        """Add replications until every metric's half-width is at most relative_precision times its mean.
+
+        After each round the number of replications needed is estimated from the current
+        half-width (it shrinks with the square root of the replications), and only the
+        missing ones are run. Calling it again with a smaller precision keeps the
+        replications that are already done.
+
+        Args:
+            relative_precision (float, optional): Target half-width relative to the mean. Defaults to 0.05.
+            metrics (list, optional): Metrics of report_data that need the precision. Defaults to ("wait_time_queue",).
+            min_replications (int, optional): Replications of the first round, at least 2. Defaults to 10.
+            max_replications (int, optional): Stop here even if the precision is not reached. Defaults to 1000.
+
+        Returns:
+            pd.DataFrame: The summary (see `summary`).
+        """
+        needed = max(min_replications, 2, len(self.results))
+        while True:
+            if min(needed, max_replications) > len(self.results):
+                self.replicate(min(needed, max_replications) - len(self.results))
+            summary = self.summary()
+            relative = summary.loc[list(metrics), "relative_half_width"]
+            if (relative <= relative_precision).all():
+                print(f"[INFO] Relative precision {relative_precision} reached after {len(self.results)} replications.")
+                return summary
+            if len(self.results) >= max_replications:
+                print(f"[INFO] Stopped at {max_replications} replications, the relative precision is "
+                      f"{relative.max():.4f} instead of {relative_precision}.")
+                return summary
+            needed = max(len(self.results) + 1,
+                         math.ceil(len(self.results) * (relative.max() / relative_precision) ** 2))
+
+    def summary(self) -> pd.DataFrame:
+        """Mean and confidence interval of each metric over the finished replications.
+
+        Returns:
+            pd.DataFrame: One row per metric in METRICS with mean, half_width, relative_half_width
+                          and the number of replications.
+        """
+        rows = {}
+        for metric in METRICS:
+            mean, half_width = confidence_interval([result[metric] for result in self.results], self.confidence)
+            rows[metric] = {"mean": mean, "half_width": half_width,
+                            "relative_half_width": abs(half_width / mean) if mean else float("nan")}
+        summary = pd.DataFrame.from_dict(rows, orient="index")
+        summary["replications"] = len(self.results)
+        return summary
+
+    def batch_intervals(self) -> pd.DataFrame:
+        """Batch-means interval of the waiting times of each replication, from that run alone.
+
+        Returns:
+            pd.DataFrame: One row per replication with the batch mean, half-width and lag-1
+                          autocorrelation of the batch means of each metric in SERIES.
+        """
+        columns = [f"{metric}_batch_{name}" for metric in SERIES for name in ["mean", "half_width", "lag1"]]
+        return pd.DataFrame([{column: result[column] for column in columns} for result in self.results],
+                            columns=columns)
@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+
+class Traffic_Assignment:
+    """Static user-equilibrium traffic assignment (Frank-Wolfe) on a `Graph_Generator`.
+
+    Link costs are the graph's own vectorized BPR functions (`link_costs`).
+    Every iteration builds the shortest-path trees of all origins with one
+    batched Dijkstra call, loads the OD flows all-or-nothing onto them and
+    moves towards that loading with a bisection line search. The relative gap
+    of every iteration is kept in `report`.
+
+    The result can be used in `Clock` to pre-route vehicles on equilibrium costs
+    (`Router.fix_costs(assignment.costs)`) or to pre-load the network with a
+    background flow (`graph.background[:] = assignment.flows`).
+
+    Attributes:
+        graph (Graph_Generator): Network with the link cost functions
+        flows (np.ndarray): Link flows, indexed by the edge "index" attribute
+        costs (np.ndarray): Link costs at `flows`
+        report (list): One dict (iteration, relative_gap, total_travel_time, step) per iteration
+
+    Example:
+        >>> assignment = Traffic_Assignment(graph)
+        >>> trips = TNTP.read_trips("SiouxFalls_trips.tntp")
+        >>> flows = assignment.solve(trips, relative_gap=1e-4)
+        >>> assignment.report[-1]["relative_gap"]
+        9.7e-05
+    """
+
+    def __init__(self, graph):
+        """Initialize the assignment.
+
+        Args:
+            graph (Graph_Generator): Network with the link cost functions
+        """
+        self.graph = graph
+        self.node_code = {node: i for i, node in enumerate(graph.node_ids)}
+        self.flows = np.zeros(len(graph.edge_index), dtype=np.float64)
+        self.costs = graph.link_costs(occupancy=self.flows)
+        self.report = []
+        # Link index of every (from, to) node code pair: from * n + to, sorted, for np.searchsorted
+        n = len(graph.node_ids)
+        keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(graph.indptr)) * n + graph.indices
+        order = np.argsort(keys, kind="stable")
+        self._link_keys = keys[order]
+        self._link_of_key = np.asarray(graph.csr_edges)[order]
+
+    def _od_arrays(self, trips: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Node codes of origins and destinations and the flows of an OD table."""
+        origins = np.array([self.node_code[str(node)] for node in trips["Origin"]], dtype=np.int64)
+        destinations = np.array([self.node_code[str(node)] for node in trips["Destination"]], dtype=np.int64)
+        return origins, destinations, trips["flow"].to_numpy(dtype=np.float64)
+
+    def all_or_nothing(self, costs: np.ndarray, origins: np.ndarray, destinations: np.ndarray,
+                       demand: np.ndarray) -> tuple[np.ndarray, float]:
+        """Load every OD flow onto its shortest path.
+
+        Args:
+            costs (np.ndarray): Link costs
+            origins (np.ndarray): Origin node codes
+            destinations (np.ndarray): Destination node codes
+            demand (np.ndarray): OD flows
+
+        Returns:
+            tuple: (link flows, total travel time on the shortest paths)
+
+        Raises:
+            ValueError: If a destination cannot be reached from its origin
+        """
+        graph = self.graph
+        n = len(graph.node_ids)
+        weights = csr_matrix((costs[graph.csr_edges], graph.indices, graph.indptr), shape=(n, n))
+        sources, origin_row = np.unique(origins, return_inverse=True)
+        distances, predecessors = dijkstra(weights, directed=True, indices=sources, return_predecessors=True)
+        shortest = distances[origin_row, destinations]
+        if not np.all(np.isfinite(shortest)):
+            raise ValueError("Some destinations cannot be reached from their origins")
+
+        # Flow ending at each node, per origin
+        node_flow = np.zeros((len(sources), n), dtype=np.float64)
+        np.add.at(node_flow, (origin_row, destinations), demand)
+        flows = np.zeros(len(costs), dtype=np.float64)
+        for row, source in enumerate(sources):
+            accumulated = node_flow[row]
+            reached = np.flatnonzero(np.isfinite(distances[row]) & (np.arange(n) != source))
+            parents = predecessors[row, reached]
+            links = self._link_of_key[np.searchsorted(self._link_keys, parents * n + reached)]
+            depth = self._tree_depth(predecessors[row], source)[reached]
+            # Deepest nodes first, so each node has its whole subtree flow before passing it on.
+            # Not by distance: with zero-cost links a node and its parent can be as far.
+            for level in range(depth.max(initial=0), 0, -1):
+                at_level = depth == level
+                passed = accumulated[reached[at_level]]
+                np.add.at(flows, links[at_level], passed)
+                np.add.at(accumulated, parents[at_level], passed)
+        return flows, float(np.dot(shortest, demand))
+
+    @staticmethod
+    def _tree_depth(predecessors: np.ndarray, source: int) -> np.ndarray:
+        """Number of links from the source to each node of a shortest-path tree (0 for unreached nodes).
+
+        Pointer jumping: every pass adds the depth of the current ancestor and jumps to its
+        ancestor, so it takes log2(tree depth) passes.
+        """
+        ancestor = np.where(predecessors < 0, source, predecessors)
+        depth = (predecessors >= 0).astype(np.int64)
+        while np.any(ancestor != source):
+            depth = depth + np.where(ancestor != source, depth[ancestor], 0)
+            ancestor = ancestor[ancestor]
+        return depth
+
+    def _line_search(self, flows: np.ndarray, direction: np.ndarray, iterations: int = 30) -> float:
+        """Step in [0, 1] that minimizes the Beckmann objective along the direction (bisection)."""
+        low, high = 0.0, 1.0
+        for _ in range(iterations):
+            step = (low + high) / 2
+            slope = np.dot(self.graph.link_costs(occupancy=flows + step * direction), direction)
+            if slope > 0:
+                high = step
+            else:
+                low = step
+        return (low + high) / 2
+
+    def solve(self, trips: pd.DataFrame, max_iterations: int = 200, relative_gap: float = 1e-4,
+              verbose: bool = False) -> np.ndarray:
+        """Find the user-equilibrium link flows of an OD table.
+
+        Args:
+            trips (pd.DataFrame): OD table with columns Origin, Destination and flow
+                (see `TNTP.read_trips` or `od_from_demand`)
+            max_iterations (int, optional): Iteration limit. Defaults to 200.
+            relative_gap (float, optional): Stop when the relative gap is below this. Defaults to 1e-4.
+            verbose (bool, optional): Print the gap of every iteration. Defaults to False.
+
+        Returns:
+            np.ndarray: Equilibrium link flows, indexed by the edge "index" attribute
+        """
+        origins, destinations, demand = self._od_arrays(trips)
+        self.report = []
+        costs = self.graph.link_costs(occupancy=np.zeros(len(self.flows)))
+        flows, _ = self.all_or_nothing(costs, origins, destinations, demand)
+        for iteration in range(1, max_iterations + 1):
+            costs = self.graph.link_costs(occupancy=flows)
+            target, shortest_travel_time = self.all_or_nothing(costs, origins, destinations, demand)
+            total_travel_time = float(np.dot(flows, costs))
+            gap = (total_travel_time - shortest_travel_time) / total_travel_time
+            step = 0.0
+            if gap > relative_gap:
+                step = self._line_search(flows, target - flows)
+                flows = flows + step * (target - flows)
+            self.report.append({"iteration": iteration, "relative_gap": gap,
+                                "total_travel_time": total_travel_time, "step": step})
+            if verbose:
+                print(f"[INFO] Assignment iteration {iteration}: relative gap {gap:.3e}")
+            if gap <= relative_gap:
+                break
+        self.flows = flows
+        self.costs = self.graph.link_costs(occupancy=flows)
+        print(f"[INFO] Assignment finished after {len(self.report)} iterations, relative gap {self.report[-1]['relative_gap']:.3e}.")
+        return flows
+
+    def link_frame(self) -> pd.DataFrame:
+        """Equilibrium flows and costs in the layout of a TNTP `_flow.tntp` file.
+
+        Returns:
+            pd.DataFrame: Columns From, To, Volume and Cost, one row per link
+        """
+        edges = list(self.graph.edge_index)
+        return pd.DataFrame({"From": [u for u, _ in edges], "To": [v for _, v in edges],
+                             "Volume": self.flows, "Cost": self.costs})
+
+
+def od_from_demand(demand: pd.DataFrame, scale: float = 1.0) -> pd.DataFrame:
+    """OD table from a trip list in the layout of demand.csv.
+
+    Args:
+        demand (pd.DataFrame): One row per trip with Origin and Destination
+        scale (float, optional): Factor on the trip counts, e.g. to get hourly flows. Defaults to 1.0.
+
+    Returns:
+        pd.DataFrame: Columns Origin, Destination and flow
+    """
+    table = demand.groupby(["Origin", "Destination"]).size().rename("flow").reset_index()
+    table["flow"] = table["flow"] * scale
+    return table[table["Origin"] != table["Destination"]].reset_index(drop=True)
+
+
+def compare_flows(volumes: pd.DataFrame, reference: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """Compare link volumes with reference volumes (e.g. `TNTP.read_flow("SiouxFalls_flow.tntp")`).
+
+    Args:
+        volumes (pd.DataFrame): Columns From, To and Volume (see `Graph_Generator.link_volumes`
+            or `Traffic_Assignment.link_frame`)
+        reference (pd.DataFrame): Columns From, To and Volume
+
+    Returns:
+        tuple: (per-link frame with Volume, Reference and Difference, summary dict with links,
+            rmse, relative rmse (to the mean reference volume) and r2)
+    """
+    left = volumes[["From", "To", "Volume"]].astype({"From": str, "To": str})
+    right = reference[["From", "To", "Volume"]].astype({"From": str, "To": str}).rename(columns={"Volume": "Reference"})
+    links = left.merge(right, on=["From", "To"], how="inner")
+    links["Difference"] = links["Volume"] - links["Reference"]
+    rmse = float(np.sqrt(np.mean(links["Difference"] ** 2))) if len(links) else float("nan")
+    variance = float(np.sum((links["Reference"] - links["Reference"].mean()) ** 2))
+    summary = {"links": len(links),
+               "rmse": rmse,
+               "relative_rmse": rmse / float(links["Reference"].mean()) if len(links) else float("nan"),
+               "r2": 1 - float(np.sum(links["Difference"] ** 2)) / variance if variance else float("nan")}
+    return links, summary
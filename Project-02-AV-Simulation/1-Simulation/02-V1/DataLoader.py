@@ -1,45 +1,352 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+import numpy as np
 import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
 from Players import Intersection
+import TNTP
 import sympy as sp 
 
 
 class Graph_Generator:
+    # Bump when the artifact layout changes, so old cache entries are not loaded
+    ARTIFACT_VERSION = 2
+    ARTIFACT_ARRAYS = ["nodes", "network", "pos", "edge_from", "edge_to", "length", "bpr",
+                       "blocks", "indptr", "indices", "csr_edges"]
+
     def __init__(self, network_files: list, 
                  dedicated_lane_length: int, 
                  lane_changing_zone_length: int,
-                 each_block_length: int):
+                 each_block_length: int,
+                 travel_time_functions: dict = None,
+                 cache_directory: str = None,
+                 tntp_length_unit: float = 1000.0):
         """Initialize the traffic network graph.
         
+        With `cache_directory`, the parsed network is saved there once as an
+        artifact of .npy arrays (see `ARTIFACT_ARRAYS`). The artifact is keyed by
+        a hash of the input files and the lane parameters. Later runs memory-map
+        it instead of parsing the files and building SymPy expressions. Loading
+        an artifact still adds the networkx edges one by one and builds the
+        `Intersection` objects (with their `Lane`s) node by node, so that part
+        of the build cost remains.
+        
+        The network file can be a CSV file (from, to, length) or a TNTP `_net.tntp`
+        file. With a CSV file the BPR parameters follow from the length (see
+        `_bpr_parameters`). A TNTP file gives capacity, free flow time, B and power per link.
+        
         Args:
             network_files (list): List containing:
-                [0]: Path to CSV file with network topology
-                [1]: Path to text file with node positions
+                [0]: Path to CSV or `_net.tntp` file with network topology
+                [1]: Path to text (TNTP node) file with node positions
             dedicated_lane_length (int): Length of AV-only lanes in meters
             lane_changing_zone_length (int): Length of lane changing zones in meters
             each_block_length (int): Length of each road block in meters
+            travel_time_functions (dict, optional): Custom travel time functions. Maps (from, to)
+                node ids to a Sympy expression in the symbol "x" (number of vehicles). Links not
+                listed use the BPR function. Defaults to None.
+            cache_directory (str, optional): Directory of network artifacts. Defaults to None (no cache).
+            tntp_length_unit (float, optional): Meters per length unit of a TNTP network file.
+                Defaults to 1000.0.
         """
-        self.network_data = pd.read_csv(network_files[0])
-        self.pos = pd.read_csv(network_files[1], sep=r"\s+",)
+        travel_time_functions = {(str(u), str(v)): expr for (u, v), expr in (travel_time_functions or {}).items()}
+        self.artifact_path = None
+        arrays = None
+        if cache_directory is not None:
+            key = self.artifact_key(network_files, dedicated_lane_length, lane_changing_zone_length, each_block_length,
+                                    tntp_length_unit)
+            self.artifact_path = Path(cache_directory) / key
+            arrays = self._load_artifact(self.artifact_path)
+        self.from_artifact = arrays is not None
+        self.dedicated_lane_length = dedicated_lane_length
+        self.lane_changing_zone_length = lane_changing_zone_length
+        self.each_block_length = each_block_length
+        if arrays is None:
+            arrays = self._read_network_files(network_files, each_block_length, tntp_length_unit)
+            if self.artifact_path is not None:
+                self._save_artifact(self.artifact_path, arrays)
+
+        self.network_data = pd.DataFrame(arrays["network"])
+        self.pos = pd.DataFrame(arrays["pos"])
+        self.node_ids = [str(node) for node in arrays["nodes"]]
+        # CSR adjacency over node codes (position in node_ids): the links leaving node i are
+        # indices[indptr[i]:indptr[i + 1]], with link indexes csr_edges[indptr[i]:indptr[i + 1]]
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.csr_edges = arrays["csr_edges"]
+        self.blocks = arrays["blocks"]
         self.graph = nx.DiGraph()
-        
-        # Create graph edges with travel time functions
-        for _, row in self.network_data.iterrows():
-            x, expr = self._generate_travel_time(length=int(row["length"]))
-            self.graph.add_edge(str(row["from"]), str(row["to"]), length=row["length"], param=x, expr=expr)
+        self.edge_index = {}
+        self._custom_costs = {}
+
+        # Create graph edges, in the order links first appear in the network file
+        for index, (u, v, length) in enumerate(zip(arrays["edge_from"], arrays["edge_to"], arrays["length"])):
+            edge = (self.node_ids[u], self.node_ids[v])
+            self.edge_index[edge] = index
+            self.graph.add_edge(*edge, length=length, index=index)
+            if not self.from_artifact or edge in travel_time_functions:
+                x, expr = self._generate_travel_time(length=int(length), parameters=arrays["bpr"][index])
+                if edge in travel_time_functions:
+                    expr = travel_time_functions[edge]
+                    self._custom_costs[index] = sp.lambdify(x, expr, "numpy")
+                self.graph.edges[edge].update(param=x, expr=expr)
+
+        # Numeric BPR parameters, one entry per link (same order as the edge "index" attribute)
+        self.free_flow_time = np.array(arrays["bpr"][:, 0])
+        self.capacity = np.array(arrays["bpr"][:, 1])
+        self.alpha = np.array(arrays["bpr"][:, 2])
+        self.beta = np.array(arrays["bpr"][:, 3])
+
+        # Live number of vehicles on each link, indexed by the edge "index" attribute
+        self.occupancy = np.zeros(len(self.edge_index), dtype=np.int64)
+        # Number of vehicles that entered each link so far (simulated link volume)
+        self.entries = np.zeros(len(self.edge_index), dtype=np.int64)
+        # Extra flow on each link that is not simulated, added to the occupancy in link_costs
+        self.background = np.zeros(len(self.edge_index), dtype=np.float64)
+
+        # Block counts of all lanes (link x lane x block) and light codes (link x lane), indexed by the
+        # edge "index" attribute. Shorter links are padded at the front, so every stop line is the last block.
+        self.max_blocks = int(self.blocks.max()) if len(self.blocks) else 0
+        self.lane_occupancy = np.zeros((len(self.edge_index), 5, self.max_blocks), dtype=np.int32)
+        self.lights = np.full((len(self.edge_index), 5), Intersection.RED, dtype=np.int8)
 
         for node in self.graph.nodes:
             neighbors = list(self.graph.predecessors(node))
             lengths = [self.graph[nbr][node].get("length", 1) for nbr in neighbors]
+            links = [self.edge_index[(nbr, node)] for nbr in neighbors]
             self.graph.nodes[node]["intersection"] = Intersection(node_id=str(node),
                                                                   neighbors=neighbors,
                                                                   lengths=lengths,
                                                                   dedicated_lane_length=dedicated_lane_length,
                                                                   lane_changing_zone_length=lane_changing_zone_length,
-                                                                  each_block_length=each_block_length)
+                                                                  each_block_length=each_block_length,
+                                                                  occupancy=[self.lane_occupancy[i, :, self.max_blocks - self.blocks[i]:]
+                                                                             for i in links],
+                                                                  lights=[self.lights[i] for i in links])
+
+    @classmethod
+    def artifact_key(cls, network_files: list, dedicated_lane_length: int, lane_changing_zone_length: int,
+                     each_block_length: int, tntp_length_unit: float = 1000.0) -> str:
+        """Cache key of a network: hash of the input files, the lane parameters and the artifact version.
+        
+        Returns:
+            str: Hex digest used as the artifact directory name
+        """
+        digest = hashlib.sha256()
+        for file in network_files:
+            digest.update(Path(file).read_bytes())
+        digest.update(repr((dedicated_lane_length, lane_changing_zone_length, each_block_length,
+                            tntp_length_unit, cls.ARTIFACT_VERSION)).encode())
+        return digest.hexdigest()[:32]
 
-    def _generate_travel_time(self, length: int) -> tuple[sp.Symbol, sp.Expr]:
+    def _read_network_files(self, network_files: list, each_block_length: int, tntp_length_unit: float) -> dict:
+        """Parse the network and position files into the artifact arrays.
+        
+        A link that appears more than once keeps its first position and the values of its last row.
+        
+        Returns:
+            dict: Arrays named as in `ARTIFACT_ARRAYS`
+        """
+        if Path(network_files[0]).suffix == ".tntp":
+            network_data = TNTP.read_net(network_files[0])
+            from_, to_ = network_data["init_node"], network_data["term_node"]
+            lengths = network_data["length"].to_numpy() * tntp_length_unit
+            bpr = network_data[["free_flow_time", "capacity", "b", "power"]].to_numpy(dtype=np.float64)
+        else:
+            network_data = pd.read_csv(network_files[0])
+            from_, to_ = network_data["from"], network_data["to"]
+            lengths = network_data["length"].to_numpy()
+            bpr = np.array([self._bpr_parameters(length=int(l)) for l in lengths], dtype=np.float64).reshape(-1, 4)
+        pos = TNTP.read_nodes(network_files[1])
+        edges = {}
+        for row, (u, v) in enumerate(zip(from_.astype(str), to_.astype(str))):
+            edges[(u, v)] = row
+        nodes = {}
+        for u, v in edges:
+            nodes.setdefault(u, len(nodes))
+            nodes.setdefault(v, len(nodes))
+        rows = np.array(list(edges.values()), dtype=np.int64)
+        edge_from = np.array([nodes[u] for u, _ in edges], dtype=np.int32)
+        edge_to = np.array([nodes[v] for _, v in edges], dtype=np.int32)
+        length = lengths[rows]
+        order = np.argsort(edge_from, kind="stable")
+        return {"nodes": np.array(list(nodes), dtype=str),
+                "network": network_data.to_records(index=False),
+                "pos": pos.to_records(index=False),
+                "edge_from": edge_from,
+                "edge_to": edge_to,
+                "length": length,
+                "bpr": bpr[rows],
+                "blocks": (length // each_block_length).astype(np.int32),
+                "indptr": np.searchsorted(edge_from[order], np.arange(len(nodes) + 1)).astype(np.int32),
+                "indices": edge_to[order],
+                "csr_edges": order.astype(np.int32)}
+
+    def _save_artifact(self, path: Path, arrays: dict) -> None:
+        """Write the artifact arrays to `path` (a directory), completing it atomically."""
+        temporary = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        temporary.mkdir(parents=True, exist_ok=True)
+        for name in self.ARTIFACT_ARRAYS:
+            np.save(temporary / f"{name}.npy", arrays[name])
+        try:
+            os.replace(temporary, path)
+        except OSError:
+            # Another process saved the same artifact first
+            shutil.rmtree(temporary, ignore_errors=True)
+            print(f"[INFO] Network artifact already saved to {path} by another process")
+            return
+        print(f"[INFO] Network artifact saved to {path}")
+
+    def _load_artifact(self, path: Path) -> dict:
+        """Memory-map the artifact arrays in `path`, or return None if there is no artifact."""
+        if not path.is_dir():
+            return None
+        return {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in self.ARTIFACT_ARRAYS}
+
+    def expression(self, from_: str, to_: str) -> tuple[sp.Symbol, sp.Expr]:
+        """SymPy travel time function of a link.
+        
+        Graphs loaded from an artifact do not store the expressions on the edges, so
+        use this instead of the "param"/"expr" edge attributes.
+        
+        Args:
+            from_ (str): Link start node
+            to_ (str): Link end node
+            
+        Returns:
+            tuple: (x, expr), the flow symbol and the travel time expression
+        """
+        data = self.graph.edges[from_, to_]
+        if "expr" in data:
+            return data["param"], data["expr"]
+        index = data["index"]
+        parameters = (self.free_flow_time[index], self.capacity[index], self.alpha[index], self.beta[index])
+        return self._generate_travel_time(length=int(data["length"]), parameters=parameters)
+
+    def reset(self) -> None:
+        """Clear all vehicles and lights so the graph can be used for a new simulation.
+        
+        The arrays are cleared in place, so the lane views stay valid.
+        """
+        self.occupancy.fill(0)
+        self.entries.fill(0)
+        for node in self.graph.nodes:
+            self.graph.nodes[node]["intersection"].reset()
+
+    CHECKPOINT_ARRAYS = ["blocks", "occupancy", "entries", "background", "lane_occupancy", "lights"]
+
+    def checkpoint(self) -> dict:
+        """Link and lane counts and light codes, as arrays (see `restore`).
+        
+        Returns:
+            dict: The arrays in `CHECKPOINT_ARRAYS` (copies)
+        """
+        return {name: np.array(getattr(self, name)) for name in self.CHECKPOINT_ARRAYS}
+
+    def restore(self, arrays: dict) -> None:
+        """Load the counts and lights of `checkpoint` in place, so the lane views stay valid.
+        
+        Args:
+            arrays (dict): Arrays from `checkpoint`
+            
+        Raises:
+            ValueError: If the checkpoint was taken on a network with other links or blocks
+        """
+        if not np.array_equal(arrays["blocks"], self.blocks):
+            raise ValueError("The checkpoint was taken on a network with other links or block counts")
+        self.reset()
+        for name in self.CHECKPOINT_ARRAYS[1:]:
+            getattr(self, name)[...] = arrays[name]
+
+    def enter_link(self, from_: str, to_: str) -> None:
+        """Count a vehicle that enters the link from_ -> to_.
+        
+        Args:
+            from_ (str): Link start node
+            to_ (str): Link end node
+        """
+        index = self.edge_index[(from_, to_)]
+        self.occupancy[index] += 1
+        self.entries[index] += 1
+
+    def leave_link(self, from_: str, to_: str) -> None:
+        """Count a vehicle that leaves the link from_ -> to_.
+        
+        Args:
+            from_ (str): Link start node
+            to_ (str): Link end node
+        """
+        self.occupancy[self.edge_index[(from_, to_)]] -= 1
+
+    def link_counts(self) -> dict:
+        """Number of vehicles on each link.
+        
+        Returns:
+            dict: Maps (from, to) node ids to vehicle counts
+        """
+        return {edge: int(self.occupancy[i]) for edge, i in self.edge_index.items()}
+
+    def link_volumes(self) -> pd.DataFrame:
+        """Number of vehicles that entered each link so far.
+        
+        Returns:
+            pd.DataFrame: Columns From, To and Volume, one row per link
+        """
+        edges = list(self.edge_index)
+        return pd.DataFrame({"From": [u for u, _ in edges], "To": [v for _, v in edges], "Volume": self.entries})
+
+    def link_costs(self, occupancy: np.ndarray = None) -> np.ndarray:
+        """Evaluate the travel time of every link in one vectorized pass.
+        
+        The background flow (e.g. an equilibrium flow of the traffic that is not
+        simulated, see `Assignment.Traffic_Assignment`) is added to the live occupancy.
+        
+        Args:
+            occupancy (np.ndarray, optional): Number of vehicles per link. Defaults to the live
+                occupancy plus the background flow.
+            
+        Returns:
+            np.ndarray: Travel time per link, indexed by the edge "index" attribute
+        """
+        occupancy = self.occupancy + self.background if occupancy is None else occupancy
+        costs = self.free_flow_time * (1 + self.alpha * (occupancy / self.capacity) ** self.beta)
+        for i, function in self._custom_costs.items():
+            costs[i] = function(occupancy[i])
+        return costs
+
+    def link_cost(self, index: int, occupancy: float) -> float:
+        """Travel time of one link at a given number of vehicles (see `link_costs`).
+        
+        Args:
+            index (int): Link index (edge "index" attribute)
+            occupancy (float): Number of vehicles on the link, background flow included
+            
+        Returns:
+            float: Travel time of the link
+        """
+        if index in self._custom_costs:
+            return float(self._custom_costs[index](occupancy))
+        return float(self.free_flow_time[index] * (1 + self.alpha[index] * (occupancy / self.capacity[index]) ** self.beta[index]))
+
+    def _bpr_parameters(self, length: int) -> tuple:
+        """Default BPR parameters of a road segment.
+        
+        Args:
+            length (int): Length of the road segment in meters
+            
+        Returns:
+            tuple: (free_flow_time, capacity, alpha, beta)
+        """
+        capacity = length / 5
+        speed = 60
+        alpha = 0.15
+        beta = 4
+        return length / speed, capacity, alpha, beta
+
+    def _generate_travel_time(self, length: int, parameters: tuple = None) -> tuple[sp.Symbol, sp.Expr]:
         """Generate a BPR (Bureau of Public Roads) travel time function for a road segment.
         
         This private method creates a symbolic expression for travel time based on the
@@ -52,6 +359,8 @@ class Graph_Generator:
         
         Args:
             length (int): Length of the road segment in meters
+            parameters (tuple, optional): (free_flow_time, capacity, alpha, beta) of the link.
+                Defaults to None (the default parameters for this length).
             
         Returns:
             tuple: (x, expr) where:
@@ -66,11 +375,12 @@ class Graph_Generator:
             - β (beta): 4
         """
         x = sp.symbols("x")
-        capacity = length / 5
-        speed = 60
-        alpha = 0.15
-        beta = 4
-        expr = (length / speed) * (1 + alpha * (x / capacity)**beta)
+        if parameters is None:
+            parameters = self._bpr_parameters(length)
+        free_flow_time, capacity, alpha, beta = (float(value) for value in parameters)
+        # Keep integer powers exact (x**4 instead of x**4.0)
+        beta = int(beta) if beta.is_integer() else beta
+        expr = free_flow_time * (1 + alpha * (x / capacity)**beta)
         return x, expr
 
     def draw(self) -> None:
@@ -0,0 +1,200 @@
+import numpy as np
+import pandas as pd
+
+
+class Demand_Feeder:
+    """Typed demand table with a departure cursor.
+
+    The demand file is read once into a NumPy structured array sorted by
+    departure time. `release(time)` moves a cursor forward and returns every
+    trip that is due as one batch, so nothing is copied per vehicle.
+
+    With `chunksize` the file is streamed: only one chunk is held in memory
+    and the next one is read when the cursor reaches its end. A streamed file
+    must already be sorted by departure time.
+
+    Attributes:
+        file_path (str): Path to the demand CSV file (None for an in-memory table)
+        chunksize (int): Rows per streamed chunk (None = load the whole file)
+        released (int): Number of trips released so far
+
+    Example:
+        >>> demand = Demand_Feeder("demand.csv")
+        >>> batch = demand.release(time=10)
+        >>> [int(trip["ID"]) for trip in batch]
+        [0, 1]
+        >>> demand.next_departure()
+        13.0
+    """
+
+    COLUMNS = ["ID", "departure", "Origin", "Destination", "lane", "type"]
+    ROW = np.dtype([("ID", np.int64),
+                    ("departure", np.float64),
+                    ("Origin", np.int64),
+                    ("Destination", np.int64),
+                    ("lane", np.int64),
+                    ("type", np.int64)])
+
+    def __init__(self, file_path: str = None, chunksize: int = None):
+        """Load (or start streaming) a demand file.
+
+        The CSV file should contain the columns in `COLUMNS`:
+        ID, departure, Origin, Destination, lane, type.
+
+        Args:
+            file_path (str, optional): Path to the demand CSV file. Defaults to None (no demand).
+            chunksize (int, optional): Stream the file in chunks of this many rows. Defaults to None.
+        """
+        self.file_path = file_path
+        self.chunksize = chunksize
+        self.released = 0
+        self._reader = None
+        self._last_departure = -np.inf
+        self._trips = np.zeros(0, dtype=self.ROW)
+        self._cursor = 0
+        if file_path is None:
+            return
+        if chunksize is None:
+            self._trips = self._to_array(pd.read_csv(file_path), sort=True)
+        else:
+            self._reader = pd.read_csv(file_path, chunksize=chunksize)
+            self._next_chunk()
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "Demand_Feeder":
+        """Build a feeder from a demand DataFrame that is already in memory.
+
+        Args:
+            frame (pd.DataFrame): Demand table with the columns in `COLUMNS`
+
+        Returns:
+            Demand_Feeder: Feeder over a sorted copy of the table
+        """
+        feeder = cls()
+        feeder._trips = feeder._to_array(frame, sort=True)
+        return feeder
+
+    def perturb(self, rng: np.random.Generator, av_share: float = None, departure_jitter: float = 0.0) -> None:
+        """Randomize the trips that have not been released yet.
+
+        Used for Monte Carlo replications: the same seed gives the same demand.
+
+        Args:
+            rng (np.random.Generator): Random number generator
+            av_share (float, optional): Draw each vehicle type again, AV (type 2) with this
+                probability. Defaults to None (keep the types of the file).
+            departure_jitter (float, optional): Shift each departure by a uniform amount in
+                [-departure_jitter, departure_jitter], not before time 0. Defaults to 0.0.
+
+        Raises:
+            ValueError: If the demand is streamed in chunks
+        """
+        if self.chunksize is not None:
+            raise ValueError("A streamed demand file cannot be perturbed, load it without chunksize")
+        trips = self._trips[self._cursor:].copy()
+        if av_share is not None:
+            trips["type"] = np.where(rng.random(len(trips)) < av_share, 2, 1)
+        if departure_jitter:
+            shift = rng.uniform(-departure_jitter, departure_jitter, len(trips))
+            trips["departure"] = np.maximum(trips["departure"] + shift, 0.0)
+            trips = trips[np.argsort(trips["departure"], kind="stable")]
+        self._trips = trips
+        self._cursor = 0
+
+    def checkpoint(self) -> dict:
+        """Trips not released yet and the release count, as arrays (see `restore`).
+
+        Returns:
+            dict: "trips" and "released"
+
+        Raises:
+            ValueError: If the demand is streamed in chunks
+        """
+        if self.chunksize is not None:
+            raise ValueError("A streamed demand file cannot be checkpointed, load it without chunksize")
+        return {"trips": self._trips[self._cursor:], "released": np.array(self.released)}
+
+    def restore(self, arrays: dict) -> None:
+        """Continue from the trips of `checkpoint`.
+
+        Args:
+            arrays (dict): Arrays from `checkpoint`
+        """
+        self.file_path = None
+        self.chunksize = None
+        self._reader = None
+        self._trips = np.asarray(arrays["trips"], dtype=self.ROW)
+        self._cursor = 0
+        self.released = int(arrays["released"])
+
+    def _to_array(self, frame: pd.DataFrame, sort: bool) -> np.ndarray:
+        """Convert a demand frame to the typed structured array."""
+        trips = np.zeros(len(frame), dtype=self.ROW)
+        for column in self.COLUMNS:
+            trips[column] = frame[column].to_numpy()
+        if sort:
+            trips = trips[np.argsort(trips["departure"], kind="stable")]
+        return trips
+
+    def _next_chunk(self) -> bool:
+        """Replace the exhausted chunk by the next one of the stream.
+
+        Returns:
+            bool: False if the stream has ended
+
+        Raises:
+            ValueError: If the streamed file is not sorted by departure time
+        """
+        if self._reader is None:
+            return False
+        try:
+            trips = self._to_array(next(self._reader), sort=False)
+        except StopIteration:
+            self._reader = None
+            return False
+        departures = trips["departure"]
+        if len(departures) and (departures[0] < self._last_departure or np.any(np.diff(departures) < 0)):
+            raise ValueError(f"{self.file_path} must be sorted by departure to be streamed in chunks")
+        if len(departures):
+            self._last_departure = departures[-1]
+        self._trips = trips
+        self._cursor = 0
+        return True
+
+    def __len__(self) -> int:
+        """Number of trips not released yet (only the current chunk when streaming)."""
+        return len(self._trips) - self._cursor
+
+    @property
+    def empty(self) -> bool:
+        """True if every trip has been released."""
+        while self._cursor >= len(self._trips):
+            if not self._next_chunk():
+                return True
+        return False
+
+    def next_departure(self) -> float:
+        """Departure time of the next trip, or None if the demand is exhausted."""
+        if self.empty:
+            return None
+        return float(self._trips["departure"][self._cursor])
+
+    def release(self, time: float) -> np.ndarray:
+        """Release every trip with a departure time up to `time`.
+
+        Args:
+            time (float): Current simulation time
+
+        Returns:
+            np.ndarray: Due trips (structured array with the fields in `COLUMNS`), in departure order
+        """
+        batches = []
+        while not self.empty:
+            end = self._cursor + int(np.searchsorted(self._trips["departure"][self._cursor:], time, side="right"))
+            batches.append(self._trips[self._cursor:end])
+            self._cursor = end
+            if end < len(self._trips):
+                break
+        batch = np.concatenate(batches) if len(batches) > 1 else (batches[0] if batches else self._trips[:0])
+        self.released += len(batch)
+        return batch
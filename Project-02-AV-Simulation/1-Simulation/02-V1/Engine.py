@@ -1,13 +1,60 @@
+import io
+import math
+import numpy as np
 import simpy
 import Players
-import pandas as pd
 import DataLoader
+import Demand
+import StateStore
+import TNTP
+import Routing
+import Signals
+import Movement
+import Mesoscopic
+import Profiling
+import TrajectoryLog
 from tqdm.auto import tqdm
 from pathlib import Path
 
+# Order of the events of one time step (lower first, then in scheduling order): checkpoints
+# before anything else, then the vehicles (SimPy's NORMAL, as every `env.timeout`), then the lights
+CHECKPOINT_PRIORITY = simpy.events.URGENT
+VEHICLE_PRIORITY = simpy.events.NORMAL
+SIGNAL_PRIORITY = simpy.events.NORMAL + 1
+
+
+class Ordered_Timeout(simpy.events.Event):
+    """Timeout with a given priority among the events of its time step.
+
+    `env.timeout` always has the NORMAL priority. This is the same event, built as
+    `simpy.events.Timeout` builds itself, with one of the priorities above.
+    """
+
+    def __init__(self, env: simpy.Environment, delay: float, priority: int):
+        """Schedule the event `delay` time units from now.
+
+        Args:
+            env (simpy.Environment): Environment of the simulation
+            delay (float): Time until the event fires, not negative
+            priority (int): CHECKPOINT_PRIORITY, VEHICLE_PRIORITY or SIGNAL_PRIORITY
+        """
+        if delay < 0:
+            raise ValueError(f"Negative delay {delay}")
+        super().__init__(env)
+        self._ok = True
+        self._value = None
+        env.schedule(self, priority, delay)
+
+
 class Clock:
     def __init__(self, network_files: list, output_directory: str, dedicated_lane_length: int, 
-                 lane_changing_zone_length: int, each_block_length: int = 100):
+                 lane_changing_zone_length: int, each_block_length: int = 100,
+                 routing_tolerance: float = 0.0, routing_time_bucket: int = None, mode: str = "tick",
+                 trajectory_directory: str = None, keep_history: bool = True, history_chunk_size: int = 65536,
+                 graph: DataLoader.Graph_Generator = None, network_cache: str = None,
+                 signal_policy: Signals.Signal_Policy = None, batch_moves: bool = True,
+                 verbose: bool = False, profile: bool = False, routing_algorithm: str = "tree",
+                 routing_time_dependent: bool = False):
         """Initialize the traffic simulation environment.
         
         Args:
@@ -15,23 +62,88 @@ class Clock:
             dedicated_lane_length (int): Length of dedicated AV lanes in meters
             lane_changing_zone_length (int): Length of lane changing zones in meters
             each_block_length (int, optional): Length of each road block. Defaults to 100 meters
+            routing_tolerance (float, optional): Relative link cost change before a cached
+                shortest-path tree is rebuilt. Defaults to 0.0 (rebuild on any change).
+            routing_time_bucket (int, optional): Freeze link costs for routing over buckets of this
+                many time steps, e.g. 5 to share one tree per destination per tick. Defaults to None.
+            mode (str, optional): "tick" polls every vehicle every 5 time steps. "event" runs each
+                vehicle as its own SimPy process that sleeps at red lights. "meso" runs the tick loop on
+                point queues at the stop lines instead of blocks (`Mesoscopic.Link_Queue_Model`), a fast
+                approximation with the same KPIs for screening scenarios. Defaults to "tick".
+            trajectory_directory (str, optional): Stream the history log to Parquet parts in this
+                directory (relative to output_directory) while the simulation runs. Defaults to None.
+            keep_history (bool, optional): Keep the streamed history in memory as well. With False,
+                memory stays flat and no CSV log is written. Defaults to True.
+            history_chunk_size (int, optional): Rows per history chunk, and so per Parquet part.
+                Defaults to 65536.
+            graph (DataLoader.Graph_Generator, optional): A prebuilt graph to use instead of building
+                one from network_files. Call its reset() first if it was simulated before. Defaults to None.
+            network_cache (str, optional): Directory of prebuilt network artifacts, see
+                `DataLoader.Graph_Generator`. Defaults to None (always parse the network files).
+            signal_policy (Signals.Signal_Policy, optional): Traffic light control policy, e.g.
+                `Signals.Max_Pressure_Policy()`. Defaults to None (`Signals.Queue_Policy`).
+            batch_moves (bool, optional): In the tick mode, move the vehicles with `Movement.Batch_Mover`
+                instead of one `Vehicle.process` call each. Same results. Defaults to True.
+            verbose (bool, optional): Print the progress of every tick (time, new and sorted
+                vehicles). Defaults to False.
+            profile (bool, optional): Time the phases of every tick with a `Profiling.Profiler`,
+                see `profile_report` and `save_profile`. Defaults to False.
+            routing_algorithm (str, optional): "tree" caches one shortest-path tree per destination
+                (`Routing.Router`). "astar" runs an A* search per query (`Routing.AStar_Router`),
+                routing_tolerance is then not used. Defaults to "tree".
+            routing_time_dependent (bool, optional): With "astar", cost each link at the projected
+                time it is reached. Defaults to False.
         """
+        if mode not in ("tick", "event", "meso"):
+            raise ValueError(f"Unknown mode '{mode}', use 'tick', 'event' or 'meso'")
+        if routing_algorithm not in ("tree", "astar"):
+            raise ValueError(f"Unknown routing algorithm '{routing_algorithm}', use 'tree' or 'astar'")
+        # Constructor arguments, so fork() can build a copy of this simulation
+        self._arguments = dict(network_files=network_files, output_directory=output_directory,
+                               dedicated_lane_length=dedicated_lane_length,
+                               lane_changing_zone_length=lane_changing_zone_length,
+                               each_block_length=each_block_length, routing_tolerance=routing_tolerance,
+                               routing_time_bucket=routing_time_bucket, mode=mode,
+                               trajectory_directory=trajectory_directory, keep_history=keep_history,
+                               history_chunk_size=history_chunk_size, graph=graph, network_cache=network_cache,
+                               signal_policy=signal_policy, batch_moves=batch_moves, verbose=verbose,
+                               profile=profile, routing_algorithm=routing_algorithm,
+                               routing_time_dependent=routing_time_dependent)
+        self._started = False
+        self.mode = mode
+        self.verbose = verbose
+        self.profiler = Profiling.Profiler(enabled=profile)
         self.output_directory = Path(output_directory)
         self.env = simpy.Environment()
-        self.stats = pd.DataFrame(columns=["time", "vehicle_id", "origin", 
-                                         "destination", "lane", "block", 
-                                         "arrival_time", "stuck_time", "active", "light", "type"])
-        self.graph = DataLoader.Graph_Generator(
+        self.graph = graph if graph is not None else DataLoader.Graph_Generator(
             network_files=network_files,
             dedicated_lane_length=dedicated_lane_length,
             lane_changing_zone_length=lane_changing_zone_length,
-            each_block_length=each_block_length
+            each_block_length=each_block_length,
+            cache_directory=network_cache
         )
+        self.stats = StateStore.State_Store(nodes=self.graph.graph.nodes, chunk_size=history_chunk_size)
+        self.trajectory = None
+        if trajectory_directory is not None:
+            self.trajectory = TrajectoryLog.Trajectory_Writer(self.output_directory / trajectory_directory,
+                                                              keep_history=keep_history)
+            self.trajectory.attach(self.stats)
+            if profile:
+                self.stats.on_chunk_full = self._timed_flush
+        if routing_algorithm == "astar":
+            self.router = Routing.AStar_Router(self.graph, time_dependent=routing_time_dependent,
+                                               time_bucket=routing_time_bucket, profiler=self.profiler)
+        else:
+            self.router = Routing.Router(self.graph, tolerance=routing_tolerance, time_bucket=routing_time_bucket,
+                                         profiler=self.profiler)
+        self.signals = Signals.Signal_Controller(self.graph, policy=signal_policy, verbose=verbose)
+        self.mover = Movement.Batch_Mover(self.graph, self.stats) if batch_moves and mode != "meso" else None
+        self.queues = Mesoscopic.Link_Queue_Model(self.graph, self.stats, self.router) if mode == "meso" else None
         self.vehicles = {}
-        self.demand = {}
+        self.demand = Demand.Demand_Feeder()
         print(f"[INFO] Initializing finished. Graph had been generated.")
 
-    def generate_vehicles(self, file_path: str) -> None:
+    def generate_vehicles(self, file_path: str, chunksize: int = None) -> None:
         """Load vehicle demand data from a CSV file.
         
         The CSV file should contain columns:
@@ -42,16 +154,45 @@ class Clock:
         - lane: Initial lane number (0-4)
         - type: Vehicle type (1 for HDV, 2 for AV)
         
+        The file is loaded once into typed arrays (see `Demand.Demand_Feeder`).
+        
         Args:
             file_path (str): Path to the CSV file containing vehicle demand data
+            chunksize (int, optional): Stream the file in chunks of this many rows instead of
+                loading it at once. The file must then be sorted by departure. Defaults to None.
             
         Example:
             >>> sim.generate_vehicles('demand.csv')
+            >>> # Very large, departure-sorted demand files
+            >>> sim.generate_vehicles('demand_1M.csv', chunksize=100_000)
         """
-        self.demand = pd.read_csv(file_path)
-        self.demand.sort_values(by="departure", inplace=True)
+        self.demand = Demand.Demand_Feeder(file_path, chunksize=chunksize)
+        self.stats.reserve(len(self.stats.ids) + len(self.demand))
         print(f"[INFO] Vehicles read in the data and generated correctly.")
 
+    def generate_trips(self, file_path: str, horizon: int, scale: float = 1.0, av_share: float = 0.0,
+                       seed: int = None) -> None:
+        """Load vehicle demand from a TNTP `_trips.tntp` OD table.
+        
+        The OD flows are expanded into individual trips with departures spread
+        over the first `horizon` time steps (see `TNTP.trips_to_demand`).
+        
+        Args:
+            file_path (str): Path to the trip table
+            horizon (int): Length of the departure period in time steps
+            scale (float, optional): Factor on the OD flows. Defaults to 1.0.
+            av_share (float, optional): Share of AV trips. Defaults to 0.0.
+            seed (int, optional): Random seed of the expansion. Defaults to None.
+            
+        Example:
+            >>> sim.generate_trips('SiouxFalls_trips.tntp', horizon=3600, scale=0.01, av_share=0.3, seed=1)
+        """
+        demand = TNTP.trips_to_demand(TNTP.read_trips(file_path), horizon=horizon, scale=scale,
+                                      av_share=av_share, seed=seed)
+        self.demand = Demand.Demand_Feeder.from_frame(demand)
+        self.stats.reserve(len(self.stats.ids) + len(self.demand))
+        print(f"[INFO] {len(self.demand)} trips expanded from the trip table.")
+
     def _sort_vehicles(self) -> list:
         """Sort active vehicles by their arrival time plus stuck time.
         
@@ -64,13 +205,94 @@ class Clock:
         Note:
             This is a private method used internally by run_gen()
         """
-        active_vehicles = self.stats[self.stats["active"]]
-        sorted_active_vehicles = active_vehicles.sort_values(
-            by=["arrival_time"], 
-            key=lambda x: active_vehicles["arrival_time"] + active_vehicles["stuck_time"]
+        return self.stats.sorted_active_ids()
+
+    def _spawn_vehicle(self, queue: np.void) -> Players.Vehicle:
+        """Create a vehicle from one demand row and register it.
+        
+        Args:
+            queue (np.void): Demand row with ID, Origin, Destination, lane and type
+            
+        Returns:
+            Players.Vehicle: The new vehicle
+        """
+        vehicle = Players.Vehicle(
+            env=self.env,
+            id=str(int(queue["ID"])),
+            initial_path=[str(int(queue["Origin"])), str(int(queue["Destination"]))],
+            initial_lane=str(int(queue["lane"])-1),
+            type_="HDV" if int(queue["type"])==1 else "AV",
+            graph=self.graph,
+            stats=self.stats, 
+            track=0,
+            router=self.router
         )
-        vehicles = sorted_active_vehicles["vehicle_id"].to_list()
-        return vehicles
+        self.vehicles[vehicle.id] = vehicle
+        if self.mover is not None:
+            self.mover.add(vehicle)
+        return vehicle
+
+    def _demand_gen(self) -> simpy.events.Generator:
+        """Generator that releases the demand in the event-driven mode.
+        
+        Sleeps until the next departure time and starts every due vehicle as
+        its own SimPy process (see `Players.Vehicle.run`).
+        
+        Note:
+            This is a private method used internally by run()
+        """
+        while not self.demand.empty:
+            departure = math.ceil(self.demand.next_departure())
+            if departure > self.env.now:
+                yield self.env.timeout(departure - self.env.now)
+            with self.profiler.phase("routing"):
+                self.router.advance(self.env.now)
+            with self.profiler.phase("spawn"):
+                for queue in self.demand.release(self.env.now):
+                    vehicle = self._spawn_vehicle(queue)
+                    self.env.process(vehicle.run())
+        print(f"[INFO] All vehicles have been released at time {self.env.now}.")
+
+    def _timed_flush(self, store: StateStore.State_Store) -> None:
+        """Stream a full history chunk (see `TrajectoryLog.Trajectory_Writer.flush`), timed as "logging"."""
+        with self.profiler.phase("logging"):
+            self.trajectory.flush(store)
+
+    def _after_vehicles(self, delay: int) -> simpy.Event:
+        """Event `delay` time units from now that fires after all vehicle moves of that time.
+        
+        Scheduled with SIGNAL_PRIORITY, after the vehicles' timeouts, so at a shared
+        time step the lights are updated last, like in the polling loop.
+        """
+        return Ordered_Timeout(self.env, delay, SIGNAL_PRIORITY)
+
+    def _signal_gen(self, tick: int = 5) -> simpy.events.Generator:
+        """Generator that updates all traffic lights every `tick` time steps (event-driven mode).
+        
+        Lights that turn green wake up the vehicles sleeping on them.
+        
+        Note:
+            This is a private method used internally by run()
+        """
+        yield self._after_vehicles(-self.env.now % tick)
+        while True:
+            with self.profiler.phase("signals"):
+                self.signals.update(self.env.now, self.stats)
+            self.profiler.tick(self.env.now)
+            yield self._after_vehicles(tick)
+
+    def _start_processes(self) -> None:
+        """Register the simulation processes of the selected mode with the environment (once)."""
+        if self._started:
+            return
+        self._started = True
+        if self.mode == "event":
+            self.env.process(self._demand_gen())
+            self.env.process(self._signal_gen())
+        elif self.mode == "meso":
+            self.env.process(self._queue_gen())
+        else:
+            self.env.process(self._run_gen())
 
     def _run_gen(self) -> simpy.events.Generator:
         """Generator function that implements the main simulation logic.
@@ -86,58 +308,115 @@ class Clock:
         """
         while True:
             time = self.env.now
-            if not self.demand.empty:
-                queue = self.demand.iloc[0]
-                # Generate new vehicles at their departure time
-                if time  >= float(queue["departure"]):
-                    self.vehicles[str(int(queue["ID"]))] = Players.Vehicle(
-                        env=self.env,
-                        id=str(int(queue["ID"])),
-                        initial_path=[str(int(queue["Origin"])), str(int(queue["Destination"]))],
-                        initial_lane=str(int(queue["lane"])-1),
-                        type_="HDV" if int(queue["type"])==1 else "AV",
-                        graph=self.graph,
-                        stats=self.stats, 
-                        track=0
-                    )
-                    self.demand = self.demand.drop(self.demand.index[0]).reset_index(drop=True)
-                    print(f"[INFO] We are adding a new car into the system at time {time}.")
+            with self.profiler.phase("routing"):
+                self.router.advance(time)
+            # Generate all new vehicles due at this time in one batch
+            with self.profiler.phase("spawn"):
+                batch = self.demand.release(time)
+                for queue in batch:
+                    self._spawn_vehicle(queue)
+            if len(batch) and self.verbose:
+                print(f"[INFO] We are adding {len(batch)} new cars into the system at time {time}.")
             
             # Every 5 time steps: update lights and process vehicles
-            if time % 5 == 0:            
-                print(f"[INFO] Simulation time: {time}")
-                # Sort vehicles by waiting time
-                vehicles_id = self._sort_vehicles() if self.vehicles else []
-                print(f"[INFO] There are {len(vehicles_id)} sorted vehicles in the system.")
-                # Process all vehicles
-                for id in vehicles_id:
-                    self.vehicles[id].process()
-            
-                # Update lights for all intersections
-                for node in self.graph.graph.nodes:
-                    intersection = self.graph.graph.nodes[node]["intersection"]
-                    intersection.update_lights(self.stats)
-                    # print(f"[INFO] Traffic lights at intersection {node} have been updated at time {time}.")
+            if time % 5 == 0:
+                if self.verbose:
+                    print(f"[INFO] Simulation time: {time}")
+                # Sort vehicles by waiting time and process them in that order
+                with self.profiler.phase("sort"):
+                    if self.mover is not None:
+                        slots = self.stats.sorted_active_slots()
+                    else:
+                        slots = self._sort_vehicles() if self.vehicles else []
+                if self.verbose:
+                    print(f"[INFO] There are {len(slots)} sorted vehicles in the system.")
+                with self.profiler.phase("vehicles"):
+                    if self.mover is not None:
+                        self.mover.step(time, slots)
+                    else:
+                        for id in slots:
+                            self.vehicles[id].process()
+            
+                # Update lights for all intersections in one pass
+                with self.profiler.phase("signals"):
+                    self.signals.update(time, self.stats)
+                self.profiler.tick(time, vehicles=len(slots))
             yield self.env.timeout(1)
             
-    def run(self, until: int = 60) -> None:
-        """Run the simulation for a specified number of time steps.
+    def _queue_gen(self) -> simpy.events.Generator:
+        """Generator of the main loop in the mesoscopic mode (see `Mesoscopic.Link_Queue_Model`).
+        
+        Same time steps as `_run_gen`: new vehicles every time step, and every
+        5 time steps the queues move before the lights are updated.
+        
+        Note:
+            This is a private method used internally by run()
+        """
+        while True:
+            time = self.env.now
+            with self.profiler.phase("routing"):
+                self.router.advance(time)
+            with self.profiler.phase("spawn"):
+                self.queues.spawn(self.demand.release(time), time)
+            if time % 5 == 0:
+                with self.profiler.phase("vehicles"):
+                    self.queues.step(time)
+                with self.profiler.phase("signals"):
+                    self.signals.update(time, self.stats)
+                self.profiler.tick(time, vehicles=len(self.queues.slots))
+            yield self.env.timeout(1)
+
+    def _checkpoint_gen(self, every: int, directory: Path, until: int) -> simpy.events.Generator:
+        """Generator that saves a checkpoint every `every` time steps before `until`.
+        
+        A checkpoint is taken at the start of its time step, before anything
+        else happens at that time, so it holds the state after the previous step.
+        
+        Note:
+            This is a private method used internally by run()
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        time = (int(self.env.now) // every + 1) * every
+        while time < until:
+            yield Ordered_Timeout(self.env, time - self.env.now, CHECKPOINT_PRIORITY)
+            self.save_checkpoint(directory / f"checkpoint_{time:08d}.npz")
+            time += every
+
+    def run(self, until: int = 60, save: bool = True, checkpoint_every: int = None,
+            checkpoint_directory: str = "checkpoints") -> None:
+        """Run the simulation up to a time step.
         
         Displays a progress bar showing simulation time progression.
+        In the event-driven mode only actual moves are scheduled, so long
+        horizons cost time in proportion to the number of moves.
+        A later call continues from where the last one stopped.
         
         Args:
-            until (int, optional): Number of time steps to simulate. Defaults to 60.
+            until (int, optional): Time step to simulate up to. Defaults to 60.
+            save (bool, optional): Save the log when the run ends. Defaults to True.
+            checkpoint_every (int, optional): Save a checkpoint every this many time steps
+                (tick mode only, see `save_checkpoint`). Defaults to None (no checkpoints).
+            checkpoint_directory (str, optional): Directory of the checkpoint files, relative
+                to output_directory. Defaults to "checkpoints".
             
         Example:
             >>> # Run simulation for 100 time steps
             >>> sim.run(until=100)
+            >>> # Keep a checkpoint every 1000 time steps of a long run
+            >>> sim.run(until=10000, checkpoint_every=1000)
         """
+        self.profiler.start()
+        if checkpoint_every is not None:
+            if self.mode != "tick":
+                raise ValueError("Checkpoints need the tick mode")
+            self.env.process(self._checkpoint_gen(checkpoint_every, self.output_directory / checkpoint_directory,
+                                                  until))
         try:
             # Create progress tracking process
             def progress_monitor():
-                with tqdm(total=until, desc="Simulation Progress", 
+                with tqdm(total=until, initial=self.env.now, desc="Simulation Progress", 
                          bar_format="{desc}: {percentage:3.0f}%|{bar}| {n:.0f}/{total:.0f} [Time elapsed: {elapsed}]") as pbar:
-                    last_time = 0
+                    last_time = self.env.now
                     while True:
                         current_time = self.env.now
                         if current_time > last_time:
@@ -145,28 +424,255 @@ class Clock:
                             last_time = current_time
                         if current_time >= until:
                             break
-                        yield self.env.timeout(1)
+                        yield self.env.timeout(1 if self.mode == "tick" else 5)
             
             # Start both simulation and progress monitoring
-            self.env.process(self._run_gen())
+            self._start_processes()
             self.env.process(progress_monitor())
             self.env.run(until=until)
             
         except ImportError:
             print("Note: Install tqdm package for progress bar visualization")
             # Run without progress bar if tqdm not available
-            self.env.process(self._run_gen())
+            self._start_processes()
             self.env.run(until=until)
 
-        self.save_log()
+        print(f"[INFO] Routing cache: {self.router.report()}")
+        if save:
+            with self.profiler.phase("logging"):
+                self.save_log()
+
+    def save_checkpoint(self, file) -> None:
+        """Save the full simulation state to one compressed .npz file.
+        
+        The checkpoint holds the time, the lane and link counts, the lights, every
+        vehicle slot with the history held in memory, the vehicles in the system,
+        the demand not released yet and the routing cache. Nothing else in a
+        tick-mode run changes over time (the simulation draws no random numbers),
+        so a run resumed from it with `load_checkpoint` gives the same log as
+        the uninterrupted run.
+        
+        Args:
+            file (str): Path of the .npz file, or a writable binary file object
+            
+        Raises:
+            ValueError: In the event mode (vehicles are suspended SimPy processes), the meso mode
+                or with a demand file streamed in chunks
+            
+        Example:
+            >>> sim.run(until=2000, save=False)
+            >>> sim.save_checkpoint("warm_2000.npz")
+        """
+        if self.mode != "tick":
+            raise ValueError(f"Checkpoints need the tick mode, not the {self.mode} mode")
+        arrays = {"clock.time": np.array(self.env.now)}
+        for prefix, part in [("graph", self.graph), ("stats", self.stats), ("demand", self.demand),
+                             ("router", self.router)]:
+            arrays.update({f"{prefix}.{name}": array for name, array in part.checkpoint().items()})
+
+        # Vehicles in the system: their path and position beyond the state store
+        node_index = self.stats.node_index
+        slots = self.stats.active_slots()
+        paths = np.zeros((len(slots), 4), dtype=np.int32)
+        numbers = np.zeros((len(slots), 6), dtype=np.int64)
+        for i, slot in enumerate(slots.tolist()):
+            state = self.vehicles[self.stats.ids[slot]].get_state()
+            paths[i] = [node_index[str(node)] for node in state["initial_path"] + state["current_path"]]
+            numbers[i] = [state[name] for name in ["lane", "pos", "max_pos", "arrival_time", "stucked_time", "track"]]
+        arrays.update({"vehicles.slot": slots, "vehicles.path": paths, "vehicles.numbers": numbers})
+        np.savez_compressed(file, **arrays)
+        print(f"[INFO] Checkpoint of time {self.env.now} saved with {len(slots)} vehicles.")
+
+    def load_checkpoint(self, file) -> None:
+        """Continue from a checkpoint of `save_checkpoint`.
+        
+        Call it on a new Clock, before run(). The Clock's own settings (signal
+        policy, routing, output) are kept, so loading one checkpoint into
+        Clocks with different settings gives what-if scenarios that share the
+        warm-up. See also `from_checkpoint` and `fork`.
+        
+        Args:
+            file (str): Path of the .npz file, or a readable binary file object
+            
+        Raises:
+            ValueError: If the Clock has already run, is not in the tick mode, or was built
+                on another network
+            
+        Example:
+            >>> sim = Clock(network_files, output_directory, 500, 500, signal_policy=Signals.Max_Pressure_Policy())
+            >>> sim.load_checkpoint("warm_2000.npz")
+            >>> sim.run(until=5000)
+        """
+        if self._started or len(self.stats.ids):
+            raise ValueError("Load a checkpoint into a new Clock, before run()")
+        if self.mode != "tick":
+            raise ValueError(f"Checkpoints need the tick mode, not the {self.mode} mode")
+        with np.load(file) as data:
+            parts = {}
+            for key in data.files:
+                prefix, name = key.split(".", 1)
+                parts.setdefault(prefix, {})[name] = data[key]
+        self.graph.restore(parts["graph"])
+        self.stats.restore(parts["stats"])
+        self.demand = Demand.Demand_Feeder()
+        self.demand.restore(parts["demand"])
+        self.router.restore(parts["router"])
+        if self.trajectory is not None:
+            # The rows of the checkpoint are written again as the first parts
+            self.trajectory.rows_written = self.stats.first_row
+        self.env = simpy.Environment(initial_time=int(parts["clock"]["time"]))
+
+        node_ids = self.stats.node_ids
+        vehicles = parts["vehicles"]
+        for slot, path, numbers in zip(vehicles["slot"].tolist(), vehicles["path"].tolist(),
+                                       vehicles["numbers"].tolist()):
+            lane, pos, max_pos, arrival_time, stucked_time, track = numbers
+            state = {"id": self.stats.ids[slot],
+                     "type": self.stats.TYPES[self.stats.type[slot]],
+                     "initial_path": [node_ids[node] for node in path[:2]],
+                     "current_path": [node_ids[node] for node in path[2:]],
+                     "lane": lane, "pos": pos, "max_pos": max_pos, "arrival_time": arrival_time,
+                     "stucked_time": stucked_time, "track": track}
+            vehicle = Players.Vehicle.from_state(self.env, state, self.stats, self.graph, router=self.router,
+                                                 slot=slot)
+            self.vehicles[vehicle.id] = vehicle
+            if self.mover is not None:
+                self.mover.add(vehicle)
+        print(f"[INFO] Checkpoint of time {self.env.now} loaded with {len(self.vehicles)} vehicles.")
+
+    @classmethod
+    def from_checkpoint(cls, file, **arguments) -> "Clock":
+        """Build a Clock and load a checkpoint into it.
+        
+        Args:
+            file (str): Path of the .npz file of `save_checkpoint`
+            **arguments: Arguments of the Clock, on the network the checkpoint was taken on
+            
+        Returns:
+            Clock: Simulation at the time of the checkpoint
+            
+        Example:
+            >>> for policy in [Signals.Queue_Policy(), Signals.Max_Pressure_Policy()]:
+            ...     sim = Clock.from_checkpoint("warm_2000.npz", network_files=network_files,
+            ...                                 output_directory=".", dedicated_lane_length=500,
+            ...                                 lane_changing_zone_length=500, signal_policy=policy)
+            ...     sim.run(until=5000, save=False)
+        """
+        clock = cls(**arguments)
+        clock.load_checkpoint(file)
+        return clock
+
+    def fork(self, **changes) -> "Clock":
+        """Copy of this simulation at the current time, with some Clock arguments changed.
+        
+        The state goes through an in-memory checkpoint. The copy gets a graph of its
+        own and no trajectory directory unless `changes` gives them. Its demand is
+        a copy, so it can be changed (e.g. `fork.demand.perturb(...)`) without
+        touching this simulation.
+        
+        Args:
+            **changes: Clock arguments to change, e.g. signal_policy or output_directory
+            
+        Returns:
+            Clock: The copy, ready to run()
+            
+        Example:
+            >>> sim.run(until=2000, save=False)
+            >>> pressure = sim.fork(signal_policy=Signals.Max_Pressure_Policy())
+            >>> fixed = sim.fork(signal_policy=Signals.Fixed_Time_Policy(green_time=10))
+            >>> for scenario in [sim, pressure, fixed]:
+            ...     scenario.run(until=5000, save=False)
+        """
+        buffer = io.BytesIO()
+        self.save_checkpoint(buffer)
+        buffer.seek(0)
+        arguments = {**self._arguments, "graph": None, "trajectory_directory": None, **changes}
+        return self.from_checkpoint(buffer, **arguments)
+
+    def profile_report(self) -> dict:
+        """Phase timers, counters and tick wall times of the run so far (needs `profile=True`).
+        
+        The phases are "spawn" (new vehicles and their first route), "sort", "vehicles"
+        (moves, including routing at intersections), "signals", "routing" (cost snapshots,
+        and every routing query and search, nested in "spawn" and "vehicles") and "logging"
+        (streaming and saving the log, nested in the other phases). In the event mode
+        vehicle moves run in their own processes and are not timed, but their routing is.
+        
+        Returns:
+            dict: `Profiling.Profiler.report()` with the counters of the simulation:
+                routing_calls, tree_builds, failed_moves, stuck_steps, spawned, batched_moves
+                and processed_moves with `batch_moves`, and crossings and searches (Dijkstra
+                searches of the batch routing, instead of tree_builds) in the meso mode
+                
+        Example:
+            >>> sim = Clock(network_files, output_directory, 500, 500, profile=True)
+            >>> sim.run(until=2000, save=False)
+            >>> sim.profile_report()["phases"]["vehicles"]["share"]
+            0.61
+        """
+        counters = {"routing_calls": self.router.hits + self.router.misses,
+                    "tree_builds": self.router.misses,
+                    "failed_moves": self.stats.failed_moves,
+                    "stuck_steps": self.stats.stuck_steps,
+                    "spawned": len(self.stats.ids)}
+        if self.mover is not None and self.mode == "tick":
+            counters.update(batched_moves=self.mover.moved, processed_moves=self.mover.processed)
+        if self.queues is not None:
+            counters.update(crossings=self.queues.crossings, searches=self.queues.searches)
+        self.profiler.counters.update(counters)
+        return self.profiler.report()
+
+    def save_profile(self, report_file: str = "profile.json", trace_file: str = "trace.json") -> None:
+        """Save `profile_report()` and a Chrome trace of the run to output_directory.
+        
+        Open the trace in chrome://tracing or https://ui.perfetto.dev.
+        
+        Args:
+            report_file (str, optional): JSON file of the report. Defaults to "profile.json".
+            trace_file (str, optional): JSON file of the trace. Defaults to "trace.json".
+        """
+        self.profile_report()
+        self.profiler.save_report(self.output_directory / report_file)
+        self.profiler.save_chrome_trace(self.output_directory / trace_file)
+
+    def kpis(self) -> dict:
+        """Key performance indicators of the run so far.
+        
+        Returns:
+            dict: time, spawned and completed trips, completion_rate (completed / spawned),
+                throughput (completed trips per time step), mean_stuck_time (summed over the
+                links of a trip, all spawned vehicles) and mean_travel_time (completed trips)
+                
+        Example:
+            >>> sim.run(until=1000)
+            >>> sim.kpis()["completion_rate"]
+            0.83
+        """
+        summary = self.stats.trip_summary()
+        time = self.env.now
+        return {"time": time,
+                "spawned": summary["spawned"],
+                "completed": summary["completed"],
+                "completion_rate": summary["completed"] / summary["spawned"] if summary["spawned"] else 0.0,
+                "throughput": summary["completed"] / time if time else 0.0,
+                "mean_stuck_time": summary["mean_stuck_time"],
+                "mean_travel_time": summary["mean_travel_time"]}
 
     def save_log(self, file_path: str = "simulation_log.csv") -> None:
         """Save the simulation log to a CSV file.
 
+        With a trajectory directory, the rows not streamed yet are written to it
+        first. The CSV is skipped if the history is not kept in memory.
+
         Args:
             file_path (str, optional): Path to the output CSV file. Defaults to "simulation_log.csv".
         """
-        self.stats.to_csv(self.output_directory / file_path, index=False)
+        if self.trajectory is not None:
+            self.trajectory.flush(self.stats, final=True)
+            print(f"[INFO] Trajectory log saved to {self.trajectory.directory}")
+            if not self.trajectory.keep_history:
+                return
+        self.stats.to_frame().to_csv(self.output_directory / file_path, index=False)
         print(f"[INFO] Simulation log saved to {file_path}")
 
     def draw_network(self) -> None:
@@ -0,0 +1,339 @@
+"""Mesoscopic link model: every approach lane is a point queue at the stop line.
+
+The block model (`Players.Vehicle`, `Movement.Batch_Mover`) moves every vehicle
+one block per tick and checks the room of every block. Here a vehicle only
+has events at the ends of a link:
+- it enters the link (spawn or intersection crossing) and is recorded at block 0
+- it reaches the stop line after the free flow time of the link, one block per
+  tick as in the block model, and is recorded at the last block
+- from then on it waits in the queue of its stop line. The queue fills the
+  lanes of its lane group block by block from the stop line backwards,
+  `Lane.CAPACITY` vehicles per lane and block. Each tick the vehicles in the
+  stop-line block of a green lane cross, the others are recorded as stuck for
+  the tick, as at a red light in the block model.
+
+Vehicles at their destination leave the system when they reach the stop line.
+The AV lane rules are applied at the queue level, with the lane preferences of
+`Movement.POLICY` in the lane changing zone: HDVs queue in the regular lanes
+and fill lane 0 first, then 1 and 2. AVs on a link with a lane changing zone
+or AV-only section (or that are already in an AV lane) queue in the AV lanes
+and fill lane 4 first, then 3. Before the lane changing zone a vehicle stays
+in the lane it entered on.
+
+Spawns and crossings are handled in batches: all vehicles that spawn in a time
+step, or cross in a tick, are routed together on the link costs of the router
+(`router.costs()`) at that moment, with one Dijkstra search per destination on
+the CSR arrays of the graph. Unlike the block model, a vehicle does not see the
+links chosen by the vehicles routed in the same batch.
+
+The lane counts of `Graph_Generator.lane_occupancy` are rebuilt every tick
+from the queues and from the free flow position of the other vehicles, so
+every `Signals.Signal_Policy` works unchanged. The history rows go to the same
+`State_Store`, so `Clock.kpis()` and the log have the same schema as in the
+block model, with fewer rows (no moves between the link ends).
+"""
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from Players import Intersection, Lane
+
+REGULAR, AV_LANES = 0, 1
+# Lanes of each lane group in the order its queue fills them (-1 pads)
+GROUP_LANES = np.array([[0, 1, 2], [4, 3, -1]])
+GROUP_SIZE = np.array([3, 2])
+
+
+class Link_Queue_Model:
+    """Point-queue simulation of the vehicles of a tick-mode run (see the module docstring).
+
+    Attributes:
+        graph (Graph_Generator): Network with the link, lane and light arrays
+        stats (State_Store): Vehicle state store of the simulation
+        router (Router): Routing service, gives the link costs for routing
+        capacity (int): Vehicles per lane and block, see `Lane.CAPACITY`
+        slots (np.ndarray): Slots of the vehicles in the system
+        link (np.ndarray): Link of each slot (edge "index")
+        lane (np.ndarray): Lane each slot entered its link on (0-4)
+        group (np.ndarray): Lane group of each slot on its link, REGULAR or AV_LANES
+        ready (np.ndarray): First tick each slot can cross or exit at its stop line
+        stop (np.ndarray): Tick each slot reaches its stop line, -1 if it entered there
+        target (np.ndarray): Destination node code of each slot
+        crossings (int): Intersection crossings so far
+
+    Example:
+        >>> model = Link_Queue_Model(graph, stats, router)
+        >>> model.spawn(demand.release(time), time)
+        >>> if time % 5 == 0:
+        ...     model.step(time)
+        ...     controller.update(time, stats)
+    """
+
+    def __init__(self, graph, stats, router, capacity: int = Lane.CAPACITY):
+        """Initialize an empty model.
+
+        Args:
+            graph (Graph_Generator): Network with the link, lane and light arrays
+            stats (State_Store): Vehicle state store of the simulation
+            router (Router): Routing service, e.g. `Routing.Router`. Only its `costs()` and `profiler` are used.
+            capacity (int, optional): Vehicles per lane and block. Defaults to `Lane.CAPACITY`.
+        """
+        self.graph = graph
+        self.stats = stats
+        self.router = router
+        self.capacity = capacity
+        self.blocks = np.asarray(graph.blocks, dtype=np.int64)
+        edges = list(graph.edge_index)
+        self.tail = np.array([stats.node_index[u] for u, _ in edges], dtype=np.int32)
+        self.head = np.array([stats.node_index[v] for _, v in edges], dtype=np.int32)
+        # First block of the lane changing zone of each link (the AV-only section follows it).
+        # AVs reach the AV lanes on links with at least one block of either.
+        changing = (int(graph.lane_changing_zone_length / graph.each_block_length)
+                    + graph.dedicated_lane_length / graph.each_block_length)
+        self.zone_start = np.maximum(self.blocks - 1 - changing, 0)
+        self.av_lanes = self.zone_start < self.blocks - 1
+        # Node codes of the graph's CSR arrays for each node code of the store, and back
+        graph_code = {node: i for i, node in enumerate(graph.node_ids)}
+        self._to_graph = np.array([graph_code[node] for node in stats.node_ids], dtype=np.int64)
+        self._to_stats = np.argsort(self._to_graph)
+        # Link of each (tail, head) pair of store node codes: tail * n + head, sorted, for np.searchsorted
+        keys = self.tail.astype(np.int64) * len(stats.node_ids) + self.head
+        self._link_order = np.argsort(keys, kind="stable")
+        self._link_keys = keys[self._link_order]
+        # Reversed graph for the searches from the destinations: its data is set to the costs of each search
+        n = len(graph.node_ids)
+        self._reverse = csr_matrix((np.ones(len(graph.csr_edges)), graph.indices, graph.indptr), shape=(n, n)).T.tocsr()
+        self._reverse_edges = csr_matrix((np.asarray(graph.csr_edges, dtype=np.float64) + 1, graph.indices,
+                                          graph.indptr), shape=(n, n)).T.tocsr().data.astype(np.int64) - 1
+        # Predecessor row of each destination (graph code), valid while the costs are `_tree_costs`
+        self._trees = {}
+        self._tree_costs = None
+        self.searches = 0
+        self.slots = np.zeros(0, dtype=np.int64)
+        self.link = np.zeros(0, dtype=np.int64)
+        self.lane = np.zeros(0, dtype=np.int64)
+        self.group = np.zeros(0, dtype=np.int64)
+        self.ready = np.zeros(0, dtype=np.int64)
+        self.stop = np.zeros(0, dtype=np.int64)
+        self.target = np.zeros(0, dtype=np.int32)
+        self.crossings = 0
+        # Flat indices of `graph.lane_occupancy` written in the last tick
+        self._written = np.zeros(0, dtype=np.int64)
+
+    def _reserve(self, capacity: int) -> None:
+        """Grow the per-slot arrays to at least `capacity` slots."""
+        if capacity <= len(self.link):
+            return
+        capacity = max(capacity, 2 * len(self.link))
+        for name in ["link", "lane", "group", "ready", "stop", "target"]:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _next_links(self, nodes: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """First link of the shortest path from each node to its target, on the router's current costs.
+
+        One Dijkstra search per distinct target on the reversed graph: the predecessor of
+        a node in the search from the target is the next node on its way there. The
+        searches are kept until the costs change, as the trees of `Routing.Router`.
+
+        Args:
+            nodes (np.ndarray): Store node codes of the current nodes
+            targets (np.ndarray): Store node codes of the destinations
+
+        Returns:
+            np.ndarray: Link (edge "index") of each vehicle
+
+        Raises:
+            nx.NetworkXNoPath: If a target cannot be reached
+        """
+        with self.router.profiler.phase("routing"):
+            costs = self.router.costs()
+            if not (costs is self._tree_costs or np.array_equal(costs, self._tree_costs)):
+                self._trees = {}
+            self._tree_costs = costs
+            sources, row = np.unique(self._to_graph[targets], return_inverse=True)
+            missing = [source for source in sources.tolist() if source not in self._trees]
+            if missing:
+                self._reverse.data[:] = costs[self._reverse_edges]
+                predecessors = dijkstra(self._reverse, directed=True, indices=missing, return_predecessors=True)[1]
+                self._trees.update(zip(missing, predecessors))
+                self.searches += len(missing)
+            following = np.array([self._trees[source] for source in sources.tolist()])[row, self._to_graph[nodes]]
+        if np.any(following < 0):
+            raise nx.NetworkXNoPath("Some destinations are not reachable from the current nodes")
+        keys = nodes.astype(np.int64) * len(self.stats.node_ids) + self._to_stats[following]
+        return self._link_order[np.searchsorted(self._link_keys, keys)]
+
+    def _enter(self, slots: np.ndarray, links: np.ndarray, lanes: np.ndarray, time: int,
+               spawned: bool) -> np.ndarray:
+        """Put vehicles on their new links and return their rows at block 0 (not yet appended).
+
+        A spawned vehicle makes its first move in the first tick from `time` on, a
+        vehicle that crossed an intersection in the next tick. It then moves one
+        block per tick up to the stop line.
+        """
+        graph = self.graph
+        counts = np.bincount(links, minlength=len(graph.occupancy))
+        graph.occupancy += counts
+        graph.entries += counts
+        blocks = self.blocks[links]
+        first = -(-time // 5) * 5 if spawned else time + 5
+        self.link[slots] = links
+        self.lane[slots] = lanes
+        av = self.stats.type[slots] == 1
+        self.group[slots] = np.where(av & ((lanes > 2) | self.av_lanes[links]), AV_LANES, REGULAR)
+        self.ready[slots] = first + (blocks - 1) * 5
+        self.stop[slots] = np.where(blocks > 1, self.ready[slots] - 5, -1)
+        rows = np.zeros(len(slots), dtype=self.stats.ROW)
+        rows["time"] = time
+        rows["slot"] = slots
+        rows["origin"] = self.tail[links]
+        rows["destination"] = self.head[links]
+        rows["lane"] = lanes
+        rows["arrival_time"] = time
+        rows["light"] = np.where(blocks > 1, 0, graph.lights[links, lanes])
+        return rows
+
+    def spawn(self, trips: np.ndarray, time: int) -> None:
+        """Add the vehicles of released demand rows (see `Demand.Demand_Feeder.release`).
+
+        Args:
+            trips (np.ndarray): Demand rows with ID, Origin, Destination, lane and type
+            time (int): Current simulation time
+        """
+        if not len(trips):
+            return
+        stats = self.stats
+        slots = stats.add_many([str(int(id)) for id in trips["ID"]],
+                               np.where(trips["type"] == 1, stats.TYPES.index("HDV"), stats.TYPES.index("AV")))
+        self._reserve(int(slots[-1]) + 1)
+        origins = np.array([stats.node_index[str(int(node))] for node in trips["Origin"]], dtype=np.int64)
+        self.target[slots] = [stats.node_index[str(int(node))] for node in trips["Destination"]]
+        rows = self._enter(slots, self._next_links(origins, self.target[slots]),
+                           trips["lane"].astype(np.int64) - 1, time, spawned=True)
+        stats.set_entered(rows, stats.append(rows) + np.arange(len(rows)))
+        self.slots = np.concatenate([self.slots, slots])
+
+    def _queues(self, time: int) -> tuple:
+        """Vehicles waiting at their stop lines and their place in the queue.
+
+        Returns:
+            tuple: Positions in `slots` of the waiting vehicles, grouped by queue in arrival
+                order, and their lane and block (the stop-line block first)
+        """
+        slots = self.slots
+        queue = np.flatnonzero(self.ready[slots] <= time)
+        queue_slots = slots[queue]
+        key = self.link[queue_slots] * 2 + self.group[queue_slots]
+        order = np.lexsort((queue_slots, self.ready[queue_slots], key))
+        queue, queue_slots, key = queue[order], queue_slots[order], key[order]
+        rank = np.arange(len(queue)) - np.searchsorted(key, key)
+        group = self.group[queue_slots]
+        per_block = self.capacity * GROUP_SIZE[group]
+        lane = GROUP_LANES[group, rank % per_block // self.capacity]
+        block = np.maximum(self.blocks[self.link[queue_slots]] - 1 - rank // per_block, 0)
+        return queue, lane, block
+
+    def step(self, time: int) -> None:
+        """Move the vehicles of one tick: stop line arrivals, exits, queues and crossings.
+
+        Args:
+            time (int): Current simulation time (a multiple of 5)
+        """
+        stats, graph = self.stats, self.graph
+        slots = self.slots
+        link = self.link[slots]
+
+        # Exits at the destination
+        leaving = (self.ready[slots] <= time) & (self.head[link] == self.target[slots])
+        if leaving.any():
+            stats.active[slots[leaving]] = False
+            graph.occupancy -= np.bincount(link[leaving], minlength=len(graph.occupancy))
+            self.slots = slots = slots[~leaving]
+            link = link[~leaving]
+
+        # The stop-line block of a green lane crosses
+        queue, queue_lane, queue_block = self._queues(time)
+        max_pos = self.blocks[link[queue]] - 1
+        green = graph.lights[link[queue], queue_lane] == Intersection.GREEN
+        crossing = green & (queue_block == max_pos)
+        stats.stuck_steps += int((~crossing).sum())
+        stats.failed_moves += int((green & ~crossing).sum())
+
+        # One row per vehicle that reaches its stop line or waits in a queue
+        arriving = np.flatnonzero(self.stop[slots] == time)
+        waiting = queue[~crossing]
+        recorded = np.concatenate([arriving, waiting])
+        if len(recorded):
+            recorded_slots = slots[recorded]
+            rows = np.zeros(len(recorded), dtype=stats.ROW)
+            rows["time"] = time
+            rows["slot"] = recorded_slots
+            rows["origin"] = self.tail[link[recorded]]
+            rows["destination"] = self.head[link[recorded]]
+            rows["lane"] = np.concatenate([GROUP_LANES[self.group[slots[arriving]], 0], queue_lane[~crossing]])
+            rows["block"] = np.concatenate([self.blocks[link[arriving]] - 1, queue_block[~crossing]])
+            rows["arrival_time"] = stats.arrival_time[recorded_slots]
+            rows["stuck_time"][len(arriving):] = time - self.ready[slots[waiting]] + 5
+            at_stop_line = rows["block"] == self.blocks[link[recorded]] - 1
+            rows["light"] = np.where(at_stop_line, graph.lights[link[recorded], rows["lane"]], 0)
+            stats.set_current(rows, stats.append(rows) + np.arange(len(rows)))
+
+        # Crossings in the order of the block model (arrival plus stuck time). Each crosser gets
+        # a row at its stop line and one at block 0 of its next link, interleaved as in the log of
+        # the block model, and all are routed together once they left their links.
+        crossers = slots[queue[crossing]]
+        order = np.lexsort((crossers, stats.arrival_time[crossers] + time - self.ready[crossers]))
+        crossers, crossing_lane = crossers[order], queue_lane[crossing][order]
+        if len(crossers):
+            link = self.link[crossers]
+            rows = np.zeros(2 * len(crossers), dtype=stats.ROW)
+            rows["time"][0::2] = time
+            rows["slot"][0::2] = crossers
+            rows["origin"][0::2] = self.tail[link]
+            rows["destination"][0::2] = self.head[link]
+            rows["lane"][0::2] = crossing_lane
+            rows["block"][0::2] = self.blocks[link] - 1
+            rows["arrival_time"][0::2] = stats.arrival_time[crossers]
+            rows["stuck_time"][0::2] = time - self.ready[crossers]
+            rows["light"][0::2] = Intersection.GREEN
+            graph.occupancy -= np.bincount(link, minlength=len(graph.occupancy))
+            rows[1::2] = self._enter(crossers, self._next_links(self.head[link], self.target[crossers]),
+                                     crossing_lane, time, spawned=False)
+            first = stats.append(rows)
+            stats.set_current(rows[0::2], first + np.arange(0, len(rows), 2))
+            stats.set_entered(rows[1::2], first + np.arange(1, len(rows), 2))
+        self.crossings += len(crossers)
+        self._write_lanes(time)
+
+    def _write_lanes(self, time: int) -> None:
+        """Rebuild the lane counts of `graph.lane_occupancy` from the queues and free flow positions."""
+        graph = self.graph
+        occupancy = graph.lane_occupancy.reshape(-1)
+        occupancy[self._written] = 0
+        slots = self.slots
+        link = self.link[slots]
+        blocks = self.blocks[link]
+        lane = np.empty(len(slots), dtype=np.int64)
+        position = np.empty(len(slots), dtype=np.int64)
+
+        queue, lane[queue], position[queue] = self._queues(time)
+        end = np.full(len(graph.blocks) * 2, graph.max_blocks, dtype=np.int64)
+        key = link * 2 + self.group[slots]
+        np.minimum.at(end, key[queue], position[queue])
+
+        # The others are one block further every tick since their first move, behind their queue.
+        # They keep their lane up to the lane changing zone.
+        running = np.flatnonzero(self.ready[slots] > time)
+        running_slots = slots[running]
+        first = self.ready[running_slots] - (blocks[running] - 1) * 5
+        free = np.clip((time - first) // 5 + 1, 0, blocks[running] - 1)
+        position[running] = np.clip(np.minimum(free, end[key[running]] - 1), 0, None)
+        changed = position[running] >= self.zone_start[link[running]]
+        lane[running] = np.where(changed, GROUP_LANES[self.group[running_slots], 0], self.lane[running_slots])
+
+        self._written = (link * 5 + lane) * graph.max_blocks + graph.max_blocks - blocks + position
+        occupancy += np.bincount(self._written, minlength=len(occupancy)).astype(occupancy.dtype)
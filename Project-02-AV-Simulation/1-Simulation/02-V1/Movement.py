@@ -0,0 +1,261 @@
+"""Movement rules of the vehicles as a lookup table, and a batched resolver for the tick mode.
+
+A vehicle on a link is in one of these zones, counted from the stop line back:
+- SIMPLE: far from the intersection
+- LANE_CHANGING: the lane changing zone before the AV-only section
+- WARNING: the last block of the lane changing zone. HDVs in lane 4 may only
+  move left here, so that they leave the AV lanes in time.
+- END: the AV-only section before the stop line
+- STOP_LINE: the last block, where the vehicle crosses or waits at the light
+
+In the first four zones a vehicle tries the actions of `RULES[zone][lane][type]`
+in order until one works: FORWARD, LEFT or RIGHT, each one block ahead.
+`None` marks a state the rules forbid (HDVs in the AV lanes of the END zone).
+"""
+import numpy as np
+
+SIMPLE, LANE_CHANGING, WARNING, END, STOP_LINE = range(5)
+ZONES = ["simple", "lane changing", "warning", "end", "stop line"]
+FORWARD, LEFT, RIGHT = 0, 1, 2
+# Lane change of each action
+LANE_STEP = np.array([0, -1, 1])
+
+F, L, R = FORWARD, LEFT, RIGHT
+# (zone, lane) -> (HDV actions, AV actions), types in the order of State_Store.TYPES
+POLICY = {
+    (SIMPLE, 0): ((F, R), (F, R)),
+    (SIMPLE, 1): ((F, L), (F, R)),
+    (SIMPLE, 2): ((F, L), (F, R)),
+    (SIMPLE, 3): ((F, L), (F, R)),
+    (SIMPLE, 4): ((F, L), (F, L)),
+    (LANE_CHANGING, 0): ((F, R), (R, F)),
+    (LANE_CHANGING, 1): ((L, F, R), (R, F, L)),
+    (LANE_CHANGING, 2): ((L, F), (R, F, L)),
+    (LANE_CHANGING, 3): ((L, F), (F, R)),
+    (LANE_CHANGING, 4): ((L, F), (F, L)),
+    (WARNING, 0): ((F, R), (R, F)),
+    (WARNING, 1): ((L, F, R), (R, F, L)),
+    (WARNING, 2): ((L, F), (R, F, L)),
+    (WARNING, 3): ((L, F), (F, R)),
+    (WARNING, 4): ((L,), (F, L)),
+    (END, 0): ((F, R), (R, F)),
+    (END, 1): ((L, F, R), (R, F, L)),
+    (END, 2): ((L, F), (R, F)),
+    (END, 3): (None, (R, F)),
+    (END, 4): (None, (F, L)),
+}
+del F, L, R
+
+# RULES[zone][lane][type]: action tuple or None, for the per-vehicle path
+RULES = [[POLICY[(zone, lane)] for lane in range(5)] for zone in range(STOP_LINE)]
+# Same rules as arrays (zone x lane x type x 3 actions, -1 pads), for the batched path
+TABLE = np.full((STOP_LINE, 5, 2, 3), -1, dtype=np.int64)
+ALLOWED = np.zeros((STOP_LINE, 5, 2), dtype=bool)
+for (zone, lane), types in POLICY.items():
+    for type_, actions in enumerate(types):
+        if actions is not None:
+            TABLE[zone, lane, type_, :len(actions)] = actions
+            ALLOWED[zone, lane, type_] = True
+
+
+def zone_of(pos: int, max_pos: int, lane_changing_zone_length: float, dedicated_lane_length: float) -> int:
+    """Zone of a vehicle at block `pos` of a lane with last block `max_pos`.
+
+    Args:
+        pos (int): Block of the vehicle
+        max_pos (int): Last block of the lane
+        lane_changing_zone_length (float): Length of the lane changing zone in blocks
+        dedicated_lane_length (float): Length of the AV-only section in blocks
+
+    Returns:
+        int: SIMPLE, LANE_CHANGING, WARNING, END or STOP_LINE, None if pos is past the stop line
+    """
+    if pos < max_pos - lane_changing_zone_length - dedicated_lane_length:
+        return SIMPLE
+    if pos < max_pos - dedicated_lane_length:
+        return WARNING if pos == max_pos - dedicated_lane_length - 1 else LANE_CHANGING
+    if pos < max_pos:
+        return END
+    if pos == max_pos:
+        return STOP_LINE
+    return None
+
+
+def zones(pos: np.ndarray, max_pos: np.ndarray, lane_changing_zone_length: float,
+          dedicated_lane_length: float) -> np.ndarray:
+    """`zone_of` for arrays of vehicles (positions past the stop line give STOP_LINE + 1)."""
+    zone = np.full(len(pos), STOP_LINE + 1, dtype=np.int64)
+    zone[pos == max_pos] = STOP_LINE
+    zone[pos < max_pos] = END
+    zone[pos < max_pos - dedicated_lane_length] = LANE_CHANGING
+    zone[pos == max_pos - dedicated_lane_length - 1] = WARNING
+    zone[pos < max_pos - lane_changing_zone_length - dedicated_lane_length] = SIMPLE
+    return zone
+
+
+class Batch_Mover:
+    """Moves the vehicles of a tick with array operations, as `Vehicle.process` on each would.
+
+    Only the order in which vehicles compete for the same block matters, and a
+    block holds `Lane.CAPACITY` vehicles. So a vehicle can be moved in the batch
+    when its first action is certain to work whatever the others do: its target
+    block has room even if every vehicle that could move there (any of their
+    actions) gets there first. These vehicles move one block ahead, usually the
+    large majority. The rest are handed to `Vehicle.process` in their place in
+    the order:
+    - vehicles at the stop line (light, exit and routing)
+    - vehicles whose target block may fill up
+    - vehicles with tracking on, which print their moves
+
+    The history rows and the lane counts of the batch are written segment by
+    segment between these vehicles, so the log has the same rows in the same
+    order as the per-vehicle loop.
+
+    Attributes:
+        graph (Graph_Generator): Network with the lane count and light arrays
+        stats (State_Store): Vehicle state store of the simulation
+        vehicles (list): Vehicle of each slot of the store
+        moved (int): Vehicles moved in batches so far
+        processed (int): Vehicles handed to `Vehicle.process` so far
+
+    Example:
+        >>> mover = Batch_Mover(graph, stats)
+        >>> mover.add(vehicle)
+        >>> mover.step(time, stats.sorted_active_slots())
+    """
+
+    def __init__(self, graph, stats, capacity: int = 20):
+        """Initialize the mover.
+
+        Args:
+            graph (Graph_Generator): Network with the lane count and light arrays
+            stats (State_Store): Vehicle state store of the simulation
+            capacity (int, optional): Vehicles per block, see `Lane.CAPACITY`. Defaults to 20.
+        """
+        self.graph = graph
+        self.stats = stats
+        self.capacity = capacity
+        self.vehicles = []
+        self.tracked = np.zeros(0, dtype=bool)
+        self.moved = 0
+        self.processed = 0
+        self.lane_changing_zone_length = int(graph.lane_changing_zone_length / graph.each_block_length)
+        self.dedicated_lane_length = int(graph.dedicated_lane_length) / graph.each_block_length
+        # Link of each (origin code, destination code) pair of the store, looked up by sorted keys
+        nodes = len(stats.node_ids)
+        keys = np.array([stats.node_index[u] * nodes + stats.node_index[v] for u, v in graph.edge_index], dtype=np.int64)
+        self._order = np.argsort(keys)
+        self._keys = keys[self._order]
+        self._nodes = nodes
+        # Flat index of block 0 of lane 0 of each link in `graph.lane_occupancy` (lanes are padded at the front)
+        self._block_0 = (np.arange(len(graph.blocks)) * 5 * graph.max_blocks
+                         + graph.max_blocks - np.asarray(graph.blocks, dtype=np.int64))
+
+    def add(self, vehicle) -> None:
+        """Register a new vehicle (call once per vehicle, after it is created).
+
+        Args:
+            vehicle (Vehicle): The vehicle
+        """
+        if vehicle.slot >= len(self.vehicles):
+            self.vehicles.extend([None] * (vehicle.slot + 1 - len(self.vehicles)))
+        if vehicle.slot >= len(self.tracked):
+            tracked = np.zeros(max(2 * len(self.tracked), vehicle.slot + 1), dtype=bool)
+            tracked[:len(self.tracked)] = self.tracked
+            self.tracked = tracked
+        self.vehicles[vehicle.slot] = vehicle
+        self.tracked[vehicle.slot] = bool(vehicle.track)
+
+    def _links(self, origin: np.ndarray, destination: np.ndarray) -> np.ndarray:
+        """Link index of origin and destination node codes."""
+        return self._order[np.searchsorted(self._keys, origin.astype(np.int64) * self._nodes + destination)]
+
+    def step(self, time: int, slots: np.ndarray) -> None:
+        """Process the given vehicles in order, as `Vehicle.process` on each would.
+
+        Args:
+            time (int): Current simulation time
+            slots (np.ndarray): Slots of the vehicles in processing order
+        """
+        stats, graph = self.stats, self.graph
+        if not len(slots):
+            return
+        lane = stats.lane[slots].astype(np.int64)
+        pos = stats.block[slots].astype(np.int64)
+        link = self._links(stats.origin[slots], stats.destination[slots])
+        max_pos = np.asarray(graph.blocks, dtype=np.int64)[link] - 1
+        zone = zones(pos, max_pos, self.lane_changing_zone_length, self.dedicated_lane_length)
+        type_ = stats.type[slots].astype(np.int64)
+        moving = np.flatnonzero(zone < STOP_LINE)
+        moving = moving[ALLOWED[zone[moving], lane[moving], type_[moving]]]
+
+        # Every block a moving vehicle could enter, and how many vehicles could enter it
+        actions = TABLE[zone[moving], lane[moving], type_[moving]]
+        lane_base = self._block_0[link[moving]] + (pos[moving] + 1)
+        targets = lane_base[:, None] + (lane[moving][:, None] + LANE_STEP[actions]) * graph.max_blocks
+        blocks, entering = np.unique(targets[actions >= 0], return_counts=True)
+        first = targets[:, 0]
+        batch = np.zeros(len(slots), dtype=bool)
+        batch[moving] = (graph.lane_occupancy.reshape(-1)[first]
+                         + entering[np.searchsorted(blocks, first)] <= self.capacity)
+        batch &= ~self.tracked[slots]
+
+        # History rows of the batch: a lane change writes the new lane first, then the new block
+        index = np.flatnonzero(batch)
+        chosen = actions[batch[moving], 0]
+        new_lane = lane[index] + LANE_STEP[chosen]
+        changes = (chosen != FORWARD).astype(np.int64)
+        counts = 1 + changes
+        rows = np.zeros(int(counts.sum()), dtype=stats.ROW)
+        owner = np.repeat(np.arange(len(index)), counts)
+        final = np.zeros(len(rows), dtype=bool)
+        final[np.cumsum(counts) - 1] = True
+        vehicle_slots = slots[index]
+        rows["time"] = time
+        rows["slot"] = vehicle_slots[owner]
+        for name in ["origin", "destination", "arrival_time", "stuck_time"]:
+            rows[name] = getattr(stats, name)[vehicle_slots][owner]
+        rows["lane"] = new_lane[owner]
+        rows["block"] = pos[index][owner] + final
+        at_stop_line = final & (rows["block"] == max_pos[index][owner])
+        rows["light"][at_stop_line] = graph.lights[link[index][owner][at_stop_line], rows["lane"][at_stop_line]]
+        source = self._block_0[link[index]] + lane[index] * graph.max_blocks + pos[index]
+        target = first[batch[moving]]
+        row_end = np.cumsum(counts)
+        row_start = row_end - counts
+        row_numbers = np.empty(len(rows), dtype=np.int64)
+        # Only vehicles that may move (not those at the stop line) read the lane counts
+        reads_counts = zone < STOP_LINE
+
+        # Write the batch in segments, and hand the other vehicles to Vehicle.process in between
+        written = counted = 0
+        for position in np.flatnonzero(~batch).tolist():
+            stop = int(np.searchsorted(index, position))
+            if stop > written:
+                begin, end = row_start[written], row_end[stop - 1]
+                row_numbers[begin:end] = stats.append(rows[begin:end]) + np.arange(end - begin)
+                written = stop
+            if reads_counts[position] and stop > counted:
+                self._move(source[counted:stop], target[counted:stop])
+                counted = stop
+            self.vehicles[slots[position]].process()
+        if len(index) > written:
+            begin = row_start[written]
+            row_numbers[begin:] = stats.append(rows[begin:]) + np.arange(len(rows) - begin)
+        self._move(source[counted:], target[counted:])
+        stats.set_current(rows[final], row_numbers[final])
+
+        for slot, lane_number, change in zip(vehicle_slots.tolist(), new_lane.tolist(), changes.tolist()):
+            vehicle = self.vehicles[slot]
+            vehicle.current_pos += 1
+            if change:
+                vehicle.current_lane = vehicle.current_intersection.lanes[vehicle.current_path[0]][lane_number]
+        self.moved += len(index)
+        self.processed += len(slots) - len(index)
+
+    def _move(self, source: np.ndarray, target: np.ndarray) -> None:
+        """Move vehicles between blocks of `graph.lane_occupancy` (flat indices)."""
+        if len(source):
+            occupancy = self.graph.lane_occupancy.reshape(-1)
+            np.subtract.at(occupancy, source, 1)
+            np.add.at(occupancy, target, 1)
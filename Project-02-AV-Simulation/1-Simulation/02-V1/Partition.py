@@ -0,0 +1,467 @@
+import contextlib
+import io
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+import simpy
+
+import DataLoader
+import Demand
+import Players
+import Routing
+import Signals
+import StateStore
+
+# Vehicles act every TICK time steps, as in `Clock._run_gen`
+TICK = 5
+
+
+def partition_nodes(graph: DataLoader.Graph_Generator, regions: int) -> dict:
+    """Split the intersections into regions by recursive coordinate bisection.
+
+    Each split cuts the nodes at the median of their wider coordinate range, so
+    the regions are compact and have about the same number of intersections.
+
+    Args:
+        graph (Graph_Generator): Network with node positions (`graph.pos`)
+        regions (int): Number of regions
+
+    Returns:
+        dict: Maps node ids to region numbers (0 to regions - 1)
+    """
+    position = {str(row[0]): (float(row[1]), float(row[2])) for row in graph.pos.itertuples(index=False)}
+    nodes = list(graph.graph.nodes)
+    coordinates = np.array([position.get(node, (0.0, 0.0)) for node in nodes])
+    region = {}
+
+    def bisect(members: np.ndarray, first: int, count: int) -> None:
+        if count == 1 or len(members) <= 1:
+            region.update({nodes[i]: first for i in members})
+            return
+        points = coordinates[members]
+        axis = int(np.argmax(points.max(0) - points.min(0)))
+        order = members[np.argsort(points[:, axis], kind="stable")]
+        left = count // 2
+        cut = int(round(len(order) * left / count))
+        bisect(order[:cut], first, left)
+        bisect(order[cut:], first + left, count - left)
+
+    bisect(np.arange(len(nodes)), 0, regions)
+    return region
+
+
+class Region:
+    """The intersections and vehicles of one region of a partitioned simulation.
+
+    A region owns the intersections in its part of the network and every
+    vehicle on a link that ends at one of them (the lanes of a link belong to
+    the intersection at its end). Within a tick, vehicles only touch the lanes
+    of their own intersection, so regions can move their vehicles
+    independently. `Partitioned_Clock` keeps them in step:
+    - every region gets the global link counts at the start of a tick and
+      stores the counts of the other regions as the graph's background flow
+    - vehicles are moved in one global order, as `Clock` would sort them
+    - vehicles that passed into another region are handed over before the
+      lights are updated
+
+    Moves only check the block ahead (block 1 or more) and the lights of the
+    vehicle's own intersection, and a vehicle that passed an intersection stands
+    at block 0, so a vehicle handed over at the end of the tick is never missed
+    by the moves of the region it enters.
+
+    The region does not read the demand: `Partitioned_Clock` routes every trip once
+    and sends each region only the trips whose first link ends in it.
+
+    Every history row is tagged with (time, phase, position) of the record: phase 0
+    for a spawn (position in the demand batch), phase 1 for a move (position in
+    the global order). Sorting the rows of all regions by this tag gives the
+    row order of a single-process run.
+
+    Example:
+        >>> region = Region(0, owner, network_files, 500, 500, 100)
+        >>> region.tick(0, np.zeros(len(region.graph.edge_index)), trips)
+    """
+
+    def __init__(self, number: int, owner: dict, network_files: list, dedicated_lane_length: int,
+                 lane_changing_zone_length: int, each_block_length: int):
+        """Build the region's copy of the network.
+
+        Args:
+            number (int): Region number
+            owner (dict): Maps node ids to region numbers (see `partition_nodes`)
+            network_files (list): Network and node position files
+            dedicated_lane_length (int): Length of dedicated AV lanes in meters
+            lane_changing_zone_length (int): Length of lane changing zones in meters
+            each_block_length (int): Length of each road block in meters
+        """
+        self.number = number
+        self.owner = owner
+        self.env = simpy.Environment()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.graph = DataLoader.Graph_Generator(network_files=network_files,
+                                                    dedicated_lane_length=dedicated_lane_length,
+                                                    lane_changing_zone_length=lane_changing_zone_length,
+                                                    each_block_length=each_block_length)
+        self.stats = StateStore.State_Store(nodes=self.graph.graph.nodes)
+        self.router = Routing.Router(self.graph, time_bucket=TICK)
+        self.signals = Signals.Signal_Controller(self.graph, nodes=[node for node in self.graph.graph.nodes
+                                                                   if owner[node] == number])
+        self.vehicles = {}
+        self.last_key = {}
+        # Trips of this region by departure step: (positions in the step's demand batch, trips)
+        self.trips = {}
+        self.handed_over = set()
+        self._row_keys = []
+
+    def _move_to(self, time: int) -> None:
+        if time > self.env.now:
+            self.env.run(until=time)
+
+    def _tag_rows(self, start: int, key: tuple) -> None:
+        """Tag the history rows from `start` to the end with a (time, phase, position) key."""
+        if len(self.stats) > start:
+            self._row_keys.append((start, len(self.stats), *key))
+
+    def _spawn(self, time: int) -> None:
+        """Spawn this region's trips due at `time`."""
+        if time not in self.trips:
+            return
+        for position, queue in zip(*self.trips.pop(time)):
+            position = int(position)
+            origin, destination = str(int(queue["Origin"])), str(int(queue["Destination"]))
+            start = len(self.stats)
+            vehicle = Players.Vehicle(env=self.env, id=str(int(queue["ID"])), initial_path=[origin, destination],
+                                      initial_lane=str(int(queue["lane"]) - 1),
+                                      type_="HDV" if int(queue["type"]) == 1 else "AV",
+                                      graph=self.graph, stats=self.stats, router=self.router)
+            self.vehicles[vehicle.id] = vehicle
+            self.last_key[vehicle.id] = (time, 0, position)
+            self._tag_rows(start, (time, 0, position))
+
+    def tick(self, time: int, occupancy: np.ndarray, trips: dict) -> dict:
+        """Start a tick: take the routing snapshot, spawn and report the vehicles to sort.
+
+        Args:
+            time (int): Tick time
+            occupancy (np.ndarray): Global number of vehicles on each link
+            trips (dict): This region's trips of the coming steps (see `Partitioned_Clock._assign`)
+
+        Returns:
+            dict: ids, sort keys and last record keys of the active vehicles, and the number of history rows
+        """
+        self.trips.update(trips)
+        self._move_to(time)
+        self.graph.background[:] = occupancy - self.graph.occupancy
+        self.router.advance(time)
+        self._spawn(time)
+        ids = list(self.vehicles)
+        slots = np.array([self.vehicles[id].slot for id in ids], dtype=np.int64)
+        last = np.array([self.last_key[id] for id in ids], dtype=np.int64).reshape(-1, 3)
+        return {"ids": np.array(ids, dtype=np.int64),
+                "key": self.stats.arrival_time[slots] + self.stats.stuck_time[slots],
+                "last": last,
+                "rows": len(self.stats)}
+
+    def process(self, time: int, ids: np.ndarray, positions: np.ndarray) -> list:
+        """Move the given vehicles in the given (global) order.
+
+        Args:
+            time (int): Tick time
+            ids (np.ndarray): Vehicle ids in processing order
+            positions (np.ndarray): Position of each vehicle in the global order
+
+        Returns:
+            list: (target region, vehicle state) of the vehicles that left the region
+        """
+        leaving = []
+        for id, position in zip(ids, positions):
+            id = str(id)
+            vehicle = self.vehicles[id]
+            start = len(self.stats)
+            vehicle.process()
+            key = (time, 1, int(position))
+            self._tag_rows(start, key)
+            self.last_key[id] = key
+            if not self.stats.active[vehicle.slot]:
+                del self.vehicles[id], self.last_key[id]
+                continue
+            target = self.owner[vehicle.current_path[1]]
+            if target != self.number:
+                leaving.append((target, {**vehicle.get_state(), "last_key": key}))
+                self._hand_over(vehicle)
+        return leaving
+
+    def _hand_over(self, vehicle: Players.Vehicle) -> None:
+        """Remove a vehicle that moved to another region from this region's state."""
+        vehicle.current_lane.leave(block=vehicle.current_pos)
+        self.graph.occupancy[self.graph.edge_index[tuple(vehicle.current_path)]] -= 1
+        self.stats.deactivate(vehicle.slot)
+        self.handed_over.add(vehicle.slot)
+        del self.vehicles[vehicle.id], self.last_key[vehicle.id]
+
+    def receive(self, time: int, states: list, recorded: bool) -> None:
+        """Take over vehicles from other regions, then update the lights of the region.
+
+        Args:
+            time (int): Tick time
+            states (list): Vehicle states from `process` of other regions
+            recorded (bool): True if any region has recorded a history row
+        """
+        for state in states:
+            vehicle = Players.Vehicle.from_state(self.env, state, self.stats, self.graph, self.router)
+            vehicle.current_lane.arrive(block=vehicle.current_pos)
+            self.graph.occupancy[self.graph.edge_index[tuple(vehicle.current_path)]] += 1
+            self.vehicles[vehicle.id] = vehicle
+            self.last_key[vehicle.id] = tuple(state["last_key"])
+        if recorded:
+            self.signals.update(time)
+
+    def advance(self, start: int, stop: int, trips: dict) -> np.ndarray:
+        """Run the spawn-only time steps between two ticks.
+
+        Args:
+            start (int): First time step
+            stop (int): Time step after the last one
+            trips (dict): This region's trips of these steps, if no tick sent them
+
+        Returns:
+            np.ndarray: Number of this region's vehicles on each link
+        """
+        self.trips.update(trips)
+        for time in range(start, stop):
+            self._move_to(time)
+            self.router.advance(time)
+            self._spawn(time)
+        return self.graph.occupancy.copy()
+
+    def frame(self) -> pd.DataFrame:
+        """History of the region with the row keys (_time, _phase, _position)."""
+        frame = self.stats.to_frame()
+        keys = np.zeros((len(frame), 3), dtype=np.int64)
+        for start, stop, *key in self._row_keys:
+            keys[start:stop] = key
+        frame["_time"], frame["_phase"], frame["_position"] = keys.T
+        return frame
+
+    def summary(self) -> dict:
+        """Ids of the region's vehicles and trip totals of the vehicles it did not hand over."""
+        n = len(self.stats.ids)
+        keep = np.ones(n, dtype=bool)
+        keep[list(self.handed_over)] = False
+        return {"active": self.stats.active[:n][keep],
+                "time": self.stats.time[:n][keep],
+                "departure_time": self.stats.departure_time[:n][keep],
+                "total_stuck_time": self.stats.total_stuck_time[:n][keep],
+                "vehicles": list(self.vehicles),
+                "entries": self.graph.entries.copy(),
+                "routing": self.router.report()}
+
+
+def _serve(connection, arguments: tuple) -> None:
+    """Worker process loop: build a region and run the calls sent by the coordinator."""
+    region = Region(*arguments)
+    connection.send(None)
+    while True:
+        call = connection.recv()
+        if call is None:
+            break
+        name, call_arguments = call
+        connection.send(getattr(region, name)(*call_arguments))
+    connection.close()
+
+
+class Partitioned_Clock:
+    """Tick-mode simulation split into regions that run in separate worker processes.
+
+    The network is cut into `workers` regions (see `partition_nodes`). Every
+    worker runs the intersections and vehicles of one region. At each tick
+    (every 5 time steps) the coordinator:
+    0. routes the trips of the coming 5 steps on the global routing snapshot and
+       sends each one only to the region that owns its first link
+    1. sends the global link counts, so every region routes on the same snapshot
+    2. collects the active vehicles and sorts them into the global order
+    3. lets every region move its vehicles in that order, in parallel
+    4. hands the vehicles that crossed into another region over in one batch,
+       then the regions update their lights
+
+    Results match `Clock(mode="tick", routing_time_bucket=5)`, the single-process
+    run with the same routing snapshot, row for row. With live routing costs
+    (no time bucket) a vehicle would see the moves made earlier in the same
+    tick in every region, which needs a sequential run.
+
+    Attributes:
+        owner (dict): Maps node ids to region numbers
+        time (int): Current simulation time
+
+    Example:
+        >>> world = Partitioned_Clock(network_files, dedicated_lane_length=500,
+        ...                           lane_changing_zone_length=500, workers=4)
+        >>> world.generate_vehicles("demand.csv")
+        >>> world.run(until=10000)
+        >>> world.kpis()
+        >>> world.close()
+    """
+
+    def __init__(self, network_files: list, dedicated_lane_length: int, lane_changing_zone_length: int,
+                 each_block_length: int = 100, workers: int = 2):
+        """Build the partition.
+
+        Args:
+            network_files (list): Network and node position files
+            dedicated_lane_length (int): Length of dedicated AV lanes in meters
+            lane_changing_zone_length (int): Length of lane changing zones in meters
+            each_block_length (int, optional): Length of each road block. Defaults to 100 meters.
+            workers (int, optional): Number of regions and worker processes. Defaults to 2.
+        """
+        self.network_files = [str(file) for file in network_files]
+        self.parameters = (dedicated_lane_length, lane_changing_zone_length, each_block_length)
+        self.workers = workers
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.graph = DataLoader.Graph_Generator(network_files=self.network_files,
+                                                    dedicated_lane_length=dedicated_lane_length,
+                                                    lane_changing_zone_length=lane_changing_zone_length,
+                                                    each_block_length=each_block_length)
+        self.owner = partition_nodes(self.graph, workers)
+        self.links = len(self.graph.edge_index)
+        # Routes the first link of each trip on the same snapshot as the regions
+        self.router = Routing.Router(self.graph, time_bucket=TICK)
+        self.demand = None
+        self.time = 0
+        self._connections = []
+        self._processes = []
+        self._occupancy = np.zeros(self.links, dtype=np.int64)
+        print(f"[INFO] Network split into {workers} regions of "
+              f"{np.bincount(list(self.owner.values()), minlength=workers).tolist()} intersections.")
+
+    def generate_vehicles(self, file_path: str) -> None:
+        """Load the demand CSV file and start the worker processes.
+
+        Args:
+            file_path (str): Demand file in the layout of demand.csv
+        """
+        self.demand = Demand.Demand_Feeder.from_frame(pd.read_csv(file_path))
+        context = mp.get_context()
+        for number in range(self.workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve, daemon=True,
+                                      args=(child, (number, self.owner, self.network_files, *self.parameters)))
+            process.start()
+            self._connections.append(parent)
+            self._processes.append(process)
+        for connection in self._connections:
+            connection.recv()
+        print(f"[INFO] {self.workers} region workers started.")
+
+    def _call_all(self, name: str, arguments: list) -> list:
+        """Call a `Region` method in every worker at once and collect the results."""
+        for connection, call_arguments in zip(self._connections, arguments):
+            connection.send((name, call_arguments))
+        return [connection.recv() for connection in self._connections]
+
+    def _assign(self, start: int, stop: int) -> list:
+        """Release the trips of time steps start to stop - 1 and split them by the region of their first link.
+
+        The regions route on a snapshot of the global link counts taken at each tick,
+        so the coordinator's router, fed the same counts as background flow, finds
+        the same first link.
+
+        Returns:
+            list: Per region a dict {time step: (positions in the step's demand batch, trips)}
+        """
+        trips = [{} for _ in range(self.workers)]
+        if start % TICK == 0:
+            self.graph.background[:] = self._occupancy
+        for time in range(start, stop):
+            self.router.advance(time)
+            batch = self.demand.release(time)
+            if not len(batch):
+                continue
+            region = np.array([self.owner[self.router.next_hop(str(int(origin)), str(int(destination)))[1]]
+                               for origin, destination in zip(batch["Origin"], batch["Destination"])])
+            for number in np.unique(region):
+                positions = np.flatnonzero(region == number)
+                trips[number][time] = (positions, batch[positions])
+        return trips
+
+    def _tick(self, time: int, trips: list) -> None:
+        """One synchronized tick: snapshot, global sort, parallel moves, hand-over, lights."""
+        reports = self._call_all("tick", [(time, self._occupancy, region_trips) for region_trips in trips])
+        ids = np.concatenate([report["ids"] for report in reports])
+        key = np.concatenate([report["key"] for report in reports])
+        last = np.concatenate([report["last"] for report in reports])
+        worker = np.concatenate([np.full(len(report["ids"]), i) for i, report in enumerate(reports)])
+        # Same order as State_Store.sorted_active_ids: by key, ties by the order of the last record
+        order = np.lexsort((last[:, 2], last[:, 1], last[:, 0], key))
+        position = np.empty(len(order), dtype=np.int64)
+        position[order] = np.arange(len(order))
+        calls = []
+        for i in range(self.workers):
+            mine = order[worker[order] == i]
+            calls.append((time, ids[mine], position[mine]))
+        leaving = self._call_all("process", calls)
+        incoming = [[] for _ in range(self.workers)]
+        for states in leaving:
+            for target, state in states:
+                incoming[target].append(state)
+        recorded = sum(report["rows"] for report in reports) > 0
+        self._call_all("receive", [(time, states, recorded) for states in incoming])
+
+    def run(self, until: int = 60) -> None:
+        """Run the simulation up to (not including) time step `until`.
+
+        Args:
+            until (int, optional): End time. Defaults to 60.
+        """
+        time = self.time
+        while time < until:
+            start = time
+            stop = min((time // TICK + 1) * TICK, until)
+            trips = self._assign(time, stop)
+            if time % TICK == 0:
+                self._tick(time, trips)
+                start = time + 1
+                trips = [{}] * self.workers
+            self._occupancy = np.sum(self._call_all("advance", [(start, stop, region_trips)
+                                                                for region_trips in trips]), axis=0)
+            time = stop
+        self.time = until
+
+    def to_frame(self) -> pd.DataFrame:
+        """History of all regions in the row order of a single-process run.
+
+        Returns:
+            pd.DataFrame: Same layout as `State_Store.to_frame()`
+        """
+        frames = self._call_all("frame", [()] * self.workers)
+        frame = pd.concat(frames, ignore_index=True)
+        frame = frame.sort_values(["_time", "_phase", "_position"], kind="stable").reset_index(drop=True)
+        active = set().union(*[summary["vehicles"] for summary in self._call_all("summary", [()] * self.workers)])
+        last = ~frame["vehicle_id"].duplicated(keep="last")
+        frame["active"] = last & frame["vehicle_id"].isin(active)
+        return frame.drop(columns=["_time", "_phase", "_position"])
+
+    def kpis(self) -> dict:
+        """Key performance indicators, same fields as `Clock.kpis()`."""
+        summaries = self._call_all("summary", [()] * self.workers)
+        merged = {name: np.concatenate([summary[name] for summary in summaries])
+                  for name in ["active", "time", "departure_time", "total_stuck_time"]}
+        spawned = len(merged["active"])
+        done = ~merged["active"] & (merged["departure_time"] >= 0)
+        travel_time = merged["time"][done] - merged["departure_time"][done]
+        completed = int(done.sum())
+        return {"time": self.time,
+                "spawned": spawned,
+                "completed": completed,
+                "completion_rate": completed / spawned if spawned else 0.0,
+                "throughput": completed / self.time if self.time else 0.0,
+                "mean_stuck_time": float(merged["total_stuck_time"].mean()) if spawned else 0.0,
+                "mean_travel_time": float(travel_time.mean()) if len(travel_time) else 0.0}
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        for connection in self._connections:
+            connection.send(None)
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
@@ -1,30 +1,36 @@
 import simpy
 import networkx as nx
-import pandas as pd
+import numpy as np
+from StateStore import State_Store
+from Routing import Router
+import Movement
 
 class Lane:
+    CAPACITY = 20  # Vehicles per block
+    __slots__ = ("id", "blue", "green", "blocks", "dedicated_lane_length", "lane_changing_zone_length", "path")
+
     def __init__(self, 
                  id: str,
                  blocks: int,
                  dedicated_lane_length: int,
-                 lane_changing_zone_length: int):
+                 lane_changing_zone_length: int,
+                 path: np.ndarray = None):
         """Initialize a new lane.
         
         Args:
-            id (str): Lane identifier (0-4)
+            id (int): Lane number (0-4)
             blocks (int): Total number of blocks in the lane
             dedicated_lane_length (int): Length of AV-only section in blocks
             lane_changing_zone_length (int): Length of lane changing section in blocks
+            path (np.ndarray, optional): Integer array (view) to hold the block counts. Defaults to a new array.
         """
-        self.id = id
-        self.blue = True if int(id) > 2 else False
-        self.green = True if int(id) <= 2 else False
+        self.id = int(id)
+        self.blue = True if self.id > 2 else False
+        self.green = True if self.id <= 2 else False
         self.blocks = int(blocks)
         self.dedicated_lane_length = dedicated_lane_length
         self.lane_changing_zone_length = lane_changing_zone_length
-        self.path = {}
-        for i in range(self.blocks):
-            self.path[i] = 0  # Initialize all blocks as empty
+        self.path = np.zeros(self.blocks, dtype=np.int32) if path is None else path  # All blocks start empty
 
     def is_available(self, block: int) -> bool:
         """Check if a block has capacity for another vehicle.
@@ -33,9 +39,9 @@ class Lane:
             block (int): The block number to check
             
         Returns:
-            bool: True if block has less than 20 vehicles
+            bool: True if block has less than `CAPACITY` vehicles
         """
-        return self.path[block] < 20
+        return self.path[block] < self.CAPACITY
     
     def leave(self, block: int) -> None:
         """Remove a vehicle from a block.
@@ -55,13 +61,22 @@ class Lane:
 
 
 class Intersection:
+    BLUE_LANES = slice(3, 5)  # AV lanes (3,4)
+    GREEN_LANES = slice(0, 3)  # regular lanes (0,1,2)
+    __slots__ = ("node_id", "lanes", "lights", "occupancy", "green_events")
+    # Light codes, same as the indices of State_Store.LIGHTS
+    RED = 1
+    GREEN = 2
+
     def __init__(self,
                  node_id: str,
                  neighbors: list,
                  lengths: list,
                  dedicated_lane_length: int,
                  lane_changing_zone_length: int,
-                 each_block_length: int):
+                 each_block_length: int,
+                 occupancy: list = None,
+                 lights: list = None):
         """Initialize an intersection.
         
         Args:
@@ -71,32 +86,54 @@ class Intersection:
             dedicated_lane_length (int): Length of AV-only sections
             lane_changing_zone_length (int): Length of lane changing sections
             each_block_length (int): Length of each road block
+            occupancy (list, optional): One (5 x blocks) integer array (view) per neighbor to hold
+                the block counts. Defaults to new arrays.
+            lights (list, optional): One integer array (view) of 5 light codes per neighbor.
+                Defaults to new arrays.
         """
         self.node_id = node_id
         self.lanes = {}
         self.lights = {}
+        self.occupancy = {}
+        self.green_events = {}  # (neighbor, lane) -> event fired when that light turns green
         
         # Create lanes and lights for each approaching road segment
         for i in range(len(neighbors)):
             self.lanes[str(neighbors[i])] = []
-            self.lights[str(neighbors[i])] = []
+            # Light code of each lane, all lights start red
+            self.lights[str(neighbors[i])] = np.empty(5, dtype=np.int8) if lights is None else lights[i]
+            self.lights[str(neighbors[i])][:] = self.RED
+            # One (lane x block) count array per approach, each lane keeps a row view of it
+            if occupancy is None:
+                self.occupancy[str(neighbors[i])] = np.zeros((5, int(int(lengths[i])/each_block_length)), dtype=np.int32)
+            else:
+                self.occupancy[str(neighbors[i])] = occupancy[i]
             for j in range(5):
                 # Create lane with appropriate length in blocks
                 self.lanes[str(neighbors[i])].append(Lane(
                     id=j, 
                     blocks=int(lengths[i])/each_block_length, 
                     dedicated_lane_length=int(dedicated_lane_length)/each_block_length,
-                    lane_changing_zone_length=int(lane_changing_zone_length/each_block_length)
+                    lane_changing_zone_length=int(lane_changing_zone_length/each_block_length),
+                    path=self.occupancy[str(neighbors[i])][j]
                 ))
-                self.lights[str(neighbors[i])].append("red")  # All lights start red
         # print(f"[INFO] Intersection {self.node_id} initialized with these lanes: {self.lanes}.")
 
-    def update_lights(self, stats):
+    def reset(self) -> None:
+        """Empty all lanes and turn all lights red again."""
+        for neighbor in self.lanes.keys():
+            self.occupancy[neighbor].fill(0)
+            self.lights[neighbor][:] = self.RED
+        self.green_events.clear()
+
+    def update_lights(self, stats=None):
         """Update traffic light states based on comparing blue lanes (3,4) vs green lanes (0,1,2).
         
+        Queue lengths are read from the lane occupancy arrays of each approach.
+        
         Args:
-            stats (pd.DataFrame): DataFrame containing vehicle statistics with columns:
-                - time, vehicle_id, origin, destination, lane, block, arrival_time, stuck_time, active
+            stats (State_Store, optional): Vehicle state store, only used to skip the update
+                before anything has been recorded. Defaults to None (always update).
         
         Logic:
         1. Compare total vehicles in blue lanes (3,4) vs green lanes (0,1,2) across all directions
@@ -106,17 +143,10 @@ class Intersection:
            - Find direction with most vehicles in green lanes
            - Set only that direction's green lanes (0,1,2) to green
         """
-        if stats.empty:
+        if stats is not None and stats.empty:
             print("[INFO] No active vehicles to update lights.")
             return
             
-        # Get active vehicles only
-        active_vehicles = stats[stats['active'] == True]
-        active_vehicles = active_vehicles.copy()
-        active_vehicles['origin'] = active_vehicles['origin'].astype(str)
-        active_vehicles['destination'] = active_vehicles['destination'].astype(str)
-        active_vehicles['lane'] = active_vehicles['lane'].astype(str)
-        
         # Initialize counters for blue vs green lanes
         total_blue_lanes = 0  # lanes 3,4
         total_green_lanes = 0  # lanes 0,1,2
@@ -131,36 +161,22 @@ class Intersection:
             node_id = str(self.node_id)
             # print(f"[DEBUG] Checking neighbor {neighbor}...")
             # Count blue lanes (3,4)
-            blue_vehicles = active_vehicles[
-                (active_vehicles['destination'] == node_id) & 
-                (active_vehicles['origin'] == neighbor) &
-                (active_vehicles['lane'].isin(['3', '4']))
-            ]
-            total_blue_lanes += self.find_in_queue_vehicles_from_lane(blue_vehicles, [neighbor, node_id])
-            # print(f"[DEBUG] Blue vehicles: {len(blue_vehicles)}")
+            total_blue_lanes += self.queue_length(neighbor, self.BLUE_LANES)
 
             # Count green lanes (0,1,2)
-            green_vehicles = active_vehicles[
-                (active_vehicles['destination'] == node_id) & 
-                (active_vehicles['origin'] == neighbor) &
-                (active_vehicles['lane'].isin(['0', '1', '2']))
-            ]
-            # print(f"[DEBUG] Green vehicles: {len(green_vehicles)}")
-            green_v = self.find_in_queue_vehicles_from_lane(green_vehicles, [neighbor, node_id])
+            green_v = self.queue_length(neighbor, self.GREEN_LANES)
             total_green_lanes += green_v
             direction_green_counts[neighbor] = green_v
 
             # First set all lights to red
-            for i in range(5):
-                self.lights[neighbor][i] = "red"
+            self.lights[neighbor][:] = self.RED
 
         # print(f"[DEBUG] Total blue lanes: {total_blue_lanes}, Total green lanes: {total_green_lanes}, Direction green counts: {direction_green_counts}")
         # If blue lanes have more vehicles
         if total_blue_lanes > total_green_lanes:
             # Set all blue lanes to green in all directions
             for neighbor in self.lanes.keys():
-                self.lights[neighbor][3] = "green"
-                self.lights[neighbor][4] = "green"
+                self.lights[neighbor][self.BLUE_LANES] = self.GREEN
         
         # If green lanes have more vehicles
         else:
@@ -168,35 +184,68 @@ class Intersection:
             if direction_green_counts:  # Check if dictionary is not empty
                 max_direction = max(direction_green_counts.items(), key=lambda x: x[1])[0]
                 # Set only that direction's green lanes to green
-                self.lights[max_direction][0] = "green"
-                self.lights[max_direction][1] = "green"
-                self.lights[max_direction][2] = "green"
+                self.lights[max_direction][self.GREEN_LANES] = self.GREEN
+
+        self.wake_green()
 
         # print(f"[INFO] Traffic lights at node {self.node_id} updated: {self.lights}.")
 
-    def find_in_queue_vehicles_from_lane(self, vehicles: pd.DataFrame, od: list):
-        if not vehicles.empty:
-            vehicles = vehicles.sort_values(by=["block"], inplace=False)
-            blocks = vehicles["block"].values
-            count = 0
-            current = self.lanes[str(od[0])][0].blocks - 1
-            while current in blocks:
-                count += 1
-                current -= 1
-            return count
-        else:
-            return 0
+    def wake_green(self) -> None:
+        """Fire the events of the lights that are green now, waking up the vehicles waiting on them."""
+        for key in [key for key in self.green_events if self.lights[key[0]][key[1]] == self.GREEN]:
+            self.green_events.pop(key).succeed()
+
+    def wait_green(self, env: simpy.Environment, neighbor: str, lane: int) -> simpy.Event:
+        """Event that fires the next time a light turns green.
+
+        Used by the event-driven mode: a vehicle at a red light yields this event
+        instead of polling the light every tick.
+
+        Args:
+            env (simpy.Environment): Simulation environment
+            neighbor (str): Neighbor ID of the approach
+            lane (int): Lane number (0-4)
+
+        Returns:
+            simpy.Event: Shared by all vehicles waiting for the same light
+        """
+        key = (str(neighbor), int(lane))
+        if key not in self.green_events:
+            self.green_events[key] = env.event()
+        return self.green_events[key]
+
+    def queue_length(self, neighbor: str, lanes: slice) -> int:
+        """Count the blocks, from the stop line backwards, that are occupied without a gap.
+
+        A block counts as occupied if any of the given lanes has a vehicle in it.
+        Computed straight from the approach's occupancy array.
+
+        Args:
+            neighbor (str): Neighbor ID of the approach
+            lanes (slice): Lanes to include, e.g. `Intersection.BLUE_LANES`
+
+        Returns:
+            int: Queue length in blocks
+        """
+        occupied = (self.occupancy[str(neighbor)][lanes] > 0).any(axis=0)[::-1]
+        return len(occupied) if occupied.all() else int(occupied.argmin())
 
 class Vehicle:
+    # No per-instance __dict__: a vehicle is a fixed set of references and small numbers
+    __slots__ = ("env", "id", "AV", "HDV", "stats", "slot", "track", "initial_path", "graph", "router",
+                 "current_path", "current_intersection", "current_lane", "arrival_time", "stucked_time",
+                 "current_pos", "max_pos")
+
     def __init__(self,
                  env: simpy.Environment,
                  id: str,
                  initial_path: str,
                  initial_lane: str,
                  type_: str,
-                 stats: dict,
+                 stats: State_Store,
                  graph: nx.DiGraph,
-                 track: int = 0):
+                 track: int = 0,
+                 router: Router = None):
         """Initialize a vehicle.
         
         Args:
@@ -205,35 +254,108 @@ class Vehicle:
             initial_path (list): [start_node, end_node]
             initial_lane (str): Initial lane number (0-4)
             type_ (str): Vehicle type ("HDV" or "AV")
-            stats (pd.DataFrame): Simulation statistics
+            stats (State_Store): Vehicle state store of the simulation
             graph (nx.DiGraph): Road network graph
             track (int, optional): Debug tracking level. Defaults to 0.
+            router (Router, optional): Shared routing service. Defaults to None (own Dijkstra search per query).
         """
         self.env = env
         self.id: str = id
         self.AV: bool = True if type_.upper() == "AV" else False
         self.HDV: bool = True if type_.upper() == "HDV" else False
-        self.stats: pd.DataFrame = stats
+        self.stats: State_Store = stats
+        self.slot: int = self.stats.add(vehicle_id=self.id, type_=type_)
         self.track = track
         self.initial_path = initial_path
         self.graph = graph
+        self.router = router
         self.current_path: list = self._shortest_path(str(self.initial_path[0]), str(self.initial_path[1])) # [start node, end node]
+        self.graph.enter_link(*self.current_path)
         self.current_intersection: Intersection = self.graph.graph.nodes[str(self.current_path[1])]["intersection"]
         self.current_lane: Lane = self.current_intersection.lanes[self.current_path[0]][int(initial_lane)]
         self.arrival_time = self.env.now
         self.stucked_time = 0
         self.current_pos: int = 0
         self.max_pos: int = self.current_lane.blocks - 1
+        self.current_lane.arrive(block=0)
         self._update_stats()
         if self.track:
             print(f"[TRACK{self.track}] Initializing...")
             print(f"[TRACK{self.track}] [ID={self.id}] [path={self.current_path[0]} to {self.current_path[1]}] [lane={self.current_lane.id}] [block={self.current_pos}] [arrive_time={self.arrival_time}] [stuck_time={self.stucked_time}]")
 
+    def get_state(self) -> dict:
+        """Everything needed to rebuild this vehicle in another simulation process.
+        
+        Returns:
+            dict: Vehicle attributes and its state store entry (see `from_state`)
+        """
+        return {"id": self.id,
+                "type": "AV" if self.AV else "HDV",
+                "initial_path": list(self.initial_path),
+                "current_path": list(self.current_path),
+                "lane": self.current_lane.id,
+                "pos": self.current_pos,
+                "max_pos": self.max_pos,
+                "arrival_time": self.arrival_time,
+                "stucked_time": self.stucked_time,
+                "track": self.track,
+                "store": self.stats.get_state(self.slot)}
+
+    @classmethod
+    def from_state(cls, env: simpy.Environment, state: dict, stats: State_Store, graph,
+                   router: Router = None, slot: int = None) -> "Vehicle":
+        """Rebuild a vehicle from `get_state` without routing or moving it.
+        
+        The vehicle is registered in `stats` without a history row. Lane and link
+        occupancy are left to the caller.
+        
+        Args:
+            env (simpy.Environment): Simulation environment
+            state (dict): State from `get_state`
+            stats (State_Store): Vehicle state store of this simulation
+            graph (Graph_Generator): Road network graph
+            router (Router, optional): Shared routing service. Defaults to None.
+            slot (int, optional): Slot of `stats` that already holds the vehicle, e.g. after
+                `State_Store.restore`. The "store" entry of the state is then not needed.
+                Defaults to None (add the vehicle to `stats`).
+            
+        Returns:
+            Vehicle: The rebuilt vehicle
+        """
+        vehicle = cls.__new__(cls)
+        vehicle.env = env
+        vehicle.id = state["id"]
+        vehicle.AV = state["type"] == "AV"
+        vehicle.HDV = state["type"] == "HDV"
+        vehicle.stats = stats
+        if slot is None:
+            vehicle.slot = stats.add(vehicle_id=vehicle.id, type_=state["type"])
+            stats.set_state(vehicle.slot, state["store"])
+        else:
+            vehicle.slot = slot
+        vehicle.track = state["track"]
+        vehicle.initial_path = list(state["initial_path"])
+        vehicle.graph = graph
+        vehicle.router = router
+        vehicle.current_path = list(state["current_path"])
+        vehicle.current_intersection = graph.graph.nodes[str(vehicle.current_path[1])]["intersection"]
+        vehicle.current_lane = vehicle.current_intersection.lanes[vehicle.current_path[0]][state["lane"]]
+        vehicle.arrival_time = state["arrival_time"]
+        vehicle.stucked_time = state["stucked_time"]
+        vehicle.current_pos = state["pos"]
+        vehicle.max_pos = state["max_pos"]
+        return vehicle
+
     def _shortest_path(self, from_: str, to_: str) -> list:
         """Calculate the shortest path considering current traffic conditions.
         
         Uses a modified Dijkstra algorithm where edge weights are travel times
-        calculated using the BPR formula with current traffic counts.
+        calculated using the BPR formula with current traffic counts. The counts
+        are read from the live link occupancy of the graph, not from the history,
+        and all link costs are evaluated in one vectorized pass before the search.
+        
+        If the vehicle has a router, the query is answered from the router's
+        cached shortest-path trees instead.
         
         Args:
             from_ (str): Starting node ID
@@ -245,15 +367,14 @@ class Vehicle:
         Note:
             This is a private method used internally for navigation.
         """
-        # Get current traffic counts
-        active_stats = self.stats[self.stats["active"] == True]
-        link_counts = active_stats.groupby(["origin", "destination"]).size().to_dict()
-        
+        if self.router is not None:
+            return self.router.next_hop(from_, to_)
+
         # Calculate travel time based on current traffic
+        costs = self.graph.link_costs()
+        
         def travel_time(u, v, data):
-            n_cars = link_counts.get((u, v), 0)
-            x = data["param"]
-            return float(data["expr"].subs(x, n_cars))
+            return costs[data["index"]]
         
         # Find shortest path using current travel times
         path = nx.shortest_path(self.graph.graph, source=from_, target=to_, weight=travel_time)
@@ -261,33 +382,29 @@ class Vehicle:
             return [path[0], path[1]]  # Return next step in path
         
     def _update_stats(self) -> None:
-        """Update vehicle statistics in the simulation DataFrame.
+        """Update vehicle statistics in the simulation state store.
         
         Updates:
-        - Marks previous position as inactive
-        - Adds new row with current position and status
+        - Overwrites the current state of this vehicle's slot
+        - Appends a row with current position and status to the history log
         
         Note:
             This is a private method called after any vehicle movement.
         """
-        # Mark previous position as inactive
-        self.stats.loc[self.stats["vehicle_id"] == self.id, "active"] = False
         light = self.current_intersection.lights[self.current_path[0]][self.current_lane.id]
-        light = "none" if self.current_pos != self.max_pos else light
-        # Add new row with current state
-        self.stats.loc[len(self.stats)] = [
-            self.env.now,         # Current time
-            self.id,              # Vehicle ID
-            self.current_path[0], # Current node
-            self.current_path[1], # Next node
-            self.current_lane.id, # Current lane
-            self.current_pos,     # Block position
-            self.arrival_time,    # Arrival time
-            self.stucked_time,    # Stuck time
-            True,                  # Active flag
-            light,                 # Light status
-            "AV" if self.AV else "HDV",  # Vehicle type
-        ]
+        light = "none" if self.current_pos != self.max_pos else State_Store.LIGHTS[light]
+        # Record current state
+        self.stats.record(
+            self.slot,
+            time=self.env.now,
+            origin=self.current_path[0],
+            destination=self.current_path[1],
+            lane=self.current_lane.id,
+            block=self.current_pos,
+            arrival_time=self.arrival_time,
+            stuck_time=self.stucked_time,
+            light=light,
+        )
 
     def update_path(self, new_path: list, intersection: Intersection, lane_num: int) -> None:
         """Update vehicle's path when entering a new road segment.
@@ -363,10 +480,10 @@ class Vehicle:
             print(f"[TRACK{self.track}] Try to go to 'left'...")
             
         # Check if target position is available
-        target_lane = self.current_intersection.lanes[self.current_path[0]][int(self.current_lane.id)-1]
+        target_lane = self.current_intersection.lanes[self.current_path[0]][self.current_lane.id-1]
         if target_lane.is_available(block=self.current_pos+1):
             self.current_lane.leave(block=self.current_pos)
-            self._update_lane(new_lane=int(self.current_lane.id)-1)
+            self._update_lane(new_lane=self.current_lane.id-1)
             self.current_lane.arrive(block=self.current_pos+1)
             self.current_pos += 1
             
@@ -398,10 +515,10 @@ class Vehicle:
             print(f"[TRACK{self.track}] Try to go to 'right'...")
             
         # Check if target position is available
-        target_lane = self.current_intersection.lanes[self.current_path[0]][int(self.current_lane.id)+1]
+        target_lane = self.current_intersection.lanes[self.current_path[0]][self.current_lane.id+1]
         if target_lane.is_available(block=self.current_pos+1):
             self.current_lane.leave(block=self.current_pos)
-            self._update_lane(new_lane=int(self.current_lane.id)+1)
+            self._update_lane(new_lane=self.current_lane.id+1)
             self.current_lane.arrive(block=self.current_pos+1)
             self.current_pos += 1
             
@@ -458,6 +575,7 @@ class Vehicle:
         if self.track:
             print(f"[TRACK{self.track}] Stucked!...")
         self.stucked_time += 5
+        self.stats.stuck_steps += 1
 
     def _action_flr(self, p: list) -> bool:
         """Execute movement actions in priority order.
@@ -493,122 +611,34 @@ class Vehicle:
             
         # If no movement possible, update stuck time
         if not done:
+            self.stats.failed_moves += 1
             self._cant_move()
             
         return done
 
-    def _simple_process(self) -> bool:
-        """Handle vehicle movement when far from intersection.
-        
-        Movement strategy varies by lane and vehicle type:
+    def _zone_process(self, zone: int) -> bool:
+        """Move the vehicle by the rules of its zone, lane and type (see `Movement.POLICY`).
         
-        Lane 0 (rightmost):
-        - All vehicles: Try forward, then right
+        The rules give the actions to try in order, e.g. (RIGHT, FORWARD) for an
+        AV in lane 0 of the lane changing zone: move right if possible, otherwise
+        forward. HDVs in lane 4 may only move left in the WARNING block before the
+        AV-only section.
         
-        Lane 4 (leftmost):
-        - All vehicles: Try forward, then left
-        
-        Lanes 1-3 (middle):
-        - HDV: Try forward, then left
-        - AV: Try forward, then right
+        Args:
+            zone (int): Zone of the vehicle (SIMPLE, LANE_CHANGING, WARNING or END)
         
         Returns:
             bool: True if movement succeeded, False if vehicle is stuck
             
         Note:
-            This is a private method used when vehicle is in the simple movement zone.
+            This is a private method used when vehicle is on a link, before the stop line.
         """
         if self.track:
-            print(f"[TRACK{self.track}] Enter the simple process!")
-
-        # Lane-specific movement strategies
-        if int(self.current_lane.id) == 0:
-            done = self._action_flr(p=[0, 2])  # Forward then right
-
-        elif int(self.current_lane.id) == 4:
-            done = self._action_flr(p=[0, 1])  # Forward then left
-
-        # Middle lanes - different strategies for HDV and AV
-        elif int(self.current_lane.id) in [1, 2, 3]:
-            done = self._action_flr(p=[0, 1]) if self.HDV else False  # HDV: Forward then left
-            done = self._action_flr(p=[0, 2]) if self.AV else False   # AV: Forward then right
-
-        self._update_stats()
-        return done
-
-    def _lane_changing_process(self):
-        """This is the vehicle action for the range of near to intersection."""
-        if self.track:
-            print(f"[TRACK{self.track}] Enter the lane changing process!")
-
-        # if in 0: for HDV try to move forward, then go to right, for AV first try for right, then forward.
-        if int(self.current_lane.id) == 0:
-            done = self._action_flr(p=[0, 2]) if self.HDV else False
-            done = self._action_flr(p=[2, 0]) if self.AV else False
-
-        # if in 4: for HDV try to move left, then go to forward, for AV try to move forward then left.
-        # warning: if we are in the 2 columns before dedicated area, HDV can only move left.
-        elif int(self.current_lane.id) == 4:
-            warning_temp = self.max_pos - self.current_lane.dedicated_lane_length - 1
-            if not self.current_pos == warning_temp:
-                done = self._action_flr(p=[1, 0]) if self.HDV else False
-            else:
-                done = self._action_flr(p=[1]) if self.HDV else False
-            done = self._action_flr(p=[0, 1]) if self.AV else False
-        
-        # if in 3: for HDV try to move left, then go to forward, for AV try to move forward then right.
-        # warning: if we are in the 2 columns before dedicated area, HDV can only move left.
-        elif int(self.current_lane.id) == 3:
-            warning_temp = self.max_pos - self.current_lane.dedicated_lane_length
-            if not self.current_pos == warning_temp:
-                done = self._action_flr(p=[1, 0]) if self.HDV else False
-            else:
-                done = self._action_flr(p=[1]) if self.HDV else False
-            done = self._action_flr(p=[0, 2]) if self.AV else False
-
-        # if in 2: for HDV try to go left then forward. for AV try to go right, then forward, and then right.
-        elif int(self.current_lane.id) == 2:
-            done = self._action_flr(p=[1, 0]) if self.HDV else False
-            done = self._action_flr(p=[2, 0, 1]) if self.AV else False
-
-        # if in 1: for HDV try to go left then forward then right. for AV try to go right, then forward, then left.
-        elif int(self.current_lane.id) == 1:
-            done = self._action_flr(p=[1, 0, 2]) if self.HDV else False
-            done = self._action_flr(p=[2, 0, 1]) if self.AV else False
-
-        self._update_stats()
-        return done
-        
-    def _end_process(self):
-        """This is the vehicle action for the range of close to intersection."""
-        if self.track:
-            print(f"[TRACK{self.track}] Enter the end process!")
-
-         # if in 0: for HDV first try to move forward, then go to right. for AV try to move right, then forward.
-        if int(self.current_lane.id) == 0:
-            done = self._action_flr(p=[0, 2]) if self.HDV else False
-            done = self._action_flr(p=[2, 0]) if self.AV else False
-
-        # if in 4: only for AV try to move forward, then go to left. HDV not allowed.
-        elif int(self.current_lane.id) == 4:
-            assert self.HDV == False
-            done = self._action_flr(p=[0, 1]) if self.AV else False
-        
-        # if in 3: only for AV try to move right, then go to forward.  HDV not allowed.
-        elif int(self.current_lane.id) == 3:
-            assert self.HDV == False
-            done = self._action_flr(p=[2, 0]) if self.AV else False
-
-        # if in 2: for HDV try to move left then forward. for AV try forward then left
-        elif int(self.current_lane.id) == 2:
-            done = self._action_flr(p=[1, 0]) if self.HDV else False
-            done = self._action_flr(p=[2, 0]) if self.AV else False
-
-        # if in 1: for HDV try to move left, then forward, then right. for AV try move right, then forward then left.
-        elif int(self.current_lane.id) == 1:
-            done = self._action_flr(p=[1, 0, 2]) if self.HDV else False
-            done = self._action_flr(p=[2, 0, 1]) if self.AV else False
-        
+            print(f"[TRACK{self.track}] Enter the {Movement.ZONES[zone]} process!")
+        actions = Movement.RULES[zone][self.current_lane.id][1 if self.AV else 0]
+        # HDVs are not allowed in the AV lanes (3, 4) of the end zone
+        assert actions is not None
+        done = self._action_flr(p=actions)
         self._update_stats()
         return done
 
@@ -623,7 +653,7 @@ class Vehicle:
             This is a private method used when vehicle reaches an intersection.
         """
         # Check if light is green for current lane
-        if self.current_intersection.lights[self.current_path[0]][self.current_lane.id] == "green":
+        if self.current_intersection.lights[self.current_path[0]][self.current_lane.id] == Intersection.GREEN:
             self._pass_intersection()
         else:
             self._stay_intersection()
@@ -646,14 +676,17 @@ class Vehicle:
         self.current_lane.leave(block=self.current_pos)
         
         # Calculate next path segment
+        previous_path = self.current_path
         self.current_path = self._shortest_path(
             str(self.current_path[1]),  # Current intersection becomes start
             str(self.initial_path[1])   # Final destination remains the same
         )
+        self.graph.leave_link(*previous_path)
+        self.graph.enter_link(*self.current_path)
         
         # Update intersection and lane
         self.current_intersection = self.graph.graph.nodes[str(self.current_path[1])]["intersection"]
-        self.current_lane = self.current_intersection.lanes[self.current_path[0]][int(self.current_lane.id)]
+        self.current_lane = self.current_intersection.lanes[self.current_path[0]][self.current_lane.id]
         
         # Enter new road segment
         self.current_lane.arrive(block=0)
@@ -689,11 +722,44 @@ class Vehicle:
         self.current_lane.leave(block=self.current_pos)
         
         # Mark vehicle as inactive
-        self.stats.loc[self.stats["vehicle_id"] == self.id, "active"] = False
+        self.stats.deactivate(self.slot)
+        self.graph.leave_link(*self.current_path)
         if self.track:
             print(f"[TRACK{self.track}] Exiting the system...")
             print(f"[TRACK{self.track}] [ID={self.id}] [path={self.current_path[0]} to {self.current_path[1]}] [lane={self.current_lane.id}] [block={self.current_pos}] [arrive_time={self.arrival_time}] [stuck_time={self.stucked_time}]")
 
+    def _at_red_light(self) -> bool:
+        """True if the vehicle waits at the stop line of a red light (not at its destination)."""
+        return (self.current_pos == self.max_pos
+                and self.current_path[1] != self.initial_path[1]
+                and self.current_intersection.lights[self.current_path[0]][self.current_lane.id] != Intersection.GREEN)
+
+    def run(self, tick: int = 5) -> simpy.events.Generator:
+        """SimPy process of the vehicle for the event-driven mode of the clock.
+
+        The vehicle acts on the same tick grid as the polling loop (every `tick`
+        time units). At a red light it records one stuck step and then sleeps on
+        the light's green event, so it costs nothing while it waits. The stuck
+        time of the skipped ticks is added when it wakes up.
+
+        Args:
+            tick (int, optional): Time between two moves. Defaults to 5.
+        """
+        yield self.env.timeout(-self.env.now % tick)
+        while self.stats.active[self.slot]:
+            if self.router is not None:
+                self.router.advance(self.env.now)
+            if self._at_red_light():
+                self._intersection_process()
+                red_since = self.env.now
+                yield self.current_intersection.wait_green(self.env, self.current_path[0], self.current_lane.id)
+                self.stucked_time += self.env.now - red_since
+                self.stats.stuck_steps += (self.env.now - red_since) // tick
+                self._update_stats()
+            else:
+                self.process()
+            yield self.env.timeout(tick)
+
     def process(self) -> None:
         """Execute the vehicle's movement behavior based on its position.
         
@@ -726,19 +792,15 @@ class Vehicle:
             ValueError: If vehicle position exceeds maximum
         """
         # Determine zone based on position
-        if self.current_pos < self.max_pos - self.current_lane.lane_changing_zone_length - self.current_lane.dedicated_lane_length:
-            self._simple_process()  # Far from intersection
-            
-        elif self.current_pos < self.max_pos - self.current_lane.dedicated_lane_length:
-            self._lane_changing_process()  # Approaching intersection
-            
-        elif self.current_pos < self.max_pos:
-            self._end_process()  # Close to intersection
+        zone = Movement.zone_of(self.current_pos, self.max_pos, self.current_lane.lane_changing_zone_length,
+                                self.current_lane.dedicated_lane_length)
+        if zone is not None and zone < Movement.STOP_LINE:
+            self._zone_process(zone)  # On the link
             
-        elif self.current_pos == self.max_pos and self.current_path[1] == self.initial_path[1]:
+        elif zone == Movement.STOP_LINE and self.current_path[1] == self.initial_path[1]:
             self._exit_the_system()
 
-        elif self.current_pos == self.max_pos:
+        elif zone == Movement.STOP_LINE:
             self._intersection_process()  # At intersection
  
         else:
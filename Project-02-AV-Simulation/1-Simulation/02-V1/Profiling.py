@@ -0,0 +1,174 @@
+import contextlib
+import json
+import time as timer
+
+import numpy as np
+
+
+class Profiler:
+    """Phase timers, counters and per-tick wall times of a simulation run.
+
+    Code sections are timed with `phase(name)`. A disabled profiler returns one
+    shared no-op context from `phase` and returns at once from `tick`, so it
+    can stay in the simulation loop at almost no cost.
+
+    Every timed phase is kept as a (name, start, duration) event, up to
+    `max_events`, so the run can be opened as a timeline in a Chrome trace
+    viewer (chrome://tracing or https://ui.perfetto.dev). Phases may nest, e.g.
+    writing the log while vehicles are processed.
+
+    Attributes:
+        enabled (bool): Record anything at all
+        sample_every (int): Keep the wall time of every n-th tick
+        max_events (int): Most phase events kept for the trace
+        phases (dict): Maps phase names to [total seconds, calls]
+        counters (dict): Maps counter names to values
+        ticks (list): (simulation time, wall seconds, vehicles) of the sampled ticks
+
+    Example:
+        >>> profiler = Profiler()
+        >>> with profiler.phase("signals"):
+        ...     controller.update(time)
+        >>> profiler.tick(time, vehicles=120)
+        >>> profiler.report()["phases"]["signals"]["calls"]
+        1
+        >>> profiler.save_chrome_trace("trace.json")
+    """
+
+    _DISABLED = contextlib.nullcontext()
+
+    def __init__(self, enabled: bool = True, sample_every: int = 1, max_events: int = 1_000_000):
+        """Initialize an empty profiler.
+
+        Args:
+            enabled (bool, optional): Record phases and ticks. Defaults to True.
+            sample_every (int, optional): Keep the wall time of every n-th tick. Defaults to 1.
+            max_events (int, optional): Most phase events kept for the trace. Defaults to 1_000_000.
+        """
+        self.enabled = enabled
+        self.sample_every = max(int(sample_every), 1)
+        self.max_events = max_events
+        self.phases = {}
+        self.counters = {}
+        self.ticks = []
+        self._events = []
+        self._tick_ends = []
+        self._tick_count = 0
+        self._started = False
+        self._start = self._last_tick = timer.perf_counter()
+
+    def start(self) -> None:
+        """Start the wall clock of the report and the trace (the first call only).
+
+        Without it, the clock starts when the profiler is created.
+        """
+        if not self._started:
+            self._started = True
+            self._start = self._last_tick = timer.perf_counter()
+
+    def phase(self, name: str):
+        """Context manager that times one call of a phase.
+
+        Args:
+            name (str): Phase name, e.g. "signals"
+
+        Returns:
+            Context manager (a shared no-op one if the profiler is disabled)
+        """
+        if not self.enabled:
+            return self._DISABLED
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name: str):
+        """Time the body of the with block and record it as one event of the phase."""
+        start = timer.perf_counter()
+        try:
+            yield
+        finally:
+            duration = timer.perf_counter() - start
+            total = self.phases.setdefault(name, [0.0, 0])
+            total[0] += duration
+            total[1] += 1
+            if len(self._events) < self.max_events:
+                self._events.append((name, start - self._start, duration))
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Add to a counter.
+
+        Args:
+            name (str): Counter name
+            value (int, optional): Amount to add. Defaults to 1.
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def tick(self, time: int, vehicles: int = 0) -> None:
+        """Mark the end of a tick; its wall time is the time since the last tick.
+
+        Args:
+            time (int): Simulation time of the tick
+            vehicles (int, optional): Vehicles in the system, shown as a counter track. Defaults to 0.
+        """
+        if not self.enabled:
+            return
+        now = timer.perf_counter()
+        if self._tick_count % self.sample_every == 0:
+            self.ticks.append((int(time), now - self._last_tick, int(vehicles)))
+            self._tick_ends.append(now - self._start)
+        self._tick_count += 1
+        self._last_tick = now
+
+    def report(self) -> dict:
+        """Totals of everything recorded so far.
+
+        Returns:
+            dict: "wall_time" (seconds since `start`), "phases" (seconds, calls
+                and share of the wall time per phase), "counters", and "ticks" (count of all ticks,
+                and mean, p50, p95 and max wall seconds of the sampled ones)
+        """
+        wall_time = timer.perf_counter() - self._start
+        phases = {name: {"seconds": seconds, "calls": calls, "share": seconds / wall_time if wall_time else 0.0}
+                  for name, (seconds, calls) in sorted(self.phases.items(), key=lambda item: -item[1][0])}
+        seconds = np.array([tick[1] for tick in self.ticks])
+        ticks = {"count": self._tick_count, "sampled": len(seconds)}
+        if len(seconds):
+            ticks.update(mean=float(seconds.mean()), p50=float(np.percentile(seconds, 50)),
+                         p95=float(np.percentile(seconds, 95)), max=float(seconds.max()))
+        return {"wall_time": wall_time, "phases": phases, "counters": dict(self.counters), "ticks": ticks}
+
+    def chrome_trace(self) -> dict:
+        """The recorded phases and ticks in the Chrome trace event format.
+
+        Phases are complete ("X") events in microseconds. The sampled ticks add
+        counter ("C") tracks with the tick wall time and the number of vehicles.
+
+        Returns:
+            dict: Trace with a "traceEvents" list
+        """
+        events = [{"name": name, "ph": "X", "ts": start * 1e6, "dur": duration * 1e6, "pid": 0, "tid": 0}
+                  for name, start, duration in self._events]
+        for (tick_time, seconds, vehicles), end in zip(self.ticks, self._tick_ends):
+            events.append({"name": "tick", "ph": "C", "ts": end * 1e6, "pid": 0,
+                           "args": {"wall_ms": seconds * 1e3, "vehicles": vehicles, "time": tick_time}})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": dict(self.counters)}}
+
+    def save_chrome_trace(self, file_path: str) -> None:
+        """Write `chrome_trace()` to a JSON file.
+
+        Args:
+            file_path (str): Path of the JSON file
+        """
+        with open(file_path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+        print(f"[INFO] Chrome trace saved to {file_path}")
+
+    def save_report(self, file_path: str) -> None:
+        """Write `report()` to a JSON file.
+
+        Args:
+            file_path (str): Path of the JSON file
+        """
+        with open(file_path, "w") as file:
+            json.dump(self.report(), file, indent=2)
+        print(f"[INFO] Profile report saved to {file_path}")
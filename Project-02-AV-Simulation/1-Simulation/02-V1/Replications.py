@@ -0,0 +1,196 @@
+import contextlib
+import io
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from tqdm.auto import tqdm
+
+import DataLoader
+from Engine import Clock
+
+# Grid keys that change the demand instead of the Clock
+DEMAND_PARAMETERS = ("av_share", "departure_jitter")
+# Grid keys that change the road geometry, so a new graph is needed
+GRAPH_PARAMETERS = ("dedicated_lane_length", "lane_changing_zone_length", "each_block_length")
+
+# Graphs built by this worker process, by network files and geometry.
+# A worker runs one simulation at a time, so a graph is reset and reused.
+_graphs = {}
+
+
+def _worker_graph(network_files: list, dedicated_lane_length: int, lane_changing_zone_length: int,
+                  each_block_length: int) -> DataLoader.Graph_Generator:
+    """Empty graph, built at most once per worker process and geometry."""
+    key = (tuple(str(file) for file in network_files), dedicated_lane_length,
+           lane_changing_zone_length, each_block_length)
+    if key not in _graphs:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _graphs[key] = DataLoader.Graph_Generator(network_files=network_files,
+                                                      dedicated_lane_length=dedicated_lane_length,
+                                                      lane_changing_zone_length=lane_changing_zone_length,
+                                                      each_block_length=each_block_length)
+    _graphs[key].reset()
+    return _graphs[key]
+
+
+def run_replication(network_files: list, demand_file: str, until: int, parameters: dict, seed: int) -> dict:
+    """Run one simulation and return its KPIs.
+
+    This is the work unit of `Replication_Runner`. It is a module-level function
+    so the process pool can pickle it.
+
+    Args:
+        network_files (list): Network and node position files
+        demand_file (str): Demand CSV file
+        until (int): Number of time steps to simulate
+        parameters (dict): Clock arguments plus the keys in DEMAND_PARAMETERS
+        seed (int): Seed of the demand perturbation
+
+    Returns:
+        dict: The parameters, the seed and the KPIs of `Clock.kpis()`
+    """
+    clock_parameters = {key: value for key, value in parameters.items() if key not in DEMAND_PARAMETERS}
+    demand_parameters = {key: value for key, value in parameters.items() if key in DEMAND_PARAMETERS}
+    clock_parameters.setdefault("each_block_length", 100)
+    graph = _worker_graph(network_files, *(clock_parameters[key] for key in GRAPH_PARAMETERS))
+
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        world = Clock(network_files=network_files, output_directory=".", graph=graph, **clock_parameters)
+        world.generate_vehicles(demand_file)
+        if demand_parameters:
+            world.demand.perturb(np.random.default_rng(seed), **demand_parameters)
+        world.run(until=until, save=False)
+    return {**parameters, "seed": seed, **world.kpis()}
+
+
+class Replication_Runner:
+    """Runs a parameter grid times a list of seeds on a process pool.
+
+    Every (parameters, seed) run builds its own `Clock`. A worker builds each
+    road geometry once and resets it for every later run. The simulation itself is
+    deterministic: the seed only reaches it through the demand parameters
+    (DEMAND_PARAMETERS), so several seeds need a random demand in every grid point. Results are appended
+    to a JSON lines file as soon as a run finishes. A restarted sweep skips the
+    runs that are already in the file.
+
+    Attributes:
+        network_files (list): Network and node position files
+        demand_file (str): Demand CSV file
+        until (int): Number of time steps per run
+        results_file (Path): JSON lines file with one result per run
+        workers (int): Number of worker processes
+
+    Example:
+        >>> runner = Replication_Runner(network_files, "demand.csv", until=10000,
+        ...                             results_file="results.jsonl")
+        >>> grid = Replication_Runner.grid(dedicated_lane_length=[300, 500, 700],
+        ...                                lane_changing_zone_length=[300, 500],
+        ...                                mode=["event"], departure_jitter=[30])
+        >>> results = runner.run(grid, seeds=range(10))
+        >>> results.groupby(["dedicated_lane_length", "lane_changing_zone_length"])["completion_rate"].mean()
+    """
+
+    def __init__(self, network_files: list, demand_file: str, until: int, results_file: str,
+                 workers: int = None):
+        """Initialize the runner.
+
+        Args:
+            network_files (list): Network and node position files
+            demand_file (str): Demand CSV file
+            until (int): Number of time steps per run
+            results_file (str): JSON lines file for the results. Existing results are kept.
+            workers (int, optional): Worker processes. Defaults to None (one per CPU).
+        """
+        self.network_files = [str(file) for file in network_files]
+        self.demand_file = str(demand_file)
+        self.until = until
+        self.results_file = Path(results_file)
+        self.workers = workers or os.cpu_count()
+
+    @staticmethod
+    def grid(**values) -> list:
+        """All combinations of the given parameter values.
+
+        Args:
+            **values: Lists of values per Clock argument or demand parameter
+
+        Returns:
+            list: One parameter dict per combination
+        """
+        keys = list(values)
+        return [dict(zip(keys, combination)) for combination in itertools.product(*values.values())]
+
+    @staticmethod
+    def _key(parameters: dict, seed: int) -> str:
+        """Identity of a run in the results file."""
+        return json.dumps({**parameters, "seed": seed}, sort_keys=True, default=str)
+
+    def load(self) -> pd.DataFrame:
+        """All results in the results file.
+
+        Returns:
+            pd.DataFrame: One row per finished run
+        """
+        if not self.results_file.exists():
+            return pd.DataFrame()
+        with open(self.results_file) as file:
+            return pd.DataFrame([json.loads(line) for line in file if line.strip()])
+
+    def _finished(self, parameters: list) -> set:
+        """Keys of the runs already in the results file."""
+        finished = set()
+        if self.results_file.exists():
+            with open(self.results_file) as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    result = json.loads(line)
+                    seed = result["seed"]
+                    finished.add(self._key({key: result[key] for key in parameters if key in result}, seed))
+        return finished
+
+    def run(self, grid: list, seeds: list, progress: bool = True) -> pd.DataFrame:
+        """Run every missing (parameters, seed) combination.
+
+        Args:
+            grid (list): Parameter dicts, e.g. from `grid()`
+            seeds (list): Seeds of the demand perturbation
+            progress (bool, optional): Show a progress bar. Defaults to True.
+
+        Returns:
+            pd.DataFrame: Results of the requested runs, including the ones from earlier sessions
+
+        Raises:
+            ValueError: If there are several seeds and a grid point has no random demand
+        """
+        seeds = list(seeds)
+        if len(seeds) > 1:
+            for parameters in grid:
+                if parameters.get("av_share") is None and not parameters.get("departure_jitter"):
+                    raise ValueError(f"The seeds would give identical runs of {parameters}: the seed only "
+                                     f"changes the demand, set av_share or departure_jitter")
+        names = sorted({key for parameters in grid for key in parameters})
+        finished = self._finished(names)
+        tasks = [(parameters, int(seed)) for parameters in grid for seed in seeds
+                 if self._key(parameters, int(seed)) not in finished]
+        print(f"[INFO] {len(grid) * len(seeds) - len(tasks)} runs already done, {len(tasks)} to go.")
+
+        self.results_file.parent.mkdir(parents=True, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool, open(self.results_file, "a") as file:
+            futures = [pool.submit(run_replication, self.network_files, self.demand_file, self.until,
+                                   parameters, seed) for parameters, seed in tasks]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Replications",
+                               disable=not progress):
+                file.write(json.dumps(future.result(), default=str) + "\n")
+                file.flush()
+
+        results = self.load()
+        requested = {self._key(parameters, int(seed)) for parameters in grid for seed in seeds}
+        keep = [self._key({key: row[key] for key in names if key in row}, row["seed"]) in requested
+                for row in results.to_dict("records")]
+        return results[keep].reset_index(drop=True)
@@ -0,0 +1,386 @@
+import heapq
+import math
+
+import networkx as nx
+import numpy as np
+
+import Profiling
+
+
+class Router:
+    """Shared routing service with cached shortest-path trees per destination.
+
+    Instead of a fresh Dijkstra search for every vehicle, the router keeps one
+    shortest-path tree per destination (the next node towards it from every
+    other node). A tree is reused as long as the link costs it was built with
+    are within `tolerance` of the current costs. Otherwise it is rebuilt.
+
+    With `time_bucket` set, link costs are frozen at the start of every bucket
+    of that many time steps. All vehicles routed in the same bucket then share
+    one tree per destination.
+
+    With `fix_costs()` every vehicle is routed on the same given costs, e.g.
+    the user-equilibrium costs of a static traffic assignment.
+
+    Attributes:
+        graph (Graph_Generator): Network with the link cost arrays
+        tolerance (float): Largest relative change of any link cost that still reuses a tree
+        time_bucket (int): Length of the cost snapshot period (None = live costs)
+        trees (dict): Maps destination to (link costs, next node per node)
+        hits (int): Queries answered from a cached tree
+        misses (int): Queries that built a tree
+        profiler (Profiling.Profiler): Times every query as a "routing" phase
+
+    Example:
+        >>> router = Router(graph, tolerance=0.05, time_bucket=5)
+        >>> router.advance(time=0)
+        >>> router.next_hop("1", "20")
+        ['1', '3']
+        >>> router.report()
+        {'hits': 0, 'misses': 1, 'hit_rate': 0.0, 'trees': 1}
+    """
+
+    def __init__(self, graph, tolerance: float = 0.0, time_bucket: int = None, profiler=None):
+        """Initialize the router.
+
+        Args:
+            graph (Graph_Generator): Network with the link cost arrays
+            tolerance (float, optional): Relative cost change that invalidates a tree. Defaults to 0.0.
+            time_bucket (int, optional): Snapshot link costs every `time_bucket` steps. Defaults to None (live costs).
+            profiler (Profiling.Profiler, optional): Profiler of the run. Defaults to None (a disabled one).
+        """
+        self.graph = graph
+        self.tolerance = tolerance
+        self.time_bucket = time_bucket
+        self.profiler = profiler if profiler is not None else Profiling.Profiler(enabled=False)
+        self.trees = {}
+        self.hits = 0
+        self.misses = 0
+        self._snapshot = None
+        self._bucket = None
+        self._fixed = None
+
+    def advance(self, time: int) -> None:
+        """Tell the router the current simulation time.
+
+        In bucket mode this takes a new cost snapshot when a new bucket starts.
+        Call it at the start of every time step, before any vehicle is routed.
+
+        Args:
+            time (int): Current simulation time
+        """
+        if self.time_bucket is None or self._fixed is not None:
+            return
+        bucket = int(time // self.time_bucket)
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._snapshot = self.graph.link_costs()
+
+    def costs(self) -> np.ndarray:
+        """Link costs used for routing right now.
+
+        Returns:
+            np.ndarray: Travel time per link, indexed by the edge "index" attribute
+        """
+        if self._fixed is not None:
+            return self._fixed
+        if self.time_bucket is None or self._snapshot is None:
+            return self.graph.link_costs()
+        return self._snapshot
+
+    def fix_costs(self, costs: np.ndarray = None) -> None:
+        """Route on fixed link costs instead of the live ones.
+        
+        Args:
+            costs (np.ndarray, optional): Travel time per link. Defaults to None (back to live costs).
+        """
+        self._fixed = None if costs is None else np.asarray(costs, dtype=np.float64)
+
+    def next_hop(self, from_: str, to_: str) -> list:
+        """Next link on the shortest path from from_ to to_.
+
+        Args:
+            from_ (str): Current node
+            to_ (str): Final destination
+
+        Returns:
+            list: [from_, next_node], or None if from_ is the destination
+
+        Raises:
+            nx.NetworkXNoPath: If to_ cannot be reached from from_
+        """
+        if from_ == to_:
+            return None
+        with self.profiler.phase("routing"):
+            costs = self.costs()
+            tree = self.trees.get(to_)
+            if tree is not None and self._is_valid(tree[0], costs):
+                self.hits += 1
+            else:
+                self.misses += 1
+                tree = (costs, self._build_tree(to_, costs))
+                self.trees[to_] = tree
+        if from_ not in tree[1]:
+            raise nx.NetworkXNoPath(f"Node {to_} not reachable from {from_}")
+        return [from_, tree[1][from_]]
+
+    def _is_valid(self, tree_costs: np.ndarray, costs: np.ndarray) -> bool:
+        """Check whether the costs a tree was built with are still close enough."""
+        if tree_costs is costs:
+            return True
+        if self.tolerance <= 0:
+            return np.array_equal(tree_costs, costs)
+        return bool(np.all(np.abs(costs - tree_costs) <= self.tolerance * tree_costs))
+
+    def _build_tree(self, destination: str, costs: np.ndarray) -> dict:
+        """Shortest-path tree towards one destination.
+
+        Args:
+            destination (str): Destination node
+            costs (np.ndarray): Link costs
+
+        Returns:
+            dict: Maps every node that reaches the destination to its next node
+        """
+        paths = nx.shortest_path(self.graph.graph, target=destination,
+                                 weight=lambda u, v, data: costs[data["index"]])
+        return {node: path[1] for node, path in paths.items() if len(path) >= 2}
+
+    def checkpoint(self) -> dict:
+        """Cached trees, cost snapshot and counters as arrays (see `restore`).
+
+        The trees are kept because with a tolerance a rebuilt tree can differ
+        from a cached one.
+
+        Returns:
+            dict: Arrays of the router state, trees as next node codes (-1 = no path)
+        """
+        node_code = {node: i for i, node in enumerate(self.graph.node_ids)}
+        destinations = list(self.trees)
+        links = len(self.graph.edge_index)
+        next_node = np.full((len(destinations), len(node_code)), -1, dtype=np.int32)
+        costs = np.zeros((len(destinations), links))
+        for i, destination in enumerate(destinations):
+            costs[i] = self.trees[destination][0]
+            for node, hop in self.trees[destination][1].items():
+                next_node[i, node_code[node]] = node_code[hop]
+        return {"destinations": np.array([node_code[node] for node in destinations], dtype=np.int32),
+                "tree_costs": costs,
+                "next_node": next_node,
+                "snapshot": np.zeros(0) if self._snapshot is None else self._snapshot,
+                "bucket": np.array(-1 if self._bucket is None else self._bucket),
+                "fixed": np.zeros(0) if self._fixed is None else self._fixed,
+                "counters": np.array([self.hits, self.misses])}
+
+    def restore(self, arrays: dict) -> None:
+        """Load the state of `checkpoint` taken on the same network.
+
+        Args:
+            arrays (dict): Arrays from `checkpoint`
+        """
+        node_ids = self.graph.node_ids
+        self.trees = {}
+        for code, costs, next_node in zip(arrays["destinations"], arrays["tree_costs"], arrays["next_node"]):
+            self.trees[node_ids[code]] = (np.array(costs), {node_ids[node]: node_ids[hop]
+                                                            for node, hop in enumerate(next_node) if hop >= 0})
+        self._snapshot = np.array(arrays["snapshot"]) if len(arrays["snapshot"]) else None
+        self._bucket = None if int(arrays["bucket"]) < 0 else int(arrays["bucket"])
+        self._fixed = np.array(arrays["fixed"]) if len(arrays["fixed"]) else None
+        self.hits, self.misses = (int(count) for count in arrays["counters"])
+
+    def report(self) -> dict:
+        """Cache counters for tuning the tolerance.
+
+        Returns:
+            dict: hits, misses, hit_rate and number of cached trees
+        """
+        queries = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / queries if queries else 0.0,
+                "trees": len(self.trees)}
+
+
+class AStar_Router(Router):
+    """Router that answers every query with an A* search on the CSR adjacency arrays.
+
+    The search runs on `Graph_Generator.indptr`, `indices` and `csr_edges`
+    (integer node codes) instead of networkx. Its heuristic is the straight-line
+    distance to the destination (node coordinates of `Graph_Generator.pos`)
+    divided by the highest free-flow speed of any link, in coordinate units per
+    time step. Link costs never drop below their free-flow (empty link) costs,
+    so the heuristic never overestimates and the path is a shortest one, as
+    with Dijkstra. Far from the destination it only expands the nodes in the
+    direction of the destination. Nodes without coordinates get a heuristic of 0,
+    and so does every node if a link of positive length has a zero free-flow time.
+
+    With `time_dependent`, a link is costed at the time the search reaches it
+    instead of now: the vehicles on it now are assumed to leave it evenly over
+    its current travel time, so its projected occupancy after `t` time steps is
+    `occupancy * max(0, 1 - t / travel_time)`. Fixed costs (`fix_costs`) are
+    never projected.
+
+    No trees are cached (a time-dependent path depends on the start time), so
+    `misses` counts the searches and `hits` stays 0.
+
+    Attributes:
+        time_dependent (bool): Cost links at the projected time they are reached
+        heuristic (bool): Use the A* heuristic (False gives Dijkstra on the same arrays)
+        speed (float): Highest free-flow speed of a link, in coordinate units per time step (inf with a zero-cost link)
+        visited (int): Nodes expanded by all searches so far
+
+    Example:
+        >>> router = AStar_Router(graph, time_dependent=True)
+        >>> router.advance(time=0)
+        >>> router.next_hop("1", "20")
+        ['1', '3']
+        >>> router.report()["visited_per_search"]
+        9.0
+    """
+
+    def __init__(self, graph, time_dependent: bool = False, heuristic: bool = True, time_bucket: int = None,
+                 profiler=None):
+        """Initialize the router.
+
+        Args:
+            graph (Graph_Generator): Network with the link cost and CSR adjacency arrays
+            time_dependent (bool, optional): Project link costs to the time they are reached. Defaults to False.
+            heuristic (bool, optional): Use the distance heuristic. Defaults to True.
+            time_bucket (int, optional): Snapshot link costs every `time_bucket` steps. Defaults to None (live costs).
+            profiler (Profiling.Profiler, optional): Profiler of the run. Defaults to None (a disabled one).
+        """
+        super().__init__(graph, time_bucket=time_bucket, profiler=profiler)
+        self.time_dependent = time_dependent
+        self.heuristic = heuristic
+        self.visited = 0
+        self._occupancy = None
+        self._node_code = {node: i for i, node in enumerate(graph.node_ids)}
+        self._indptr = np.asarray(graph.indptr).tolist()
+        self._indices = np.asarray(graph.indices).tolist()
+        self._edges = np.asarray(graph.csr_edges).tolist()
+
+        # Node coordinates by node code (NaN if missing)
+        position = {str(row[0]): (float(row[1]), float(row[2])) for row in graph.pos.itertuples(index=False)}
+        coordinates = np.array([position.get(node, (np.nan, np.nan)) for node in graph.node_ids]).reshape(-1, 2)
+        self._x = coordinates[:, 0].tolist()
+        self._y = coordinates[:, 1].tolist()
+        # Highest free-flow speed: straight-line length over empty-link travel time of every link
+        edge_from = np.repeat(np.arange(len(graph.node_ids)), np.diff(graph.indptr))
+        distance = np.hypot(*(coordinates[edge_from] - coordinates[graph.indices]).T)
+        free_flow = graph.link_costs(np.zeros(len(graph.edge_index)))[graph.csr_edges]
+        valid = np.isfinite(distance) & (distance > 0)
+        if np.any(free_flow[valid] <= 0):
+            # A link with length but no cost: no finite speed bounds it, the heuristic is 0
+            self.speed = math.inf
+        else:
+            self.speed = float(np.max(distance[valid] / free_flow[valid])) if valid.any() else 0.0
+
+    def advance(self, time: int) -> None:
+        """Tell the router the current simulation time (see `Router.advance`).
+
+        In bucket mode the occupancy is frozen with the costs, for the projection.
+
+        Args:
+            time (int): Current simulation time
+        """
+        bucket = self._bucket
+        super().advance(time)
+        if self._bucket != bucket:
+            self._occupancy = self.graph.occupancy + self.graph.background
+
+    def _estimate(self, node: int, target: int) -> float:
+        """Heuristic: straight-line distance to the target over the highest free-flow speed."""
+        if not self.heuristic or self.speed <= 0:
+            return 0.0
+        estimate = math.hypot(self._x[node] - self._x[target], self._y[node] - self._y[target]) / self.speed
+        return 0.0 if math.isnan(estimate) else estimate
+
+    def shortest_path(self, from_: str, to_: str) -> list:
+        """Shortest path from from_ to to_ by A*.
+
+        Args:
+            from_ (str): Start node
+            to_ (str): Destination node
+
+        Returns:
+            list: Node ids of the path, from_ and to_ included
+
+        Raises:
+            nx.NetworkXNoPath: If to_ cannot be reached from from_
+        """
+        with self.profiler.phase("routing"):
+            return self._search(from_, to_)
+
+    def _search(self, from_: str, to_: str) -> list:
+        """A* search of `shortest_path`."""
+        source, target = self._node_code[from_], self._node_code[to_]
+        costs = self.costs()
+        project = self.time_dependent and self._fixed is None
+        if project:
+            background = self.graph.background
+            occupancy = self._occupancy if self.time_bucket is not None and self._occupancy is not None \
+                else self.graph.occupancy + background
+        indptr, indices, edges = self._indptr, self._indices, self._edges
+        best = {source: 0.0}
+        parent = {source: -1}
+        closed = set()
+        count = 0
+        heap = [(self._estimate(source, target), count, 0.0, source)]
+        while heap:
+            _, _, elapsed, node = heapq.heappop(heap)
+            if node in closed:
+                continue
+            closed.add(node)
+            if node == target:
+                break
+            for k in range(indptr[node], indptr[node + 1]):
+                neighbor, edge = indices[k], edges[k]
+                if neighbor in closed:
+                    continue
+                cost = costs[edge]
+                if project and elapsed > 0:
+                    remaining = max(0.0, 1.0 - elapsed / cost) if cost > 0 else 0.0
+                    cost = self.graph.link_cost(edge, (occupancy[edge] - background[edge]) * remaining
+                                                + background[edge])
+                arrival = elapsed + cost
+                if arrival < best.get(neighbor, math.inf):
+                    best[neighbor] = arrival
+                    parent[neighbor] = node
+                    count += 1
+                    heapq.heappush(heap, (arrival + self._estimate(neighbor, target), count, arrival, neighbor))
+        self.visited += len(closed)
+        self.misses += 1
+        if target not in closed:
+            raise nx.NetworkXNoPath(f"Node {to_} not reachable from {from_}")
+        path = [target]
+        while parent[path[-1]] >= 0:
+            path.append(parent[path[-1]])
+        node_ids = self.graph.node_ids
+        return [node_ids[node] for node in reversed(path)]
+
+    def next_hop(self, from_: str, to_: str) -> list:
+        """Next link on the A* path from from_ to to_.
+
+        Args:
+            from_ (str): Current node
+            to_ (str): Final destination
+
+        Returns:
+            list: [from_, next_node], or None if from_ is the destination
+
+        Raises:
+            nx.NetworkXNoPath: If to_ cannot be reached from from_
+        """
+        if from_ == to_:
+            return None
+        return self.shortest_path(from_, to_)[:2]
+
+    def report(self) -> dict:
+        """Search counters.
+
+        Returns:
+            dict: searches, nodes visited in total and per search
+        """
+        return {"searches": self.misses,
+                "visited": self.visited,
+                "visited_per_search": self.visited / self.misses if self.misses else 0.0}
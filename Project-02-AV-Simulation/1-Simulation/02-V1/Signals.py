@@ -0,0 +1,220 @@
+import numpy as np
+
+from Players import Intersection
+
+
+class Signal_Policy:
+    """Base class of the signal control policies used by `Signal_Controller`.
+
+    A policy sees the whole network at once and returns the green lanes of
+    every approach as one boolean array, so adding a policy does not need a
+    loop over the intersections. The controller gives it:
+    - `controller.links`: approach links, grouped by intersection
+    - `controller.group`: intersection number of each approach
+    - `controller.starts`: first approach of each intersection
+    - helpers for queue lengths, vehicle counts and per-intersection reductions
+
+    Example:
+        >>> class All_Green(Signal_Policy):
+        ...     def green(self, controller, time):
+        ...         return np.ones((len(controller.links), 5), dtype=bool)
+        >>> controller = Signal_Controller(graph, policy=All_Green())
+    """
+
+    def green(self, controller: "Signal_Controller", time: int) -> np.ndarray:
+        """Green lanes of every approach.
+
+        Args:
+            controller (Signal_Controller): Controller with the network arrays
+            time (int): Current simulation time
+
+        Returns:
+            np.ndarray: Boolean array (approaches x 5 lanes), True for a green light
+        """
+        raise NotImplementedError
+
+
+class Queue_Policy(Signal_Policy):
+    """The rule of `Intersection.update_lights`, for all intersections at once.
+
+    If the AV lanes (3, 4) of an intersection hold longer queues than the
+    regular lanes (0, 1, 2), all AV lanes get green. Otherwise the regular lanes
+    of the approach with the longest regular queue get green (the first
+    approach on a tie).
+    """
+
+    def green(self, controller: "Signal_Controller", time: int) -> np.ndarray:
+        blue = controller.queue_lengths(Intersection.BLUE_LANES)
+        regular = controller.queue_lengths(Intersection.GREEN_LANES)
+        blue_phase = controller.node_sum(blue) > controller.node_sum(regular)
+        green = np.zeros((len(controller.links), 5), dtype=bool)
+        green[:, Intersection.BLUE_LANES] = blue_phase[controller.group, None]
+        chosen = controller.node_argmax(regular)
+        green[chosen[~blue_phase], Intersection.GREEN_LANES] = True
+        return green
+
+
+class Max_Pressure_Policy(Signal_Policy):
+    """Max-pressure control: each intersection serves the phase with the highest pressure.
+
+    The phases of an intersection are the regular lanes (0, 1, 2) of one
+    approach, or the AV lanes (3, 4) of all approaches together. The pressure of
+    a phase is the number of vehicles it can serve minus the vehicles waiting
+    downstream: the mean number of vehicles per lane on the links leaving the
+    intersection, times the number of lanes it serves.
+    """
+
+    def green(self, controller: "Signal_Controller", time: int) -> np.ndarray:
+        downstream = controller.downstream_load()[controller.group]
+        regular = controller.vehicles(Intersection.GREEN_LANES) - 3 * downstream
+        blue = controller.node_sum(controller.vehicles(Intersection.BLUE_LANES) - 2 * downstream)
+        blue_phase = blue > controller.node_max(regular)
+        green = np.zeros((len(controller.links), 5), dtype=bool)
+        green[:, Intersection.BLUE_LANES] = blue_phase[controller.group, None]
+        chosen = controller.node_argmax(regular)
+        green[chosen[~blue_phase], Intersection.GREEN_LANES] = True
+        return green
+
+
+class Fixed_Time_Policy(Signal_Policy):
+    """Fixed-time control: every intersection cycles through its phases.
+
+    The phases are the regular lanes (0, 1, 2) of each approach in turn, then
+    the AV lanes (3, 4) of all approaches. Each phase lasts `green_time` time
+    steps; `offsets` shifts the cycle of single intersections (in phases).
+
+    Args:
+        green_time (int, optional): Length of a phase. Defaults to 5 (one update).
+        offsets (np.ndarray, optional): Phase offset per intersection. Defaults to None (no offsets).
+    """
+
+    def __init__(self, green_time: int = 5, offsets: np.ndarray = None):
+        self.green_time = green_time
+        self.offsets = offsets
+
+    def green(self, controller: "Signal_Controller", time: int) -> np.ndarray:
+        phases = controller.approaches + 1
+        offsets = 0 if self.offsets is None else np.asarray(self.offsets)
+        phase = (int(time) // self.green_time + offsets) % phases
+        green = np.zeros((len(controller.links), 5), dtype=bool)
+        green[:, Intersection.BLUE_LANES] = (phase == phases - 1)[controller.group, None]
+        green[:, Intersection.GREEN_LANES] = (controller.rank == phase[controller.group])[:, None]
+        return green
+
+
+class Signal_Controller:
+    """Updates the traffic lights of all intersections in one vectorized pass.
+
+    The lane counts of all approaches live in one padded array,
+    `Graph_Generator.lane_occupancy` (link x lane x block), and the lights in
+    `Graph_Generator.lights` (link x lane codes). The `Lane` and `Intersection`
+    objects hold views of both. The controller reads the counts, asks its policy
+    for the green lanes and writes the light codes back, all with array
+    operations. It replaces calling `Intersection.update_lights` for every node.
+
+    Attributes:
+        graph (Graph_Generator): Network with the lane and light arrays
+        policy (Signal_Policy): Control policy
+        nodes (list): Controlled intersections (those with at least one approach)
+        links (np.ndarray): Approach links (edge "index"), grouped by intersection in approach order
+        group (np.ndarray): Position in `nodes` of each approach
+        starts (np.ndarray): First approach of each intersection
+        approaches (np.ndarray): Number of approaches of each intersection
+        rank (np.ndarray): Position of each approach within its intersection
+
+    Example:
+        >>> controller = Signal_Controller(graph, policy=Max_Pressure_Policy())
+        >>> controller.update(time=5)
+        >>> graph.lights[graph.edge_index[("1", "2")]]
+        array([1, 1, 1, 2, 2], dtype=int8)
+    """
+
+    def __init__(self, graph, policy: Signal_Policy = None, nodes: list = None, verbose: bool = False):
+        """Initialize the controller.
+
+        Args:
+            graph (Graph_Generator): Network with the lane and light arrays
+            policy (Signal_Policy, optional): Control policy. Defaults to `Queue_Policy`.
+            nodes (list, optional): Intersections to control. Defaults to None (all).
+            verbose (bool, optional): Print when an update is skipped. Defaults to False.
+        """
+        self.graph = graph
+        self.verbose = verbose
+        self.policy = Queue_Policy() if policy is None else policy
+        nodes = list(graph.graph.nodes) if nodes is None else [str(node) for node in nodes]
+        self.intersections = [graph.graph.nodes[node]["intersection"] for node in nodes]
+        self.intersections = [intersection for intersection in self.intersections if intersection.lanes]
+        self.nodes = [intersection.node_id for intersection in self.intersections]
+        links, group, rank = [], [], []
+        for number, intersection in enumerate(self.intersections):
+            for position, neighbor in enumerate(intersection.lanes):
+                links.append(graph.edge_index[(neighbor, intersection.node_id)])
+                group.append(number)
+                rank.append(position)
+        self.links = np.array(links, dtype=np.int64)
+        self.group = np.array(group, dtype=np.int64)
+        self.rank = np.array(rank, dtype=np.int64)
+        self.approaches = np.bincount(self.group, minlength=len(self.nodes))
+        self.starts = np.concatenate([[0], np.cumsum(self.approaches)[:-1]]).astype(np.int64)
+        # Start node code of every link in CSR order, for the downstream load
+        node_code = {node: i for i, node in enumerate(graph.node_ids)}
+        self._codes = np.array([node_code[node] for node in self.nodes], dtype=np.int64)
+        self._csr_row = np.repeat(np.arange(len(graph.node_ids)), np.diff(graph.indptr))
+
+    def queue_lengths(self, lanes: slice) -> np.ndarray:
+        """Queue length of every approach, as `Intersection.queue_length` computes it.
+
+        Args:
+            lanes (slice): Lanes to include, e.g. `Intersection.BLUE_LANES`
+
+        Returns:
+            np.ndarray: Blocks occupied without a gap from the stop line backwards, per approach
+        """
+        occupied = (self.graph.lane_occupancy[self.links, lanes] > 0).any(axis=1)[:, ::-1]
+        # A free column after the last block ends every queue; the front padding is always free
+        occupied = np.concatenate([occupied, np.zeros((len(occupied), 1), dtype=bool)], axis=1)
+        return occupied.argmin(axis=1)
+
+    def vehicles(self, lanes: slice) -> np.ndarray:
+        """Number of vehicles in the given lanes of every approach."""
+        return self.graph.lane_occupancy[self.links, lanes].sum(axis=(1, 2))
+
+    def downstream_load(self) -> np.ndarray:
+        """Mean number of vehicles per lane on the links leaving each intersection."""
+        csr_edges = self.graph.csr_edges
+        vehicles = np.bincount(self._csr_row, weights=self.graph.occupancy[csr_edges] / 5, minlength=len(self.graph.indptr) - 1)
+        links = np.bincount(self._csr_row, minlength=len(self.graph.indptr) - 1)
+        return np.divide(vehicles, links, out=np.zeros(len(links)), where=links > 0)[self._codes]
+
+    def node_sum(self, values: np.ndarray) -> np.ndarray:
+        """Sum of per-approach values over each intersection."""
+        return np.add.reduceat(values, self.starts)
+
+    def node_max(self, values: np.ndarray) -> np.ndarray:
+        """Maximum of per-approach values over each intersection."""
+        return np.maximum.reduceat(values, self.starts)
+
+    def node_argmax(self, values: np.ndarray) -> np.ndarray:
+        """Approach with the largest value of each intersection (the first one on a tie)."""
+        is_max = values == self.node_max(values)[self.group]
+        return np.minimum.reduceat(np.where(is_max, np.arange(len(values)), len(values)), self.starts)
+
+    def update(self, time: int = 0, stats=None) -> None:
+        """Set the lights of all controlled intersections and wake up the vehicles waiting for green.
+
+        Args:
+            time (int, optional): Current simulation time, used by time-based policies. Defaults to 0.
+            stats (State_Store, optional): Vehicle state store, only used to skip the update
+                before anything has been recorded. Defaults to None (always update).
+        """
+        if stats is not None and stats.empty:
+            if self.verbose:
+                print("[INFO] No active vehicles to update lights.")
+            return
+        if not len(self.links):
+            return
+        green = self.policy.green(self, time)
+        self.graph.lights[self.links] = np.where(green, Intersection.GREEN, Intersection.RED)
+        for intersection in self.intersections:
+            if intersection.green_events:
+                intersection.wake_green()
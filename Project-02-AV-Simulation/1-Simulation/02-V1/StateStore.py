@@ -0,0 +1,553 @@
+import numpy as np
+import pandas as pd
+
+
+class State_Store:
+    """Columnar in-memory store for vehicle states and their movement history.
+
+    The store keeps two things apart:
+    - The current state of every vehicle, held in preallocated NumPy arrays
+      indexed by a vehicle slot. Updating a vehicle is O(1).
+    - The history log, an append-only list of fixed-size chunks. A chunk is a
+      NumPy structured array, so appending a row never copies old rows.
+
+    Node ids, lights and vehicle types are stored as integer codes and only
+    decoded when the history is exported with `to_frame()`.
+
+    Attributes:
+        node_ids (list): Node id (str) for each node code
+        node_index (dict): Maps node ids to node codes
+        ids (list): Vehicle id (str) for each slot
+        slots (dict): Maps vehicle ids to slots
+        capacity (int): Number of preallocated vehicle slots
+        chunk_size (int): Number of rows in each history chunk
+        on_chunk_full (callable): Called with the store each time a history chunk fills up,
+            e.g. to stream it to disk (see `TrajectoryLog.Trajectory_Writer`)
+        failed_moves (int): Moves on a link where no allowed action was possible
+        stuck_steps (int): Ticks a vehicle spent stuck (failed moves and red lights)
+
+    Example:
+        >>> store = State_Store(nodes=["1", "2", "3"])
+        >>> slot = store.add(vehicle_id="7", type_="AV")
+        >>> store.record(slot, time=0, origin="1", destination="2", lane=3, block=0,
+        ...              arrival_time=0, stuck_time=0, light="none")
+        >>> store.sorted_active_ids()
+        ['7']
+        >>> store.link_counts()
+        {('1', '2'): 1}
+    """
+
+    COLUMNS = ["time", "vehicle_id", "origin", "destination", "lane", "block",
+               "arrival_time", "stuck_time", "active", "light", "type"]
+    LIGHTS = ["none", "red", "green"]
+    TYPES = ["HDV", "AV"]
+    ROW = np.dtype([("time", np.int64),
+                    ("slot", np.int32),
+                    ("origin", np.int32),
+                    ("destination", np.int32),
+                    ("lane", np.int8),
+                    ("block", np.int32),
+                    ("arrival_time", np.int64),
+                    ("stuck_time", np.int64),
+                    ("light", np.int8)])
+    # Arrays with one entry per vehicle slot
+    ARRAYS = ["time", "origin", "destination", "lane", "block", "arrival_time", "stuck_time", "active",
+              "light", "type", "last_row", "departure_time", "total_stuck_time"]
+
+    def __init__(self, nodes: list, capacity: int = 1024, chunk_size: int = 65536):
+        """Initialize an empty store.
+
+        Args:
+            nodes (list): Node ids of the network graph
+            capacity (int, optional): Initial number of vehicle slots. Grows on demand. Defaults to 1024.
+            chunk_size (int, optional): Rows per history chunk. Defaults to 65536.
+        """
+        self.node_ids = [str(node) for node in nodes]
+        self.node_index = {node: i for i, node in enumerate(self.node_ids)}
+        self._light_index = {light: i for i, light in enumerate(self.LIGHTS)}
+        self.ids = []
+        self.slots = {}
+        self.capacity = 0
+        self.chunk_size = int(chunk_size)
+        self._chunks = []
+        self._rows = 0
+        self._offset = 0
+        # Order of the last sorted_active_slots() call, its keys, and the slots it has seen
+        self._order = None
+        self._order_key = None
+        self._known = 0
+        self.on_chunk_full = None
+        self.failed_moves = 0
+        self.stuck_steps = 0
+
+        # Current state, one entry per vehicle slot
+        self.time = np.zeros(0, dtype=np.int64)
+        self.origin = np.zeros(0, dtype=np.int32)
+        self.destination = np.zeros(0, dtype=np.int32)
+        self.lane = np.zeros(0, dtype=np.int8)
+        self.block = np.zeros(0, dtype=np.int32)
+        self.arrival_time = np.zeros(0, dtype=np.int64)
+        self.stuck_time = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        self.light = np.zeros(0, dtype=np.int8)
+        self.type = np.zeros(0, dtype=np.int8)
+        self.last_row = np.zeros(0, dtype=np.int64)
+        # Trip totals, one entry per vehicle slot
+        self.departure_time = np.zeros(0, dtype=np.int64)
+        self.total_stuck_time = np.zeros(0, dtype=np.int64)
+        self.reserve(capacity)
+
+    def __len__(self) -> int:
+        """Number of rows in the history log."""
+        return self._rows
+
+    @property
+    def empty(self) -> bool:
+        """True if nothing has been recorded yet (same meaning as `DataFrame.empty`)."""
+        return self._rows == 0
+
+    def reserve(self, capacity: int) -> None:
+        """Make sure at least `capacity` vehicle slots are preallocated.
+
+        Args:
+            capacity (int): Required number of slots
+        """
+        if capacity <= self.capacity:
+            return
+        for name in self.ARRAYS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def add(self, vehicle_id: str, type_: str) -> int:
+        """Register a new vehicle and return its slot.
+
+        Args:
+            vehicle_id (str): Unique vehicle identifier
+            type_ (str): Vehicle type ("HDV" or "AV")
+
+        Returns:
+            int: Slot of the vehicle in the state arrays
+        """
+        slot = len(self.ids)
+        if slot >= self.capacity:
+            self.reserve(max(2 * self.capacity, 1))
+        self.ids.append(vehicle_id)
+        self.slots[vehicle_id] = slot
+        self.type[slot] = self.TYPES.index(type_.upper())
+        self.last_row[slot] = -1
+        self.departure_time[slot] = -1
+        return slot
+
+    def add_many(self, vehicle_ids: list, types: np.ndarray) -> np.ndarray:
+        """Register many new vehicles at once (see `add`).
+
+        Args:
+            vehicle_ids (list): Unique vehicle identifiers
+            types (np.ndarray): Vehicle type codes (indexes of `TYPES`)
+
+        Returns:
+            np.ndarray: Slots of the vehicles, in the given order
+        """
+        first = len(self.ids)
+        slots = np.arange(first, first + len(vehicle_ids), dtype=np.int64)
+        if first + len(vehicle_ids) > self.capacity:
+            self.reserve(max(2 * self.capacity, first + len(vehicle_ids)))
+        self.ids.extend(vehicle_ids)
+        self.slots.update(zip(vehicle_ids, slots.tolist()))
+        self.type[slots] = types
+        self.last_row[slots] = -1
+        self.departure_time[slots] = -1
+        return slots
+
+    def record(self, slot: int, time: int, origin: str, destination: str, lane: int, block: int,
+               arrival_time: int, stuck_time: int, light: str) -> None:
+        """Set the current state of a vehicle and append it to the history log.
+
+        This replaces marking the old rows of the vehicle inactive and appending a new
+        active row to the statistics frame. Both steps are O(1) here.
+
+        Args:
+            slot (int): Slot of the vehicle
+            time (int): Current simulation time
+            origin (str): Current node
+            destination (str): Next node
+            lane (int): Current lane (0-4)
+            block (int): Block position in lane
+            arrival_time (int): Time the vehicle arrived at the current link
+            stuck_time (int): Time the vehicle has been stuck
+            light (str): Light status ("none", "red" or "green")
+        """
+        origin = self.node_index[origin]
+        destination = self.node_index[destination]
+        light = self._light_index[light]
+        if self.departure_time[slot] < 0:
+            self.departure_time[slot] = time
+            self.total_stuck_time[slot] += stuck_time
+        elif (self.origin[slot] == origin and self.destination[slot] == destination
+              and self.arrival_time[slot] == arrival_time):
+            self.total_stuck_time[slot] += stuck_time - self.stuck_time[slot]
+        else:
+            # Stuck time restarts on every new link
+            self.total_stuck_time[slot] += stuck_time
+        self.time[slot] = time
+        self.origin[slot] = origin
+        self.destination[slot] = destination
+        self.lane[slot] = lane
+        self.block[slot] = block
+        self.arrival_time[slot] = arrival_time
+        self.stuck_time[slot] = stuck_time
+        self.light[slot] = light
+        self.active[slot] = True
+
+        position = self._rows % self.chunk_size
+        if position == 0:
+            self._chunks.append(np.zeros(self.chunk_size, dtype=self.ROW))
+        self._chunks[-1][position] = (time, slot, origin, destination, lane, block,
+                                      arrival_time, stuck_time, light)
+        self.last_row[slot] = self._rows
+        self._rows += 1
+        if self._rows % self.chunk_size == 0 and self.on_chunk_full is not None:
+            self.on_chunk_full(self)
+
+    def append(self, rows: np.ndarray) -> int:
+        """Append many history rows at once, without changing the current states.
+
+        Use `set_current` afterwards to make the last row of each vehicle its current state.
+
+        Args:
+            rows (np.ndarray): History rows in the `ROW` layout, in log order
+
+        Returns:
+            int: Row number of the first appended row
+        """
+        first = self._rows
+        start = 0
+        while start < len(rows):
+            position = self._rows % self.chunk_size
+            if position == 0:
+                self._chunks.append(np.zeros(self.chunk_size, dtype=self.ROW))
+            count = min(len(rows) - start, self.chunk_size - position)
+            self._chunks[-1][position:position + count] = rows[start:start + count]
+            self._rows += count
+            start += count
+            if self._rows % self.chunk_size == 0 and self.on_chunk_full is not None:
+                self.on_chunk_full(self)
+        return first
+
+    def set_current(self, rows: np.ndarray, row_numbers: np.ndarray) -> None:
+        """Make appended rows the current states of their vehicles, as `record` would.
+
+        The rows must not start a new trip or link (departure time and link are
+        already recorded), so the trip totals only change with the stuck time.
+
+        Args:
+            rows (np.ndarray): One history row per vehicle slot, in the `ROW` layout
+            row_numbers (np.ndarray): Row number of each row in the log (see `append`)
+        """
+        slots = rows["slot"]
+        self.total_stuck_time[slots] += rows["stuck_time"] - self.stuck_time[slots]
+        for name in ["time", "origin", "destination", "lane", "block", "arrival_time", "stuck_time", "light"]:
+            getattr(self, name)[slots] = rows[name]
+        self.active[slots] = True
+        self.last_row[slots] = row_numbers
+
+    def set_entered(self, rows: np.ndarray, row_numbers: np.ndarray) -> None:
+        """Make appended rows that start a new trip or link the current states, as `record` would.
+
+        The stuck time of each row is added to the trip total, and a vehicle's first
+        row sets its departure time.
+
+        Args:
+            rows (np.ndarray): One history row per vehicle slot, in the `ROW` layout
+            row_numbers (np.ndarray): Row number of each row in the log (see `append`)
+        """
+        slots = rows["slot"]
+        new = self.departure_time[slots] < 0
+        self.departure_time[slots[new]] = rows["time"][new]
+        self.total_stuck_time[slots] += rows["stuck_time"]
+        for name in ["time", "origin", "destination", "lane", "block", "arrival_time", "stuck_time", "light"]:
+            getattr(self, name)[slots] = rows[name]
+        self.active[slots] = True
+        self.last_row[slots] = row_numbers
+
+    def deactivate(self, slot: int) -> None:
+        """Mark a vehicle as out of the system.
+
+        Args:
+            slot (int): Slot of the vehicle
+        """
+        self.active[slot] = False
+
+    STATE = ["time", "origin", "destination", "lane", "block", "arrival_time", "stuck_time",
+             "active", "light", "departure_time", "total_stuck_time"]
+
+    def get_state(self, slot: int) -> dict:
+        """Current state and trip totals of a vehicle, e.g. to move it to another store.
+
+        Node ids are decoded, so the state can be loaded into a store with other node codes.
+
+        Args:
+            slot (int): Slot of the vehicle
+
+        Returns:
+            dict: Values of the fields in `STATE`
+        """
+        state = {name: getattr(self, name)[slot].item() for name in self.STATE}
+        state["origin"] = self.node_ids[state["origin"]]
+        state["destination"] = self.node_ids[state["destination"]]
+        return state
+
+    def set_state(self, slot: int, state: dict) -> None:
+        """Load a state from `get_state` into a slot without adding a history row.
+
+        Args:
+            slot (int): Slot of the vehicle (see `add`)
+            state (dict): State from `get_state`
+        """
+        for name in self.STATE:
+            value = state[name]
+            if name in ("origin", "destination"):
+                value = self.node_index[value]
+            getattr(self, name)[slot] = value
+
+    def checkpoint(self) -> dict:
+        """Vehicle slots and the history held in memory, as arrays (see `restore`).
+
+        Returns:
+            dict: The slot arrays in `ARRAYS`, the vehicle ids, the history rows and their row numbers
+        """
+        n = len(self.ids)
+        arrays = {name: getattr(self, name)[:n] for name in self.ARRAYS}
+        arrays["ids"] = np.array(self.ids, dtype=str)
+        arrays["node_ids"] = np.array(self.node_ids, dtype=str)
+        arrays["history"] = self.history()
+        arrays["first_row"] = np.array(self._offset)
+        arrays["rows"] = np.array(self._rows)
+        return arrays
+
+    def restore(self, arrays: dict) -> None:
+        """Replace all vehicles and the history by those of `checkpoint`.
+
+        Row numbers are kept, so `last_row` stays valid. The `on_chunk_full` hook
+        is not called for the restored rows.
+
+        Args:
+            arrays (dict): Arrays from `checkpoint`
+
+        Raises:
+            ValueError: If the nodes differ or the history does not start at a chunk boundary
+        """
+        if list(arrays["node_ids"]) != self.node_ids:
+            raise ValueError("The checkpoint was taken on a network with other nodes")
+        first_row = int(arrays["first_row"])
+        if first_row % self.chunk_size:
+            raise ValueError(f"The checkpoint history starts at row {first_row}, "
+                             f"use a chunk size that divides it (not {self.chunk_size})")
+        self.ids = [str(vehicle_id) for vehicle_id in arrays["ids"]]
+        self.slots = {vehicle_id: slot for slot, vehicle_id in enumerate(self.ids)}
+        self.capacity = 0
+        for name in self.ARRAYS:
+            setattr(self, name, np.zeros(0, dtype=getattr(self, name).dtype))
+        self.reserve(max(len(self.ids), 1))
+        for name in self.ARRAYS:
+            getattr(self, name)[:len(self.ids)] = arrays[name]
+        self._chunks = []
+        self._order = None
+        self._offset = self._rows = first_row
+        hook, self.on_chunk_full = self.on_chunk_full, None
+        self.append(arrays["history"])
+        self.on_chunk_full = hook
+        if self._rows != int(arrays["rows"]):
+            raise ValueError("The checkpoint history is incomplete")
+
+    def trip_summary(self) -> dict:
+        """Trip counts and totals over all vehicles added so far.
+
+        Returns:
+            dict: spawned, completed, mean_stuck_time (over all vehicles) and
+                mean_travel_time (over completed vehicles, first to last record)
+        """
+        n = len(self.ids)
+        done = ~self.active[:n] & (self.departure_time[:n] >= 0)
+        travel_time = self.time[:n][done] - self.departure_time[:n][done]
+        return {"spawned": n,
+                "completed": int(done.sum()),
+                "mean_stuck_time": float(self.total_stuck_time[:n].mean()) if n else 0.0,
+                "mean_travel_time": float(travel_time.mean()) if len(travel_time) else 0.0}
+
+    def active_slots(self) -> np.ndarray:
+        """Slots of the active vehicles, ordered by their last record.
+
+        This is the order in which the active rows appeared in the old statistics frame.
+
+        Returns:
+            np.ndarray: Slots of active vehicles
+        """
+        n = len(self.ids)
+        slots = np.flatnonzero(self.active[:n])
+        return slots[np.argsort(self.last_row[slots], kind="stable")]
+
+    def sorted_active_slots(self) -> np.ndarray:
+        """Slots of the active vehicles sorted by arrival time plus stuck time.
+
+        Ties keep the order of the last record (stable sort).
+
+        The order of the last call is kept as an index and updated instead of
+        sorting all vehicles again. In a tick every vehicle records in this
+        order, so the vehicles whose key did not change are still sorted. Only
+        the vehicles whose key changed (stuck, or on a new link) and the new
+        vehicles are sorted and merged in: O(n) array work plus O(m log n) for
+        m changed vehicles. If the kept vehicles are out of order (records
+        written in another order), all vehicles are sorted again.
+
+        Returns:
+            np.ndarray: Sorted slots
+        """
+        n = len(self.ids)
+        # Sort by key, then by last record, as one integer (last_row + 1 < scale)
+        scale = self._rows + 1
+        if self._order is not None:
+            alive = self.active[self._order]
+            order = self._order[alive]
+            key = self.arrival_time[order] + self.stuck_time[order]
+            changed = key != self._order_key[alive]
+            kept, kept_key = order[~changed], key[~changed]
+            kept_rank = kept_key * scale + self.last_row[kept] + 1
+            new = np.arange(self._known, n)
+            extra = np.concatenate([order[changed], new[self.active[new]]])
+            extra_key = self.arrival_time[extra] + self.stuck_time[extra]
+            extra_rank = extra_key * scale + self.last_row[extra] + 1
+            if not (np.all(kept_rank[1:] > kept_rank[:-1]) and np.all(self.last_row[extra] >= 0)):
+                self._order = None
+            else:
+                by_rank = np.argsort(extra_rank)
+                position = np.searchsorted(kept_rank, extra_rank[by_rank])
+                slots = np.insert(kept, position, extra[by_rank])
+                self._order_key = np.insert(kept_key, position, extra_key[by_rank])
+        if self._order is None:
+            slots = self.active_slots()
+            slots = slots[np.argsort(self.arrival_time[slots] + self.stuck_time[slots], kind="stable")]
+            self._order_key = self.arrival_time[slots] + self.stuck_time[slots]
+        self._order = slots
+        self._known = n
+        return slots
+
+    def sorted_active_ids(self) -> list:
+        """Active vehicle ids sorted by arrival time plus stuck time (see `sorted_active_slots`).
+
+        Returns:
+            list: Sorted vehicle ids
+        """
+        return [self.ids[slot] for slot in self.sorted_active_slots()]
+
+    def link_counts(self) -> dict:
+        """Number of active vehicles on each link.
+
+        Returns:
+            dict: Maps (origin, destination) node ids to vehicle counts
+        """
+        slots = np.flatnonzero(self.active[:len(self.ids)])
+        links = self.origin[slots].astype(np.int64) * len(self.node_ids) + self.destination[slots]
+        links, counts = np.unique(links, return_counts=True)
+        n = len(self.node_ids)
+        return {(self.node_ids[link // n], self.node_ids[link % n]): int(count)
+                for link, count in zip(links, counts)}
+
+    def active_blocks(self, origin: str, destination: str, lanes: list) -> np.ndarray:
+        """Block positions of the active vehicles on one link and a group of lanes.
+
+        Args:
+            origin (str): Link start node
+            destination (str): Link end node
+            lanes (list): Lane numbers to include
+
+        Returns:
+            np.ndarray: Block positions of the matching vehicles
+        """
+        n = len(self.ids)
+        mask = (self.active[:n]
+                & (self.origin[:n] == self.node_index[str(origin)])
+                & (self.destination[:n] == self.node_index[str(destination)])
+                & np.isin(self.lane[:n], lanes))
+        return self.block[:n][mask]
+
+    @property
+    def first_row(self) -> int:
+        """Row number of the oldest history row still held in memory."""
+        return self._offset
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """History rows with row numbers in [start, stop).
+
+        Args:
+            start (int): First row number (must still be held in memory)
+            stop (int): Row number after the last row
+
+        Returns:
+            np.ndarray: History rows (see `ROW` for the fields)
+        """
+        if start < self._offset:
+            raise ValueError(f"Rows before {self._offset} have been released from memory")
+        stop = min(stop, self._rows)
+        if start >= stop:
+            return np.zeros(0, dtype=self.ROW)
+        first = (start - self._offset) // self.chunk_size
+        last = (stop - 1 - self._offset) // self.chunk_size
+        rows = np.concatenate(self._chunks[first:last + 1]) if last > first else self._chunks[first]
+        begin = start - self._offset - first * self.chunk_size
+        return rows[begin:begin + stop - start]
+
+    def release_history(self, row: int) -> None:
+        """Free the history chunks that only hold rows before `row`.
+
+        Use this after the rows have been written somewhere else. The current
+        vehicle states are not affected.
+
+        Args:
+            row (int): Rows before this row number may be freed
+        """
+        count = (min(row, self._rows) - self._offset) // self.chunk_size
+        if count > 0:
+            del self._chunks[:count]
+            self._offset += count * self.chunk_size
+
+    def history(self) -> np.ndarray:
+        """The history log as one structured array.
+
+        Only the rows still held in memory are included (see `release_history`).
+
+        Returns:
+            np.ndarray: History rows (see `ROW` for the fields)
+        """
+        return self.rows(self._offset, self._rows)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Export the history log in the layout of the old statistics frame.
+
+        A row is active if it is the last record of a vehicle that is still in the system.
+        Rows freed with `release_history` are not included.
+
+        Returns:
+            pd.DataFrame: One row per record, with the columns in `COLUMNS`
+        """
+        rows = self.history()
+        slots = rows["slot"]
+        node_ids = np.array(self.node_ids, dtype=object)
+        ids = np.array(self.ids, dtype=object)
+        index = self._offset + np.arange(len(rows))
+        return pd.DataFrame({
+            "time": rows["time"],
+            "vehicle_id": ids[slots],
+            "origin": node_ids[rows["origin"]],
+            "destination": node_ids[rows["destination"]],
+            "lane": rows["lane"],
+            "block": rows["block"],
+            "arrival_time": rows["arrival_time"],
+            "stuck_time": rows["stuck_time"],
+            "active": (self.last_row[slots] == index) & self.active[slots],
+            "light": np.array(self.LIGHTS, dtype=object)[rows["light"]],
+            "type": np.array(self.TYPES, dtype=object)[self.type[slots]],
+        }, columns=self.COLUMNS)
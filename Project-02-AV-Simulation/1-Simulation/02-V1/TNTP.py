@@ -0,0 +1,170 @@
+"""Readers for the TNTP network format (github.com/bstabler/TransportationNetworks).
+
+A TNTP file has a metadata block of "<KEY> value" lines ending with
+"<END OF METADATA>", comment lines starting with "~" and data lines ending
+with ";". Files are tokenized in one pass: the text is split once and the
+tokens are converted by NumPy, instead of parsing row by row.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+NET_COLUMNS = ["init_node", "term_node", "capacity", "length", "free_flow_time", "b", "power",
+               "speed", "toll", "link_type"]
+METADATA = re.compile(r"<([^>]+)>\s*([^\n]*)")
+
+
+def _split(path: str) -> tuple[dict, str]:
+    """Split a TNTP file into its metadata and its data text (comments removed)."""
+    with open(path) as file:
+        text = file.read()
+    metadata = {}
+    if "<END OF METADATA>" in text:
+        head, text = text.split("<END OF METADATA>", 1)
+        metadata = {key.strip().upper(): value.strip() for key, value in METADATA.findall(head)}
+    # Drop comment lines (the column header starts with "~")
+    text = re.sub(r"^\s*~[^\n]*", "", text, flags=re.MULTILINE)
+    return metadata, text
+
+
+def _table(text: str, header: bool = False) -> tuple[list, np.ndarray]:
+    """Tokenize a table whose rows end with ";" (or a new line) into a 2-D float array."""
+    lines = [line for line in text.splitlines() if line.strip() and line.strip() != ";"]
+    names = []
+    if header:
+        names = lines[0].replace(";", " ").split()
+        lines = lines[1:]
+    columns = len(lines[0].replace(";", " ").split()) if lines else len(names)
+    values = np.array(" ".join(lines).replace(";", " ").split(), dtype=np.float64)
+    return names, values.reshape(-1, columns)
+
+
+def read_metadata(path: str) -> dict:
+    """Metadata of a TNTP file.
+
+    Args:
+        path (str): TNTP file
+
+    Returns:
+        dict: Maps keys like "NUMBER OF ZONES" to their (string) values
+    """
+    return _split(path)[0]
+
+
+def read_net(path: str) -> pd.DataFrame:
+    """Read a `_net.tntp` link file.
+
+    Args:
+        path (str): Network file
+
+    Returns:
+        pd.DataFrame: One row per link with the columns in NET_COLUMNS (extra columns are dropped)
+
+    Example:
+        >>> links = read_net("SiouxFalls_net.tntp")
+        >>> links[["init_node", "term_node", "capacity", "free_flow_time"]].head(1)
+    """
+    _, text = _split(path)
+    _, values = _table(text)
+    frame = pd.DataFrame(values[:, :len(NET_COLUMNS)], columns=NET_COLUMNS[:values.shape[1]])
+    for column in ["init_node", "term_node", "link_type"]:
+        if column in frame:
+            frame[column] = frame[column].astype(np.int64)
+    return frame
+
+
+def read_nodes(path: str) -> pd.DataFrame:
+    """Read a `_node.tntp` coordinate file (header line "Node X Y").
+
+    Args:
+        path (str): Node file
+
+    Returns:
+        pd.DataFrame: One row per node with an integer "Node" column and the coordinates
+    """
+    _, text = _split(path)
+    names, values = _table(text, header=True)
+    frame = pd.DataFrame(values, columns=names[:values.shape[1]])
+    frame[names[0]] = frame[names[0]].astype(np.int64)
+    return frame
+
+
+def read_flow(path: str) -> pd.DataFrame:
+    """Read a `_flow.tntp` equilibrium flow file (header line "From To Volume Cost").
+
+    Args:
+        path (str): Flow file
+
+    Returns:
+        pd.DataFrame: One row per link with integer "From"/"To" columns, "Volume" and "Cost"
+    """
+    _, text = _split(path)
+    names, values = _table(text, header=True)
+    frame = pd.DataFrame(values, columns=names[:values.shape[1]])
+    for column in names[:2]:
+        frame[column] = frame[column].astype(np.int64)
+    return frame
+
+
+def read_trips(path: str) -> pd.DataFrame:
+    """Read a `_trips.tntp` OD table.
+
+    The file lists "Origin o" followed by "d : flow;" entries. Zero flows and
+    trips from a zone to itself are dropped.
+
+    Args:
+        path (str): Trip table file
+
+    Returns:
+        pd.DataFrame: Columns Origin, Destination and flow
+    """
+    _, text = _split(path)
+    tokens = np.array(text.replace(":", " ").replace(";", " ").split())
+    is_origin = tokens == "Origin"
+    # Each "Origin" keyword and the zone after it start a new block of (destination, flow) pairs
+    block = np.cumsum(is_origin) - 1
+    origins = tokens[np.flatnonzero(is_origin) + 1].astype(np.int64)
+    pairs = ~(is_origin | np.roll(is_origin, 1))
+    values = tokens[pairs].astype(np.float64).reshape(-1, 2)
+    origin = origins[block[pairs][::2]]
+    frame = pd.DataFrame({"Origin": origin, "Destination": values[:, 0].astype(np.int64), "flow": values[:, 1]})
+    return frame[(frame["flow"] > 0) & (frame["Origin"] != frame["Destination"])].reset_index(drop=True)
+
+
+def trips_to_demand(trips: pd.DataFrame, horizon: float, scale: float = 1.0, av_share: float = 0.0,
+                    seed: int = None) -> pd.DataFrame:
+    """Expand an OD table into individual trips with departure times.
+
+    Each OD pair gets round(flow * scale) trips (the fractional part is drawn
+    at random), with departures spread uniformly over [0, horizon). Vehicle
+    types are drawn with `av_share`, start lanes uniformly from 1 to 5.
+
+    Args:
+        trips (pd.DataFrame): OD table from `read_trips`
+        horizon (float): Length of the departure period in time steps
+        scale (float, optional): Factor on the flows, e.g. to turn hourly flows into a shorter period. Defaults to 1.0.
+        av_share (float, optional): Probability that a trip is an AV (type 2). Defaults to 0.0.
+        seed (int, optional): Random seed. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Demand in the layout of demand.csv (ID, departure, Origin, Destination, type, lane),
+            sorted by departure
+
+    Example:
+        >>> demand = trips_to_demand(read_trips("SiouxFalls_trips.tntp"), horizon=3600, scale=0.01)
+    """
+    rng = np.random.default_rng(seed)
+    expected = trips["flow"].to_numpy() * scale
+    counts = np.floor(expected).astype(np.int64)
+    counts += rng.random(len(counts)) < expected - counts
+    total = int(counts.sum())
+    departure = np.floor(rng.uniform(0, horizon, total))
+    order = np.argsort(departure, kind="stable")
+    return pd.DataFrame({"ID": np.arange(total),
+                         "departure": departure[order],
+                         "Origin": np.repeat(trips["Origin"].to_numpy(), counts)[order],
+                         "Destination": np.repeat(trips["Destination"].to_numpy(), counts)[order],
+                         "type": np.where(rng.random(total) < av_share, 2, 1),
+                         "lane": rng.integers(1, 6, total)})
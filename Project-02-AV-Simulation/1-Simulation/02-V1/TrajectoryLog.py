@@ -0,0 +1,240 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+INDEX_FILE = "_index.json"
+VEHICLES_FILE = "_vehicles.jsonl"
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("The trajectory log needs pyarrow, install it with 'pip install pyarrow'")
+
+
+class Trajectory_Writer:
+    """Streams the history log of a `State_Store` to a directory of Parquet parts.
+
+    Attached to a store, the writer gets called each time a history chunk fills
+    up. The chunk is written as one Parquet part file, so a crash only loses
+    the rows of the chunk that was still open. Vehicle ids, nodes, lights and
+    vehicle types are written as dictionary columns.
+
+    Next to the parts, `_index.json` holds the time range of every part and is
+    replaced atomically after every part. The vehicle ids of each part are
+    appended as one line to `_vehicles.jsonl`, so writing a part costs the same
+    however many vehicles came before. `Trajectory_Reader` uses both files to
+    read a time window or one vehicle without scanning the whole log.
+
+    The trajectory has no "active" column. Whether a row is the final state of
+    a vehicle is only known at the end of the run.
+
+    Attributes:
+        directory (Path): Output directory of the part files
+        keep_history (bool): Keep written rows in the store's memory as well
+        compression (str): Parquet compression codec
+        rows_written (int): Number of history rows written so far
+        parts (list): Metadata of the written parts
+
+    Example:
+        >>> writer = Trajectory_Writer("output/trajectory", keep_history=False)
+        >>> writer.attach(world.stats)
+        >>> world.env.run(until=1000)
+        >>> writer.close(world.stats)
+    """
+
+    def __init__(self, directory: str, keep_history: bool = True, compression: str = "zstd"):
+        """Create the output directory.
+
+        Args:
+            directory (str): Directory for the part files. Old parts and their index are replaced
+                by an empty log.
+            keep_history (bool, optional): Keep written rows in memory. Defaults to True.
+            compression (str, optional): Parquet compression codec. Defaults to "zstd".
+        """
+        _require_pyarrow()
+        self.directory = Path(directory)
+        self.keep_history = keep_history
+        self.compression = compression
+        self.rows_written = 0
+        self.parts = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Empty the index before the old parts go, so a reader never finds parts that are gone
+        self._write_index()
+        open(self.directory / VEHICLES_FILE, "w").close()
+        for old in self.directory.glob("part-*.parquet"):
+            old.unlink()
+
+    def attach(self, store) -> None:
+        """Flush every full history chunk of `store` as soon as it fills up.
+
+        Args:
+            store (State_Store): Store to stream
+        """
+        store.on_chunk_full = self.flush
+
+    def flush(self, store, final: bool = False) -> None:
+        """Write the new history rows of the store.
+
+        Without `final` only complete chunks are written, so every part has
+        `store.chunk_size` rows. With `final` the open chunk is written as well.
+
+        Args:
+            store (State_Store): Store to write from
+            final (bool, optional): Also write the rows of the open chunk. Defaults to False.
+        """
+        stop = len(store) if final else len(store) - len(store) % store.chunk_size
+        if stop <= self.rows_written:
+            return
+        rows = store.rows(self.rows_written, stop)
+        self._write_part(store, rows)
+        self.rows_written = stop
+        if not self.keep_history:
+            store.release_history(stop)
+
+    def close(self, store) -> None:
+        """Write the remaining rows and detach from the store.
+
+        Args:
+            store (State_Store): Store to write from
+        """
+        self.flush(store, final=True)
+        if store.on_chunk_full == self.flush:
+            store.on_chunk_full = None
+
+    def _write_part(self, store, rows: np.ndarray) -> None:
+        """Write one part file and update the index."""
+        number = len(self.parts)
+        slots, vehicle_codes = np.unique(rows["slot"], return_inverse=True)
+        vehicle_ids = [store.ids[slot] for slot in slots]
+        nodes = pa.array(store.node_ids, type=pa.string())
+        table = pa.table({
+            "time": rows["time"],
+            "vehicle_id": pa.DictionaryArray.from_arrays(vehicle_codes.astype(np.int32),
+                                                         pa.array(vehicle_ids, type=pa.string())),
+            "origin": pa.DictionaryArray.from_arrays(rows["origin"], nodes),
+            "destination": pa.DictionaryArray.from_arrays(rows["destination"], nodes),
+            "lane": rows["lane"],
+            "block": rows["block"],
+            "arrival_time": rows["arrival_time"],
+            "stuck_time": rows["stuck_time"],
+            "light": pa.DictionaryArray.from_arrays(rows["light"], pa.array(store.LIGHTS)),
+            "type": pa.DictionaryArray.from_arrays(store.type[rows["slot"]], pa.array(store.TYPES)),
+        })
+        file_name = f"part-{number:05d}.parquet"
+        pq.write_table(table, self.directory / file_name, compression=self.compression)
+
+        self.parts.append({"file": file_name,
+                           "first_row": self.rows_written,
+                           "rows": len(rows),
+                           "time_min": int(rows["time"].min()),
+                           "time_max": int(rows["time"].max())})
+        # The vehicle line goes before the index, so every part in the index has its line
+        with open(self.directory / VEHICLES_FILE, "a") as file:
+            file.write(json.dumps({"part": number, "vehicles": vehicle_ids}) + "\n")
+        self._write_index()
+
+    def _write_index(self) -> None:
+        """Replace the index file atomically."""
+        temporary = self.directory / (INDEX_FILE + ".tmp")
+        with open(temporary, "w") as file:
+            json.dump({"parts": self.parts}, file)
+        os.replace(temporary, self.directory / INDEX_FILE)
+
+
+class Trajectory_Reader:
+    """Reads a trajectory log written by `Trajectory_Writer`.
+
+    Only the part files that can hold the requested rows are opened.
+
+    Attributes:
+        directory (Path): Directory of the part files
+        parts (list): Metadata of the parts
+        vehicles (dict): Maps vehicle ids to their first and last part
+
+    Example:
+        >>> log = Trajectory_Reader("output/trajectory")
+        >>> window = log.read(start=500, stop=600)
+        >>> trip = log.vehicle("42")
+    """
+
+    def __init__(self, directory: str):
+        """Load the index of a trajectory log and map the vehicles to their parts.
+
+        Args:
+            directory (str): Directory of the part files
+        """
+        _require_pyarrow()
+        self.directory = Path(directory)
+        with open(self.directory / INDEX_FILE) as file:
+            index = json.load(file)
+        self.parts = index["parts"]
+        self.vehicles = {}
+        with open(self.directory / VEHICLES_FILE) as file:
+            for number, line in enumerate(file):
+                # Lines past the index belong to a part that was being written
+                if number >= len(self.parts):
+                    break
+                for vehicle_id in json.loads(line)["vehicles"]:
+                    self.vehicles.setdefault(vehicle_id, [number, number])[1] = number
+
+    def __len__(self) -> int:
+        """Number of rows in the log."""
+        return sum(part["rows"] for part in self.parts)
+
+    def read(self, start: int = None, stop: int = None) -> pd.DataFrame:
+        """Rows with start <= time < stop.
+
+        Args:
+            start (int, optional): First time step. Defaults to None (from the beginning).
+            stop (int, optional): Time step after the window. Defaults to None (to the end).
+
+        Returns:
+            pd.DataFrame: Matching rows in log order
+        """
+        parts = [part for part in self.parts
+                 if (start is None or part["time_max"] >= start) and (stop is None or part["time_min"] < stop)]
+        filters = []
+        if start is not None:
+            filters.append(("time", ">=", start))
+        if stop is not None:
+            filters.append(("time", "<", stop))
+        return self._read_parts(parts, filters)
+
+    def vehicle(self, vehicle_id: str) -> pd.DataFrame:
+        """Full trajectory of one vehicle.
+
+        Args:
+            vehicle_id (str): Vehicle identifier
+
+        Returns:
+            pd.DataFrame: Rows of the vehicle in log order (empty if it is not in the log)
+        """
+        vehicle_id = str(vehicle_id)
+        if vehicle_id not in self.vehicles:
+            return self._read_parts([], [])
+        first, last = self.vehicles[vehicle_id]
+        return self._read_parts(self.parts[first:last + 1], [("vehicle_id", "=", vehicle_id)])
+
+    def to_frame(self) -> pd.DataFrame:
+        """The whole log as one DataFrame."""
+        return self._read_parts(self.parts, [])
+
+    def _read_parts(self, parts: list, filters: list) -> pd.DataFrame:
+        """Read and filter a list of parts into one frame with categorical columns."""
+        tables = [pq.read_table(self.directory / part["file"], filters=filters or None) for part in parts]
+        if not tables:
+            return pd.DataFrame(columns=["time", "vehicle_id", "origin", "destination", "lane", "block",
+                                         "arrival_time", "stuck_time", "light", "type"])
+        table = pa.concat_tables([table.unify_dictionaries() for table in tables]).unify_dictionaries()
+        return table.to_pandas()
@@ -0,0 +1,114 @@
+"""A* on the CSR arrays against Dijkstra: nodes visited and time per query.
+
+For SiouxFalls and square grid networks of growing size (node positions
+jittered, link lengths 0-30% longer than the straight line), random link
+occupancies are set and random OD pairs are routed with:
+- networkx Dijkstra (`nx.shortest_path`, as `Vehicle._shortest_path` without a router)
+- Dijkstra on the CSR arrays (`Routing.AStar_Router` with heuristic=False)
+- A* on the CSR arrays (`Routing.AStar_Router`)
+
+The paths must have the same cost; "same path" counts identical node lists.
+A small TNTP network with a zero free-flow time link checks that the heuristic
+still finds the shortest path when a link costs nothing.
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+import DataLoader
+import Routing
+
+data_directory = Path(__file__).resolve().parents[2] / "data"
+
+
+def grid_network(size: int, directory: Path, rng: np.random.Generator) -> list:
+    """Write a size x size grid network (1 km spacing) and its node positions, return the file paths."""
+    x = np.tile(np.arange(size) * 1000.0, size) + rng.uniform(-200, 200, size * size)
+    y = np.repeat(np.arange(size) * 1000.0, size) + rng.uniform(-200, 200, size * size)
+    links = []
+    for node in range(size * size):
+        row, column = divmod(node, size)
+        for neighbor in [node - 1 if column else -1, node + 1 if column < size - 1 else -1,
+                         node - size, node + size]:
+            if 0 <= neighbor < size * size:
+                length = np.hypot(x[node] - x[neighbor], y[node] - y[neighbor]) * rng.uniform(1.0, 1.3)
+                links.append((node + 1, neighbor + 1, int(length) // 100 * 100 + 100))
+    network = directory / f"grid_{size}.csv"
+    positions = directory / f"grid_{size}_xy.tntp"
+    pd.DataFrame(links, columns=["from", "to", "length"]).to_csv(network, index=False)
+    pd.DataFrame({"Node": np.arange(1, size * size + 1), "X": x, "Y": y}).to_csv(positions, sep="\t", index=False)
+    return [network, positions]
+
+
+def zero_cost_network(directory: Path) -> list:
+    """Write a 4-node TNTP network whose shortest path 1-2-3-4 uses a link with zero free-flow time."""
+    network = directory / "zero_cost_net.tntp"
+    positions = directory / "zero_cost_node.tntp"
+    links = [(1, 2, 5.0), (2, 3, 0.0), (1, 3, 8.0), (3, 4, 5.0)]
+    network.write_text("<NUMBER OF NODES> 4\n<NUMBER OF LINKS> 4\n<END OF METADATA>\n"
+                       "~ init_node term_node capacity length free_flow_time b power speed toll link_type ;\n"
+                       + "".join(f"{u} {v} 1000 1 {free_flow} 0.15 4 0 0 1 ;\n" for u, v, free_flow in links))
+    positions.write_text("Node\tX\tY\n1\t0\t0\n2\t1000\t0\n3\t2000\t0\n4\t3000\t0\n")
+    return [network, positions]
+
+
+def run(name: str, network_files: list, queries: int, rng: np.random.Generator) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph = DataLoader.Graph_Generator(network_files=network_files, dedicated_lane_length=500,
+                                           lane_changing_zone_length=500, each_block_length=100)
+    graph.occupancy[:] = rng.integers(0, 200, len(graph.occupancy))
+    costs = graph.link_costs()
+    nodes = graph.node_ids
+    pairs = [(nodes[a], nodes[b]) for a, b in rng.integers(0, len(nodes), (queries, 2))
+             if a != b and nx.has_path(graph.graph, nodes[a], nodes[b])]
+    astar = Routing.AStar_Router(graph)
+    dijkstra = Routing.AStar_Router(graph, heuristic=False)
+
+    def weight(u, v, data):
+        return costs[data["index"]]
+
+    def path_cost(path):
+        return sum(costs[graph.edge_index[link]] for link in zip(path, path[1:]))
+
+    seconds = {"networkx": 0.0, "csr dijkstra": 0.0, "csr a*": 0.0}
+    same = 0
+    for from_, to_ in pairs:
+        start = time.perf_counter()
+        expected = nx.shortest_path(graph.graph, source=from_, target=to_, weight=weight)
+        seconds["networkx"] += time.perf_counter() - start
+        start = time.perf_counter()
+        dijkstra.shortest_path(from_, to_)
+        seconds["csr dijkstra"] += time.perf_counter() - start
+        start = time.perf_counter()
+        path = astar.shortest_path(from_, to_)
+        seconds["csr a*"] += time.perf_counter() - start
+        if not np.isclose(path_cost(path), path_cost(expected)):
+            raise AssertionError(f"A* path {from_} -> {to_} is not a shortest path")
+        same += path == expected
+    timing = " ".join(f"{seconds[key] / len(pairs) * 1e3:>13.3f}" for key in seconds)
+    print(f"{name:>12} {len(nodes):>6} {dijkstra.report()['visited_per_search']:>10.1f} "
+          f"{astar.report()['visited_per_search']:>8.1f} {timing} {same:>5}/{len(pairs)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 40, 80])
+    parser.add_argument("--queries", type=int, default=200)
+    arguments = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'network':>12} {'nodes':>6} {'visited':>10} {'':>8} {'ms/query':>13}")
+    print(f"{'':>12} {'':>6} {'dijkstra':>10} {'a*':>8} {'networkx':>13} {'csr dijkstra':>13} {'csr a*':>13} {'same path':>11}")
+    run("SiouxFalls", [data_directory / "Network.csv", data_directory / "SiouxFalls_node_xy.tntp"],
+        arguments.queries, rng)
+    with tempfile.TemporaryDirectory() as directory:
+        run("zero cost", zero_cost_network(Path(directory)), arguments.queries, rng)
+        for size in arguments.sizes:
+            run(f"grid {size}x{size}", grid_network(size, Path(directory), rng), arguments.queries, rng)
@@ -0,0 +1,64 @@
+"""Memory per concurrent vehicle, measured with tracemalloc.
+
+Spawns `--vehicles` vehicles with random OD pairs on SiouxFalls (tick-mode
+objects, no SimPy process per vehicle) and splits the traced memory into:
+- "objects": the Vehicle objects, their ids and paths, and the id -> vehicle dict
+- "state": the vehicle slots of the State_Store (with their spare capacity)
+- "history": the one history row each vehicle writes when it spawns
+"""
+import argparse
+import contextlib
+import gc
+import io
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import simpy
+
+import DataLoader
+import Players
+import Routing
+import StateStore
+
+data_directory = Path(__file__).resolve().parents[2] / "data"
+network_files = [data_directory / "Network.csv", data_directory / "SiouxFalls_node_xy.tntp"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, default=100_000)
+    arguments = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph = DataLoader.Graph_Generator(network_files=network_files, dedicated_lane_length=500,
+                                           lane_changing_zone_length=500, each_block_length=100)
+    env = simpy.Environment()
+    stats = StateStore.State_Store(nodes=graph.graph.nodes)
+    router = Routing.Router(graph, time_bucket=5)
+    router.advance(0)
+    nodes = list(graph.graph.nodes)
+    pairs = np.random.default_rng(0).integers(0, len(nodes), (arguments.vehicles, 2))
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    vehicles = {}
+
+    gc.collect()
+    tracemalloc.start()
+    for i, (origin, destination) in enumerate(pairs):
+        vehicle = Players.Vehicle(env=env, id=str(i), initial_path=[nodes[origin], nodes[destination]],
+                                  initial_lane=str(i % 5), type_="AV" if i % 2 else "HDV",
+                                  graph=graph, stats=stats, router=router)
+        vehicles[vehicle.id] = vehicle
+    total, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    count = len(vehicles)
+    history = sum(chunk.nbytes for chunk in stats._chunks)
+    state = sum(getattr(stats, name).nbytes for name in ["time", "origin", "destination", "lane", "block",
+                                                            "arrival_time", "stuck_time", "active", "light",
+                                                            "type", "last_row", "departure_time",
+                                                            "total_stuck_time"])
+    objects = total - history - state
+    print(f"[INFO] {count} vehicles, {total / 2 ** 20:.1f} MiB traced")
+    print(f"{'part':>10} {'bytes/vehicle':>14}")
+    for name, size in [("objects", objects), ("state", state), ("history", history), ("total", total)]:
+        print(f"{name:>10} {size / count:>14.0f}")
@@ -0,0 +1,68 @@
+"""Mesoscopic against block-level mode: KPIs, run time and the ranking of scenarios.
+
+Every scenario of a small screening grid (signal policy x AV share) runs on
+SiouxFalls with trips from a TNTP trip table, once with `Clock(mode="tick")`
+and once with `Clock(mode="meso")`. The table shows the KPIs of both and the
+speedup; at the end, the scenarios ranked by mean travel time in both modes.
+
+Example:
+    python benchmark_mesoscopic.py --trips SiouxFalls_trips.tntp --scale 0.2
+"""
+import argparse
+import contextlib
+import io
+import time
+from pathlib import Path
+
+import Signals
+from Engine import Clock
+
+data_directory = Path(__file__).resolve().parents[2] / "data"
+POLICIES = {"queue": Signals.Queue_Policy,
+            "pressure": Signals.Max_Pressure_Policy,
+            "fixed": lambda: Signals.Fixed_Time_Policy(green_time=10)}
+
+
+def run(mode: str, policy: str, av_share: float, arguments: argparse.Namespace) -> tuple:
+    """Run one scenario and return its KPIs and run time in seconds."""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        world = Clock(network_files=[data_directory / "Network.csv", data_directory / "SiouxFalls_node_xy.tntp"],
+                      output_directory=".", dedicated_lane_length=arguments.dedicated_lane_length,
+                      lane_changing_zone_length=arguments.lane_changing_zone_length, mode=mode,
+                      routing_time_bucket=arguments.routing_time_bucket, signal_policy=POLICIES[policy]())
+        world.generate_trips(arguments.trips, horizon=arguments.until // 2, scale=arguments.scale,
+                             av_share=av_share, seed=1)
+        start = time.perf_counter()
+        world.run(until=arguments.until, save=False)
+        seconds = time.perf_counter() - start
+    return world.kpis(), seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trips", required=True, help="TNTP trip table of SiouxFalls")
+    parser.add_argument("--scale", type=float, default=0.2)
+    parser.add_argument("--until", type=int, default=4000)
+    parser.add_argument("--av-shares", type=float, nargs="+", default=[0.2, 0.6])
+    parser.add_argument("--policies", nargs="+", default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument("--dedicated-lane-length", type=int, default=500)
+    parser.add_argument("--lane-changing-zone-length", type=int, default=500)
+    parser.add_argument("--routing-time-bucket", type=int, default=60)
+    arguments = parser.parse_args()
+
+    print(f"{'policy':>9} {'AV':>4} {'':>6} {'travel time':>12} {'stuck time':>11} {'completed':>10} {'seconds':>8}")
+    travel_times = {"tick": {}, "meso": {}}
+    for policy in arguments.policies:
+        for av_share in arguments.av_shares:
+            seconds = {}
+            for mode in ["tick", "meso"]:
+                kpis, seconds[mode] = run(mode, policy, av_share, arguments)
+                travel_times[mode][(policy, av_share)] = kpis["mean_travel_time"]
+                print(f"{policy:>9} {av_share:>4} {mode:>6} {kpis['mean_travel_time']:>12.1f} "
+                      f"{kpis['mean_stuck_time']:>11.1f} {kpis['completion_rate']:>10.3f} {seconds[mode]:>8.2f}")
+            print(f"{'':>9} {'':>4} {'':>6} {'':>12} {'':>11} {'speedup':>10} {seconds['tick'] / seconds['meso']:>8.1f}")
+
+    ranking = {mode: sorted(times, key=times.get) for mode, times in travel_times.items()}
+    print("\n[INFO] Scenarios by mean travel time (best first)")
+    for place, (tick, meso) in enumerate(zip(ranking["tick"], ranking["meso"]), start=1):
+        print(f"{place:>3} tick {tick[0]:>9} {tick[1]:>4}   meso {meso[0]:>9} {meso[1]:>4}")
@@ -0,0 +1,46 @@
+"""Cold against warm startup of `Graph_Generator`.
+
+- "cold": parse the network files and build the SymPy expressions
+- "warm": memory-map the artifact saved by the first cached build
+
+Each case runs in a fresh interpreter so that import and SymPy caches do not
+carry over between repeats. Only graph construction is timed; importing
+DataLoader (pandas, networkx, SymPy, matplotlib) is the same in both cases.
+"""
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+data_directory = Path(__file__).resolve().parents[2] / "data"
+network_files = [data_directory / "Network.csv", data_directory / "SiouxFalls_node_xy.tntp"]
+repeat = 5
+
+build = """
+import sys, time
+import DataLoader
+start = time.perf_counter()
+DataLoader.Graph_Generator(network_files={files!r}, dedicated_lane_length=500, lane_changing_zone_length=500,
+                           each_block_length=100, cache_directory={cache!r})
+print(time.perf_counter() - start)
+"""
+
+
+def startup(cache: str = None) -> float:
+    """Seconds to build the graph in a fresh interpreter."""
+    code = build.format(files=[str(file) for file in network_files], cache=cache)
+    output = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent,
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as cache:
+        start = time.perf_counter()
+        startup(cache)  # builds the artifact
+        print(f"first cached build (writes the artifact): {(time.perf_counter() - start) * 1e3:.1f} ms wall, including interpreter startup")
+        cold = min(startup() for _ in range(repeat))
+        warm = min(startup(cache) for _ in range(repeat))
+    print(f"{'cold ms':>8} {'warm ms':>8} {'speedup':>8}")
+    print(f"{cold * 1e3:>8.1f} {warm * 1e3:>8.1f} {cold / warm:>8.2f}")
@@ -0,0 +1,54 @@
+"""Wall time of a partitioned run at 1, 2, 4 and 8 workers.
+
+The single-process `Clock` (tick mode, 5-step routing snapshot) is timed as the
+baseline, and every partitioned run is checked against its history log. The
+speedup is bounded by the number of CPU cores: with fewer cores than workers,
+the regions share the cores and the extra messages only add time.
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+from pathlib import Path
+
+from Engine import Clock
+from Partition import Partitioned_Clock
+
+data_directory = Path(__file__).resolve().parents[2] / "data"
+network_files = [data_directory / "Network.csv", data_directory / "SiouxFalls_node_xy.tntp"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--until", type=int, default=3000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--demand", default=data_directory / "demand.csv")
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        world = Clock(network_files=network_files, output_directory=".", dedicated_lane_length=500,
+                      lane_changing_zone_length=500, routing_time_bucket=5, mode="tick")
+        world.generate_vehicles(arguments.demand)
+        world.run(until=arguments.until, save=False)
+    baseline = time.perf_counter() - start
+    reference = world.stats.to_frame().reset_index(drop=True)
+    print(f"[INFO] {os.cpu_count()} CPU cores, {len(reference)} history rows")
+    if os.cpu_count() < max(arguments.workers):
+        print(f"[INFO] Fewer CPU cores than workers: the timings of more than {os.cpu_count()} workers "
+              f"show the overhead, not the speedup.")
+
+    print(f"{'workers':>8} {'seconds':>8} {'speedup':>8} {'same':>6}")
+    print(f"{'Clock':>8} {baseline:>8.2f} {1:>8.2f} {'-':>6}")
+    for workers in arguments.workers:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            partitioned = Partitioned_Clock(network_files, dedicated_lane_length=500, lane_changing_zone_length=500,
+                                            workers=workers)
+            partitioned.generate_vehicles(arguments.demand)
+            partitioned.run(until=arguments.until)
+        seconds = time.perf_counter() - start
+        frame = partitioned.to_frame()
+        same = frame.equals(reference.astype(frame.dtypes.to_dict()))
+        partitioned.close()
+        print(f"{workers:>8} {seconds:>8.2f} {baseline / seconds:>8.2f} {str(same):>6}")
@@ -0,0 +1,61 @@
+"""Routing cost against run length.
+
+Runs the SiouxFalls simulation in segments. After each segment it times
+`Vehicle._shortest_path` for a fixed set of OD pairs twice:
+- "history": link counts aggregated from the full history table (the old way)
+- "live": link counts read from `Graph_Generator.occupancy` (the current way)
+
+The live cost should stay flat while the history cost grows with the log.
+"""
+import contextlib
+import io
+import time
+from pathlib import Path
+
+import networkx as nx
+from Engine import Clock
+
+data_directory = Path(__file__).resolve().parents[2] / "data"
+network_files = [data_directory / "Network.csv", data_directory / "SiouxFalls_node_xy.tntp"]
+segments = [250, 500, 1000, 2000]
+od_pairs = [("1", "20"), ("13", "7"), ("24", "2"), ("6", "19"), ("10", "21")]
+repeat = 20
+
+
+def history_routing(world: Clock, from_: str, to_: str) -> list:
+    """Route with link counts aggregated from the history table."""
+    stats = world.stats.to_frame()
+    active_stats = stats[stats["active"] == True]
+    link_counts = active_stats.groupby(["origin", "destination"]).size().to_dict()
+
+    def travel_time(u, v, data):
+        x, expr = world.graph.expression(u, v)
+        return float(expr.subs(x, link_counts.get((u, v), 0)))
+
+    path = nx.shortest_path(world.graph.graph, source=from_, target=to_, weight=travel_time)
+    return [path[0], path[1]]
+
+
+def time_per_call(function) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for from_, to_ in od_pairs:
+            function(from_, to_)
+    return (time.perf_counter() - start) / (repeat * len(od_pairs)) * 1e3
+
+
+if __name__ == "__main__":
+    with contextlib.redirect_stdout(io.StringIO()):
+        world = Clock(network_files=network_files, dedicated_lane_length=500,
+                      lane_changing_zone_length=500, output_directory=".")
+        world.generate_vehicles(data_directory / "demand.csv")
+        world.env.process(world._run_gen())
+
+    print(f"{'time':>6} {'history rows':>13} {'active':>7} {'history ms/call':>16} {'live ms/call':>13}")
+    for until in segments:
+        with contextlib.redirect_stdout(io.StringIO()):
+            world.env.run(until=until)
+        vehicle = next(iter(world.vehicles.values()))
+        history = time_per_call(lambda o, d: history_routing(world, o, d))
+        live = time_per_call(vehicle._shortest_path)
+        print(f"{until:>6} {len(world.stats):>13} {int(world.graph.occupancy.sum()):>7} {history:>16.3f} {live:>13.3f}")
@@ -0,0 +1,53 @@
+"""Light updates: `Intersection.update_lights` per node against one `Signal_Controller` pass.
+
+The lanes are filled with the vehicles of a tick-mode run, then both ways of
+updating all lights are timed and checked to give the same lights. The other
+policies are timed on the same state.
+"""
+import argparse
+import contextlib
+import io
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+import Signals
+from Engine import Clock
+
+data_directory = Path(__file__).resolve().parents[2] / "data"
+network_files = [data_directory / "Network.csv", data_directory / "SiouxFalls_node_xy.tntp"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--until", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    arguments = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        world = Clock(network_files=network_files, output_directory=".", dedicated_lane_length=500,
+                      lane_changing_zone_length=500)
+        world.generate_vehicles(data_directory / "demand.csv")
+        world.run(until=arguments.until, save=False)
+    graph = world.graph
+    intersections = [graph.graph.nodes[node]["intersection"] for node in graph.graph.nodes]
+
+    def loop() -> None:
+        for intersection in intersections:
+            intersection.update_lights()
+
+    loop()
+    expected = graph.lights.copy()
+    graph.lights[:] = 0
+    world.signals.update(arguments.until)
+    print(f"[INFO] {int(graph.occupancy.sum())} vehicles on {len(graph.edge_index)} links, "
+          f"same lights: {np.array_equal(graph.lights, expected)}")
+
+    print(f"{'update':>24} {'us':>8}")
+    seconds = min(timeit.repeat(loop, number=arguments.repeat, repeat=5)) / arguments.repeat
+    print(f"{'update_lights per node':>24} {seconds * 1e6:>8.1f}")
+    for policy in [Signals.Queue_Policy(), Signals.Max_Pressure_Policy(), Signals.Fixed_Time_Policy()]:
+        controller = Signals.Signal_Controller(graph, policy=policy)
+        seconds = min(timeit.repeat(lambda: controller.update(arguments.until), number=arguments.repeat,
+                                    repeat=5)) / arguments.repeat
+        print(f"{type(policy).__name__:>24} {seconds * 1e6:>8.1f}")
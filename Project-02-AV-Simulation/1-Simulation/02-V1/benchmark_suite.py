@@ -0,0 +1,233 @@
+"""Benchmark suite of the tick-mode simulators, with JSON results for comparing commits.
+
+Runs every (simulator, scenario) pair in its own subprocess, so each run gets
+a fresh interpreter (startup time and peak RSS are its own) and the simulators
+can use their own modules of the same names:
+- "02-V1": `Clock` of Project-02-AV-Simulation/1-Simulation/02-V1 (tick mode)
+- "02-V1-event": the same `Clock` in the event mode
+- "02-V1-meso": the same `Clock` in the mesoscopic mode (point queues, see `Mesoscopic`)
+- "03-V0": `Clock` of Project-03-Discrete-Simulation/V0
+
+Scenarios go from the 8-link toy network of Project-03 to SiouxFalls with
+1k, 10k and 100k synthetic trips (seeded, one departure per time step), plus
+the bundled SiouxFalls demand file of `main.py`. The V0 clock only spawns a
+trip whose departure is the current time step and holds one trip per step,
+so on the bundled demand (shared departures) it stops spawning early; the
+"spawned" field shows how many vehicles a run actually had.
+
+Measured per run: startup time (imports, network and demand loading), run
+time, time steps per second, vehicle moves (history rows) per second,
+spawned and completed vehicles and peak RSS. The fastest of `--repeat` runs
+is kept.
+
+Example:
+    python benchmark_suite.py --scenarios toy sf-1k sf-10k
+    python benchmark_suite.py --compare benchmark_results/8994dbf.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+here = Path(__file__).resolve().parent
+repository = here.parents[2]
+project_02_data = repository / "Project-02-AV-Simulation" / "data"
+project_03_data = repository / "Project-03-Discrete-Simulation" / "data"
+
+SIMULATORS = {
+    "02-V1": {"directory": here, "options": {"mode": "tick"}},
+    "02-V1-event": {"directory": here, "options": {"mode": "event"}},
+    "02-V1-meso": {"directory": here, "options": {"mode": "meso"}},
+    "03-V0": {"directory": repository / "Project-03-Discrete-Simulation" / "V0", "options": {}},
+}
+SIOUXFALLS = [project_02_data / "Network.csv", project_02_data / "SiouxFalls_node_xy.tntp"]
+SCENARIOS = {
+    "toy": {"network": [project_03_data / "Network.csv", project_03_data / "SiouxFalls_node_xy.tntp"],
+            "demand": project_03_data / "demand.csv", "until": 600},
+    "sf-demand": {"network": SIOUXFALLS, "demand": project_02_data / "demand.csv", "until": 10000},
+    "sf-1k": {"network": SIOUXFALLS, "trips": 1_000, "until": 2_000},
+    "sf-10k": {"network": SIOUXFALLS, "trips": 10_000, "until": 11_000},
+    "sf-100k": {"network": SIOUXFALLS, "trips": 100_000, "until": 101_000},
+}
+METRICS = ["startup_s", "run_s", "steps_per_s", "moves_per_s", "peak_rss_mb"]
+
+
+def synthetic_demand(network_file: Path, trips: int, seed: int = 0) -> pd.DataFrame:
+    """Random trips between distinct nodes, one departure per time step.
+
+    Half of the vehicles are AVs (type 2). HDVs (type 1) start in the regular
+    lanes 1-3, AVs in any of the lanes 1-5.
+
+    Args:
+        network_file (Path): Network CSV file (from, to, length)
+        trips (int): Number of trips
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: Demand with the columns ID, departure, Origin, Destination, type, lane
+    """
+    rng = np.random.default_rng(seed)
+    network = pd.read_csv(network_file)
+    nodes = np.unique(network[["from", "to"]].to_numpy())
+    origin = rng.integers(0, len(nodes), trips)
+    # Shift the destination by 1 to n-1 positions, so it never equals the origin
+    destination = (origin + rng.integers(1, len(nodes), trips)) % len(nodes)
+    av = rng.random(trips) < 0.5
+    return pd.DataFrame({"ID": np.arange(trips),
+                         "departure": np.arange(trips),
+                         "Origin": nodes[origin],
+                         "Destination": nodes[destination],
+                         "type": np.where(av, 2, 1),
+                         "lane": np.where(av, rng.integers(1, 6, trips), rng.integers(1, 4, trips))})
+
+
+def demand_file(name: str, directory: Path) -> Path:
+    """Demand CSV of a scenario, written to `directory` if it has to be generated.
+
+    The toy demand has no type column and 0-based lanes, so it gets HDVs and 1-based lanes.
+    """
+    scenario = SCENARIOS[name]
+    if "trips" in scenario:
+        demand = synthetic_demand(scenario["network"][0], scenario["trips"])
+    else:
+        demand = pd.read_csv(scenario["demand"])
+        if "type" in demand.columns:
+            return scenario["demand"]
+        demand["type"] = 1
+        demand["lane"] = demand["lane"] + 1
+    path = directory / f"{name}.csv"
+    demand.to_csv(path, index=False)
+    return path
+
+
+def worker(task: dict) -> dict:
+    """Run one simulation in this process and measure it (see `run_task`)."""
+    start = time.perf_counter()
+    sys.path.insert(0, task["directory"])
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        from Engine import Clock
+        world = Clock(network_files=task["network"], output_directory=task["output"], dedicated_lane_length=500,
+                      lane_changing_zone_length=500, **task["options"])
+        world.generate_vehicles(task["demand"])
+        started = time.perf_counter()
+        if hasattr(world, "_start_processes"):
+            world._start_processes()
+        else:
+            world.env.process(world._run_gen())
+        world.env.run(until=task["until"])
+        finished = time.perf_counter()
+    stats = world.stats
+    spawned = len(stats.ids)
+    run_s = finished - started
+    return {"startup_s": started - start,
+            "run_s": run_s,
+            "steps_per_s": task["until"] / run_s,
+            "moves": len(stats),
+            "moves_per_s": len(stats) / run_s,
+            "spawned": spawned,
+            "completed": int(spawned - stats.active[:spawned].sum()),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def run_task(task: dict, timeout: float) -> dict:
+    """Run `worker` in a fresh interpreter.
+
+    Returns:
+        dict: The measurements, or {"status": "timeout" / "error", ...}
+    """
+    try:
+        process = subprocess.run([sys.executable, __file__, "--worker", json.dumps(task)], cwd=task["directory"],
+                                 capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"status": "timeout"}
+    if process.returncode != 0:
+        return {"status": "error", "error": process.stderr.strip().splitlines()[-1:]}
+    return {"status": "ok", **json.loads(process.stdout.strip().splitlines()[-1])}
+
+
+def git_commit() -> dict:
+    """Short hash of the checked-out commit and whether the tree has changes."""
+    def git(*arguments):
+        return subprocess.run(["git", *arguments], cwd=repository, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain"))}
+
+
+def compare(base: dict, results: dict, tolerance: float) -> bool:
+    """Print new / base ratios of the metrics and return True if a run got slower than `tolerance`."""
+    old = {(row["simulator"], row["scenario"]): row for row in base["results"] if row["status"] == "ok"}
+    print(f"\n[INFO] Compared with {base['commit']} (ratio new / base, lower times and RSS are better)")
+    print(f"{'simulator':>12} {'scenario':>10} " + " ".join(f"{metric:>12}" for metric in METRICS))
+    regression = False
+    for row in results["results"]:
+        previous = old.get((row["simulator"], row["scenario"]))
+        if previous is None or row["status"] != "ok":
+            continue
+        ratios = [row[metric] / previous[metric] if previous[metric] else float("nan") for metric in METRICS]
+        slower = row["steps_per_s"] < (1 - tolerance) * previous["steps_per_s"]
+        regression |= slower
+        print(f"{row['simulator']:>12} {row['scenario']:>10} " + " ".join(f"{ratio:>12.2f}" for ratio in ratios)
+              + ("  SLOWER" if slower else ""))
+    return regression
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--simulators", nargs="+", default=list(SIMULATORS), choices=list(SIMULATORS))
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per pair, the fastest is kept")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds before a run is stopped")
+    parser.add_argument("--output", default=None, help="Results file. Defaults to benchmark_results/<commit>.json")
+    parser.add_argument("--compare", default=None, help="Results file of an earlier commit to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Slowdown of steps/s reported as a regression")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.worker is not None:
+        print(json.dumps(worker(json.loads(arguments.worker))))
+        sys.exit(0)
+
+    results = {**git_commit(), "python": platform.python_version(), "machine": platform.platform(),
+               "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": []}
+    print(f"{'simulator':>12} {'scenario':>10} {'status':>8} {'startup s':>10} {'run s':>9} {'steps/s':>10} "
+          f"{'moves/s':>10} {'spawned':>8} {'RSS MiB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        demands = {name: demand_file(name, directory) for name in arguments.scenarios}
+        for name in arguments.scenarios:
+            for simulator in arguments.simulators:
+                scenario = SCENARIOS[name]
+                task = {"directory": str(SIMULATORS[simulator]["directory"]),
+                        "options": SIMULATORS[simulator]["options"],
+                        "network": [str(file) for file in scenario["network"]],
+                        "demand": str(demands[name]), "until": scenario["until"], "output": str(directory)}
+                runs = [run_task(task, arguments.timeout) for _ in range(arguments.repeat)]
+                finished = [run for run in runs if run["status"] == "ok"]
+                best = min(finished, key=lambda run: run["run_s"]) if finished else runs[0]
+                row = {"simulator": simulator, "scenario": name, "until": scenario["until"], **best}
+                results["results"].append(row)
+                if row["status"] == "ok":
+                    print(f"{simulator:>12} {name:>10} {'ok':>8} {row['startup_s']:>10.2f} {row['run_s']:>9.2f} "
+                          f"{row['steps_per_s']:>10.0f} {row['moves_per_s']:>10.0f} {row['spawned']:>8} "
+                          f"{row['peak_rss_mb']:>8.0f}")
+                else:
+                    print(f"{simulator:>12} {name:>10} {row['status']:>8} {row.get('error', '')}")
+
+    output = Path(arguments.output) if arguments.output else here / "benchmark_results" / f"{results['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"[INFO] Results saved to {output}")
+    if arguments.compare is not None:
+        with open(arguments.compare) as file:
+            if compare(json.load(file), results, arguments.tolerance):
+                sys.exit(1)
@@ -0,0 +1,68 @@
+"""Vehicle order per tick: the kept, merged order of `State_Store.sorted_active_slots` against a full sort.
+
+A store is filled with `--vehicles` active vehicles. Every tick takes the
+order and records every vehicle once in that order (as the tick loop does):
+a share of them gets stuck (key + 5), a share moves to a new link (key = now),
+a share leaves, and new vehicles arrive. Both ways give the same order; only
+the time to get it is compared.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import StateStore
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--stuck", type=float, default=0.1)
+    parser.add_argument("--new-link", type=float, default=0.02)
+    arguments = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'vehicles':>9} {'full sort ms':>13} {'kept order ms':>14} {'speedup':>8}")
+    for vehicles in arguments.vehicles:
+        store = StateStore.State_Store(nodes=["1", "2"], capacity=vehicles * 2)
+        rows = np.zeros(vehicles, dtype=store.ROW)
+        rows["destination"] = 1
+        rows["slot"] = [store.add(vehicle_id=str(i), type_="AV") for i in range(vehicles)]
+        rows["arrival_time"] = rng.integers(0, 1000, vehicles) // 5 * 5
+        store.reserve(vehicles * 2)
+        store.set_current(rows, store.append(rows) + np.arange(vehicles))
+        store.departure_time[:vehicles] = 0
+
+        full = kept = 0.0
+        for tick in range(1, arguments.ticks + 1):
+            now = 1000 + 5 * tick
+            start = time.perf_counter()
+            slots = store.active_slots()
+            expected = slots[np.argsort(store.arrival_time[slots] + store.stuck_time[slots], kind="stable")]
+            full += time.perf_counter() - start
+            start = time.perf_counter()
+            order = store.sorted_active_slots()
+            kept += time.perf_counter() - start
+            assert np.array_equal(order, expected)
+
+            # Every vehicle records once in this order
+            draw = rng.random(len(order))
+            leaving = draw < 0.01
+            for slot in order[leaving]:
+                store.deactivate(slot)
+            order = order[~leaving]
+            draw = draw[~leaving]
+            rows = np.zeros(len(order), dtype=store.ROW)
+            rows["slot"] = order
+            rows["destination"] = 1
+            rows["arrival_time"] = np.where(draw < arguments.new_link, now, store.arrival_time[order])
+            rows["stuck_time"] = np.where(draw < arguments.new_link, 0,
+                                          store.stuck_time[order] + 5 * (draw > 1 - arguments.stuck))
+            store.set_current(rows, store.append(rows) + np.arange(len(rows)))
+            # As many new vehicles as left
+            for i in range(int(leaving.sum())):
+                slot = store.add(vehicle_id=f"{tick}-{i}", type_="HDV")
+                store.record(slot, time=now, origin="1", destination="2", lane=0, block=0,
+                             arrival_time=now, stuck_time=0, light="none")
+        full, kept = full / arguments.ticks * 1e3, kept / arguments.ticks * 1e3
+        print(f"{vehicles:>9} {full:>13.2f} {kept:>14.2f} {full / kept:>8.2f}")
@@ -8,4 +8,4 @@ network_files = [network_file, pos_file]
 world = Clock(network_files=network_files, dedicated_lane_length=500, lane_changing_zone_length=500, output_directory=output_directory)
 # world.draw_network()
 world.generate_vehicles(demand_path)
-world.run(until=10000)
\ No newline at end of file
+world.run(until=10000, checkpoint_every=1000)
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""Link volumes against the published SiouxFalls equilibrium flows.
+
+Solves the static user equilibrium of the network and compares its link flows
+with `SiouxFalls_flow.tntp`. With --simulate, also runs `Clock` and compares the
+simulated link volumes (vehicles that entered each link) with the equilibrium
+flows of the same demand.
+
+The published flows belong to the original SiouxFalls `_net.tntp` and
+`_trips.tntp`. Pass those with --net and --trips for a like-for-like check;
+with the default Network.csv and demand.csv the numbers only show the scale
+of the difference.
+"""
+import argparse
+import contextlib
+import io
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import DataLoader
+import TNTP
+from Assignment import Traffic_Assignment, compare_flows, od_from_demand
+from Engine import Clock
+
+data_directory = Path(__file__).resolve().parents[2] / "data"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--net", default=data_directory / "Network.csv")
+    parser.add_argument("--nodes", default=data_directory / "SiouxFalls_node_xy.tntp")
+    parser.add_argument("--trips", default=None, help="_trips.tntp OD table (default: demand.csv)")
+    parser.add_argument("--flow", default=data_directory / "SiouxFalls_flow.tntp")
+    parser.add_argument("--simulate", type=int, default=0, help="also simulate this many time steps")
+    arguments = parser.parse_args()
+
+    network_files = [arguments.net, arguments.nodes]
+    with contextlib.redirect_stdout(io.StringIO()):
+        graph = DataLoader.Graph_Generator(network_files=network_files, dedicated_lane_length=500,
+                                           lane_changing_zone_length=500, each_block_length=100)
+    if arguments.trips is not None:
+        trips = TNTP.read_trips(arguments.trips)
+    else:
+        trips = od_from_demand(pd.read_csv(data_directory / "demand.csv"))
+
+    start = time.perf_counter()
+    assignment = Traffic_Assignment(graph)
+    assignment.solve(trips)
+    print(f"[INFO] Assignment took {time.perf_counter() - start:.2f} s")
+    _, summary = compare_flows(assignment.link_frame(), TNTP.read_flow(arguments.flow))
+    print(f"[INFO] Equilibrium against {Path(arguments.flow).name}: {summary}")
+
+    if arguments.simulate:
+        world = Clock(network_files=network_files, dedicated_lane_length=500, lane_changing_zone_length=500,
+                      output_directory=".", mode="event")
+        world.generate_vehicles(data_directory / "demand.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            world.run(until=arguments.simulate, save=False)
+        _, summary = compare_flows(world.graph.link_volumes(), assignment.link_frame())
+        print(f"[INFO] Simulated volumes against the equilibrium: {summary}")
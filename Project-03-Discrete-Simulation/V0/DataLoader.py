@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
@@ -9,7 +10,8 @@ class Graph_Generator:
     def __init__(self, network_files: list, 
                  dedicated_lane_length: int, 
                  lane_changing_zone_length: int,
-                 each_block_length: int):
+                 each_block_length: int,
+                 travel_time_functions: dict = None):
         """Initialize the traffic network graph.
         
         Args:
@@ -19,15 +21,41 @@ class Graph_Generator:
             dedicated_lane_length (int): Length of AV-only lanes in meters
             lane_changing_zone_length (int): Length of lane changing zones in meters
             each_block_length (int): Length of each road block in meters
+            travel_time_functions (dict, optional): Custom travel time functions. Maps (from, to)
+                node ids to a Sympy expression in the symbol "x" (number of vehicles). Links not
+                listed use the BPR function. Defaults to None.
         """
         self.network_data = pd.read_csv(network_files[0])
         self.pos = pd.read_csv(network_files[1], sep=r"\s+",)
         self.graph = nx.DiGraph()
+        self.edge_index = {}
+        travel_time_functions = {(str(u), str(v)): expr for (u, v), expr in (travel_time_functions or {}).items()}
+        parameters = []
+        self._custom_costs = {}
         
         # Create graph edges with travel time functions
         for _, row in self.network_data.iterrows():
             x, expr = self._generate_travel_time(length=int(row["length"]))
-            self.graph.add_edge(str(row["from"]), str(row["to"]), length=row["length"], param=x, expr=expr)
+            edge = (str(row["from"]), str(row["to"]))
+            if edge not in self.edge_index:
+                self.edge_index[edge] = len(self.edge_index)
+                parameters.append(None)
+            index = self.edge_index[edge]
+            parameters[index] = self._bpr_parameters(length=int(row["length"]))
+            if edge in travel_time_functions:
+                expr = travel_time_functions[edge]
+                self._custom_costs[index] = sp.lambdify(x, expr, "numpy")
+            self.graph.add_edge(*edge, length=row["length"], param=x, expr=expr, index=index)
+
+        # Numeric BPR parameters, one entry per link (same order as the edge "index" attribute)
+        parameters = np.array(parameters, dtype=np.float64).reshape(-1, 4)
+        self.free_flow_time = parameters[:, 0].copy()
+        self.capacity = parameters[:, 1].copy()
+        self.alpha = parameters[:, 2].copy()
+        self.beta = parameters[:, 3].copy()
+
+        # Live number of vehicles on each link, indexed by the edge "index" attribute
+        self.occupancy = np.zeros(len(self.edge_index), dtype=np.int64)
 
         for node in self.graph.nodes:
             neighbors = list(self.graph.neighbors(node))
@@ -39,6 +67,62 @@ class Graph_Generator:
                                                                   lane_changing_zone_length=lane_changing_zone_length,
                                                                   each_block_length=each_block_length)
 
+    def enter_link(self, from_: str, to_: str) -> None:
+        """Count a vehicle that enters the link from_ -> to_.
+        
+        Args:
+            from_ (str): Link start node
+            to_ (str): Link end node
+        """
+        self.occupancy[self.edge_index[(from_, to_)]] += 1
+
+    def leave_link(self, from_: str, to_: str) -> None:
+        """Count a vehicle that leaves the link from_ -> to_.
+        
+        Args:
+            from_ (str): Link start node
+            to_ (str): Link end node
+        """
+        self.occupancy[self.edge_index[(from_, to_)]] -= 1
+
+    def link_counts(self) -> dict:
+        """Number of vehicles on each link.
+        
+        Returns:
+            dict: Maps (from, to) node ids to vehicle counts
+        """
+        return {edge: int(self.occupancy[i]) for edge, i in self.edge_index.items()}
+
+    def link_costs(self, occupancy: np.ndarray = None) -> np.ndarray:
+        """Evaluate the travel time of every link in one vectorized pass.
+        
+        Args:
+            occupancy (np.ndarray, optional): Number of vehicles per link. Defaults to the live occupancy.
+            
+        Returns:
+            np.ndarray: Travel time per link, indexed by the edge "index" attribute
+        """
+        occupancy = self.occupancy if occupancy is None else occupancy
+        costs = self.free_flow_time * (1 + self.alpha * (occupancy / self.capacity) ** self.beta)
+        for i, function in self._custom_costs.items():
+            costs[i] = function(occupancy[i])
+        return costs
+
+    def _bpr_parameters(self, length: int) -> tuple:
+        """Default BPR parameters of a road segment.
+        
+        Args:
+            length (int): Length of the road segment in meters
+            
+        Returns:
+            tuple: (free_flow_time, capacity, alpha, beta)
+        """
+        capacity = length / 5
+        speed = 60
+        alpha = 0.15
+        beta = 4
+        return length / speed, capacity, alpha, beta
+
     def _generate_travel_time(self, length: int) -> tuple[sp.Symbol, sp.Expr]:
         """Generate a BPR (Bureau of Public Roads) travel time function for a road segment.
         
@@ -66,11 +150,8 @@ class Graph_Generator:
             - β (beta): 4
         """
         x = sp.symbols("x")
-        capacity = length / 5
-        speed = 60
-        alpha = 0.15
-        beta = 4
-        expr = (length / speed) * (1 + alpha * (x / capacity)**beta)
+        free_flow_time, capacity, alpha, beta = self._bpr_parameters(length)
+        expr = free_flow_time * (1 + alpha * (x / capacity)**beta)
         return x, expr
 
     def draw(self) -> None:
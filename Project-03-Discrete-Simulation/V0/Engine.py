@@ -2,6 +2,8 @@ import simpy
 import Players
 import pandas as pd
 import DataLoader
+import StateStore
+import Routing
 from tqdm.auto import tqdm
 from pathlib import Path
 
@@ -17,7 +19,7 @@ class Clock:
     
     Attributes:
         env (simpy.Environment): The simulation environment
-        stats (pd.DataFrame): Statistics tracking frame with columns:
+        stats (StateStore.State_Store): Vehicle state store. Its history log has columns:
             - time: Current simulation time
             - vehicle_id: Unique identifier for each vehicle
             - origin: Starting intersection
@@ -44,7 +46,8 @@ class Clock:
     """
     
     def __init__(self, network_files: list, output_directory: str, dedicated_lane_length: int, 
-                 lane_changing_zone_length: int, each_block_length: int = 100):
+                 lane_changing_zone_length: int, each_block_length: int = 100,
+                 routing_tolerance: float = 0.0, routing_time_bucket: int = None):
         """Initialize the traffic simulation environment.
         
         Args:
@@ -52,18 +55,21 @@ class Clock:
             dedicated_lane_length (int): Length of dedicated AV lanes in meters
             lane_changing_zone_length (int): Length of lane changing zones in meters
             each_block_length (int, optional): Length of each road block. Defaults to 100 meters
+            routing_tolerance (float, optional): Relative link cost change before a cached
+                shortest-path tree is rebuilt. Defaults to 0.0 (rebuild on any change).
+            routing_time_bucket (int, optional): Freeze link costs for routing over buckets of this
+                many time steps, e.g. 5 to share one tree per destination per tick. Defaults to None.
         """
         self.output_directory = Path(output_directory)
         self.env = simpy.Environment()
-        self.stats = pd.DataFrame(columns=["time", "vehicle_id", "origin", 
-                                         "destination", "lane", "block", 
-                                         "arrival_time", "stuck_time", "active", "light", "type"])
         self.graph = DataLoader.Graph_Generator(
             network_files=network_files,
             dedicated_lane_length=dedicated_lane_length,
             lane_changing_zone_length=lane_changing_zone_length,
             each_block_length=each_block_length
         )
+        self.stats = StateStore.State_Store(nodes=self.graph.graph.nodes)
+        self.router = Routing.Router(self.graph, tolerance=routing_tolerance, time_bucket=routing_time_bucket)
         self.vehicles = {}
         self.demand = {}
         print(f"[INFO] Initializing finished. Graph had been generated.")
@@ -87,6 +93,7 @@ class Clock:
         """
         self.demand = pd.read_csv(file_path)
         self.demand.sort_values(by="departure", inplace=True)
+        self.stats.reserve(len(self.stats.ids) + len(self.demand))
         print(f"[INFO] Vehicles read in the data and generated correctly.")
 
     def _sort_vehicles(self) -> list:
@@ -101,13 +108,7 @@ class Clock:
         Note:
             This is a private method used internally by run_gen()
         """
-        active_vehicles = self.stats[self.stats["active"]]
-        sorted_active_vehicles = active_vehicles.sort_values(
-            by=["arrival_time"], 
-            key=lambda x: active_vehicles["arrival_time"] + active_vehicles["stuck_time"]
-        )
-        vehicles = sorted_active_vehicles["vehicle_id"].to_list()
-        return vehicles
+        return self.stats.sorted_active_ids()
 
     def _run_gen(self) -> simpy.events.Generator:
         """Generator function that implements the main simulation logic.
@@ -123,6 +124,7 @@ class Clock:
         """
         while True:
             time = self.env.now
+            self.router.advance(time)
             if not self.demand.empty:
                 queue = self.demand.iloc[0]
 
@@ -136,7 +138,8 @@ class Clock:
                         type_="HDV" if int(queue["type"])==1 else "AV",
                         graph=self.graph,
                         stats=self.stats, 
-                        track=0
+                        track=0,
+                        router=self.router
                     )
                     self.demand = self.demand.drop(self.demand.index[0]).reset_index(drop=True)
                     print(f"[INFO] We are adding a new car into the system at time {time}.")
@@ -196,6 +199,7 @@ class Clock:
             self.env.process(self._run_gen())
             self.env.run(until=until)
 
+        print(f"[INFO] Routing cache: {self.router.report()}")
         self.save_log()
 
     def save_log(self, file_path: str = "simulation_log.csv") -> None:
@@ -204,7 +208,7 @@ class Clock:
         Args:
             file_path (str, optional): Path to the output CSV file. Defaults to "simulation_log.csv".
         """
-        self.stats.to_csv(self.output_directory / file_path, index=False)
+        self.stats.to_frame().to_csv(self.output_directory / file_path, index=False)
         print(f"[INFO] Simulation log saved to {file_path}")
 
     def draw_network(self) -> None:
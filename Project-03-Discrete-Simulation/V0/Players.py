@@ -1,6 +1,8 @@
 import simpy
 import networkx as nx
-import pandas as pd
+import numpy as np
+from StateStore import State_Store
+from Routing import Router
 
 class Lane:
     """Represents a single lane in a road segment.
@@ -19,7 +21,7 @@ class Lane:
         blocks (int): Number of blocks in this lane
         dedicated_lane_length (int): Length of AV-only section in blocks
         lane_changing_zone_length (int): Length of lane changing section in blocks
-        path (dict): Maps block numbers to vehicle counts (0 = empty)
+        path (np.ndarray): Vehicle count per block (0 = empty)
     
     Example:
         >>> # Create a lane with 10 blocks and 3-block AV and changing zones
@@ -39,7 +41,8 @@ class Lane:
                  id: str,
                  blocks: int,
                  dedicated_lane_length: int,
-                 lane_changing_zone_length: int):
+                 lane_changing_zone_length: int,
+                 path: np.ndarray = None):
         """Initialize a new lane.
         
         Args:
@@ -47,6 +50,7 @@ class Lane:
             blocks (int): Total number of blocks in the lane
             dedicated_lane_length (int): Length of AV-only section in blocks
             lane_changing_zone_length (int): Length of lane changing section in blocks
+            path (np.ndarray, optional): Integer array (view) to hold the block counts. Defaults to a new array.
         """
         self.id = id
         self.blue = True if int(id) > 2 else False
@@ -54,9 +58,7 @@ class Lane:
         self.blocks = int(blocks)
         self.dedicated_lane_length = dedicated_lane_length
         self.lane_changing_zone_length = lane_changing_zone_length
-        self.path = {}
-        for i in range(self.blocks):
-            self.path[i] = 0  # Initialize all blocks as empty
+        self.path = np.zeros(self.blocks, dtype=np.int32) if path is None else path  # All blocks start empty
 
     def is_available(self, block: int) -> bool:
         """Check if a block has capacity for another vehicle.
@@ -99,6 +101,7 @@ class Intersection:
         node_id (str): Unique identifier for this intersection
         lanes (dict): Maps neighbor IDs to lists of Lane objects
         lights (dict): Maps neighbor IDs to lists of light states ("red"/"green")
+        occupancy (dict): Maps neighbor IDs to (lane x block) vehicle count arrays
     
     Example:
         >>> # Create an intersection with two approaching roads
@@ -115,6 +118,9 @@ class Intersection:
         >>> lights_to_node_2 = intersection.lights["2"]
     """
     
+    BLUE_LANES = slice(3, 5)  # AV lanes (3,4)
+    GREEN_LANES = slice(0, 3)  # regular lanes (0,1,2)
+
     def __init__(self,
                  node_id: str,
                  neighbors: list,
@@ -135,27 +141,33 @@ class Intersection:
         self.node_id = node_id
         self.lanes = {}
         self.lights = {}
+        self.occupancy = {}
         
         # Create lanes and lights for each approaching road segment
         for i in range(len(neighbors)):
             self.lanes[str(neighbors[i])] = []
             self.lights[str(neighbors[i])] = []
+            # One (lane x block) count array per approach, each lane keeps a row view of it
+            self.occupancy[str(neighbors[i])] = np.zeros((5, int(int(lengths[i])/each_block_length)), dtype=np.int32)
             for j in range(5):
                 # Create lane with appropriate length in blocks
                 self.lanes[str(neighbors[i])].append(Lane(
                     id=j, 
                     blocks=int(lengths[i])/each_block_length, 
                     dedicated_lane_length=int(dedicated_lane_length)/each_block_length,
-                    lane_changing_zone_length=int(lane_changing_zone_length/each_block_length)
+                    lane_changing_zone_length=int(lane_changing_zone_length/each_block_length),
+                    path=self.occupancy[str(neighbors[i])][j]
                 ))
                 self.lights[str(neighbors[i])].append("red")  # All lights start red
 
     def update_lights(self, stats):
         """Update traffic light states based on comparing blue lanes (3,4) vs green lanes (0,1,2).
         
+        Queue lengths are read from the lane occupancy arrays of each approach.
+        
         Args:
-            stats (pd.DataFrame): DataFrame containing vehicle statistics with columns:
-                - time, vehicle_id, origin, destination, lane, block, arrival_time, stuck_time, active
+            stats (State_Store): Vehicle state store, only used to skip the update before
+                anything has been recorded
         
         Logic:
         1. Compare total vehicles in blue lanes (3,4) vs green lanes (0,1,2) across all directions
@@ -169,13 +181,6 @@ class Intersection:
             print("[INFO] No active vehicles to update lights.")
             return
             
-        # Get active vehicles only
-        active_vehicles = stats[stats['active'] == True]
-        active_vehicles = active_vehicles.copy()
-        active_vehicles['origin'] = active_vehicles['origin'].astype(str)
-        active_vehicles['destination'] = active_vehicles['destination'].astype(str)
-        active_vehicles['lane'] = active_vehicles['lane'].astype(str)
-        
         # Initialize counters for blue vs green lanes
         total_blue_lanes = 0  # lanes 3,4
         total_green_lanes = 0  # lanes 0,1,2
@@ -190,22 +195,10 @@ class Intersection:
             node_id = str(self.node_id)
             # print(f"[DEBUG] Checking neighbor {neighbor}...")
             # Count blue lanes (3,4)
-            blue_vehicles = active_vehicles[
-                (active_vehicles['destination'] == neighbor) & 
-                (active_vehicles['origin'] == node_id) &
-                (active_vehicles['lane'].isin(['3', '4']))
-            ]
-            total_blue_lanes += self.find_in_queue_vehicles_from_lane(blue_vehicles, [node_id, neighbor])
-            # print(f"[DEBUG] Blue vehicles: {len(blue_vehicles)}")
+            total_blue_lanes += self.queue_length(neighbor, self.BLUE_LANES)
 
             # Count green lanes (0,1,2)
-            green_vehicles = active_vehicles[
-                (active_vehicles['destination'] == neighbor) & 
-                (active_vehicles['origin'] == node_id) &
-                (active_vehicles['lane'].isin(['0', '1', '2']))
-            ]
-            # print(f"[DEBUG] Green vehicles: {len(green_vehicles)}")
-            green_v = self.find_in_queue_vehicles_from_lane(green_vehicles, [node_id, neighbor])
+            green_v = self.queue_length(neighbor, self.GREEN_LANES)
             total_green_lanes += green_v
             direction_green_counts[neighbor] = green_v
 
@@ -232,15 +225,21 @@ class Intersection:
 
         # print(f"[INFO] Traffic lights at node {self.node_id} updated: {self.lights}.")
 
-    def find_in_queue_vehicles_from_lane(self, vehicles: pd.DataFrame, od: list):
-        vehicles = vehicles.sort_values(by=["block"], inplace=False)
-        blocks = vehicles["block"].values
-        count = 0
-        current = self.lanes[str(od[1])][0].blocks - 1
-        while current in blocks:
-            count += 1
-            current -= 1
-        return count
+    def queue_length(self, neighbor: str, lanes: slice) -> int:
+        """Count the blocks, from the stop line backwards, that are occupied without a gap.
+
+        A block counts as occupied if any of the given lanes has a vehicle in it.
+        Computed straight from the approach's occupancy array.
+
+        Args:
+            neighbor (str): Neighbor ID of the approach
+            lanes (slice): Lanes to include, e.g. `Intersection.BLUE_LANES`
+
+        Returns:
+            int: Queue length in blocks
+        """
+        occupied = (self.occupancy[str(neighbor)][lanes] > 0).any(axis=0)[::-1]
+        return len(occupied) if occupied.all() else int(occupied.argmin())
 
 class Vehicle:
     """Represents a vehicle in the traffic simulation.
@@ -264,7 +263,7 @@ class Vehicle:
         id (str): Unique vehicle identifier
         AV (bool): True if autonomous vehicle
         HDV (bool): True if human-driven vehicle
-        stats (pd.DataFrame): Simulation statistics
+        stats (State_Store): Vehicle state store of the simulation
         track (int): Debug tracking level (0 = no tracking)
         current_path (list): [current_node, next_node]
         current_intersection (Intersection): Current intersection
@@ -294,9 +293,10 @@ class Vehicle:
                  initial_path: str,
                  initial_lane: str,
                  type_: str,
-                 stats: dict,
+                 stats: State_Store,
                  graph: nx.DiGraph,
-                 track: int = 0):
+                 track: int = 0,
+                 router: Router = None):
         """Initialize a vehicle.
         
         Args:
@@ -305,25 +305,30 @@ class Vehicle:
             initial_path (list): [start_node, end_node]
             initial_lane (str): Initial lane number (0-4)
             type_ (str): Vehicle type ("HDV" or "AV")
-            stats (pd.DataFrame): Simulation statistics
+            stats (State_Store): Vehicle state store of the simulation
             graph (nx.DiGraph): Road network graph
             track (int, optional): Debug tracking level. Defaults to 0.
+            router (Router, optional): Shared routing service. Defaults to None (own Dijkstra search per query).
         """
         self.env = env
         self.id: str = id
         self.AV: bool = True if type_.upper() == "AV" else False
         self.HDV: bool = True if type_.upper() == "HDV" else False
-        self.stats: pd.DataFrame = stats
+        self.stats: State_Store = stats
+        self.slot: int = self.stats.add(vehicle_id=self.id, type_=type_)
         self.track = track
         self.initial_path = initial_path
         self.graph = graph
+        self.router = router
         self.current_path: list = self._shortest_path(str(self.initial_path[0]), str(self.initial_path[1])) # [start node, end node]
+        self.graph.enter_link(*self.current_path)
         self.current_intersection: Intersection = self.graph.graph.nodes[str(self.current_path[0])]["intersection"]
         self.current_lane: Lane = self.current_intersection.lanes[self.current_path[1]][int(initial_lane)]
         self.arrival_time = self.env.now
         self.stucked_time = 0
         self.current_pos: int = 0
         self.max_pos: int = self.current_lane.blocks - 1
+        self.current_lane.arrive(block=0)
         self._update_stats()
         if self.track:
             print(f"[TRACK{self.track}] Initializing...")
@@ -333,7 +338,12 @@ class Vehicle:
         """Calculate the shortest path considering current traffic conditions.
         
         Uses a modified Dijkstra algorithm where edge weights are travel times
-        calculated using the BPR formula with current traffic counts.
+        calculated using the BPR formula with current traffic counts. The counts
+        are read from the live link occupancy of the graph, not from the history,
+        and all link costs are evaluated in one vectorized pass before the search.
+        
+        If the vehicle has a router, the query is answered from the router's
+        cached shortest-path trees instead.
         
         Args:
             from_ (str): Starting node ID
@@ -345,15 +355,14 @@ class Vehicle:
         Note:
             This is a private method used internally for navigation.
         """
-        # Get current traffic counts
-        active_stats = self.stats[self.stats["active"] == True]
-        link_counts = active_stats.groupby(["origin", "destination"]).size().to_dict()
-        
+        if self.router is not None:
+            return self.router.next_hop(from_, to_)
+
         # Calculate travel time based on current traffic
+        costs = self.graph.link_costs()
+        
         def travel_time(u, v, data):
-            n_cars = link_counts.get((u, v), 0)
-            x = data["param"]
-            return float(data["expr"].subs(x, n_cars))
+            return costs[data["index"]]
         
         # Find shortest path using current travel times
         path = nx.shortest_path(self.graph.graph, source=from_, target=to_, weight=travel_time)
@@ -361,33 +370,29 @@ class Vehicle:
             return [path[0], path[1]]  # Return next step in path
         
     def _update_stats(self) -> None:
-        """Update vehicle statistics in the simulation DataFrame.
+        """Update vehicle statistics in the simulation state store.
         
         Updates:
-        - Marks previous position as inactive
-        - Adds new row with current position and status
+        - Overwrites the current state of this vehicle's slot
+        - Appends a row with current position and status to the history log
         
         Note:
             This is a private method called after any vehicle movement.
         """
-        # Mark previous position as inactive
-        self.stats.loc[self.stats["vehicle_id"] == self.id, "active"] = False
         light = self.current_intersection.lights[self.current_path[1]][self.current_lane.id]
         light = "none" if self.current_pos != self.max_pos else light
-        # Add new row with current state
-        self.stats.loc[len(self.stats)] = [
-            self.env.now,         # Current time
-            self.id,              # Vehicle ID
-            self.current_path[0], # Current node
-            self.current_path[1], # Next node
-            self.current_lane.id, # Current lane
-            self.current_pos,     # Block position
-            self.arrival_time,    # Arrival time
-            self.stucked_time,    # Stuck time
-            True,                  # Active flag
-            light,                 # Light status
-            "AV" if self.AV else "HDV",  # Vehicle type
-        ]
+        # Record current state
+        self.stats.record(
+            self.slot,
+            time=self.env.now,
+            origin=self.current_path[0],
+            destination=self.current_path[1],
+            lane=self.current_lane.id,
+            block=self.current_pos,
+            arrival_time=self.arrival_time,
+            stuck_time=self.stucked_time,
+            light=light,
+        )
 
     def update_path(self, new_path: list, intersection: Intersection, lane_num: int) -> None:
         """Update vehicle's path when entering a new road segment.
@@ -745,10 +750,13 @@ class Vehicle:
         self.current_lane.leave(block=self.current_pos)
         
         # Calculate next path segment
+        previous_path = self.current_path
         self.current_path = self._shortest_path(
             str(self.current_path[1]),  # Current intersection becomes start
             str(self.initial_path[1])   # Final destination remains the same
         )
+        self.graph.leave_link(*previous_path)
+        self.graph.enter_link(*self.current_path)
         
         # Update intersection and lane
         self.current_intersection = self.graph.graph.nodes[str(self.current_path[0])]["intersection"]
@@ -789,7 +797,8 @@ class Vehicle:
         self.current_lane.leave(block=self.current_pos)
         
         # Mark vehicle as inactive
-        self.stats.loc[self.stats["vehicle_id"] == self.id, "active"] = False
+        self.stats.deactivate(self.slot)
+        self.graph.leave_link(*self.current_path)
         if self.track:
             print(f"[TRACK{self.track}] Exiting the system...")
             print(f"[TRACK{self.track}] [ID={self.id}] [path={self.current_path[0]} to {self.current_path[1]}] [lane={self.current_lane.id}] [block={self.current_pos}] [arrive_time={self.arrival_time}] [stuck_time={self.stucked_time}]")
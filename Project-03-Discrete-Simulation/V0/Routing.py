@@ -0,0 +1,136 @@
+import networkx as nx
+import numpy as np
+
+
+class Router:
+    """Shared routing service with cached shortest-path trees per destination.
+
+    Instead of a fresh Dijkstra search for every vehicle, the router keeps one
+    shortest-path tree per destination (the next node towards it from every
+    other node). A tree is reused as long as the link costs it was built with
+    are within `tolerance` of the current costs. Otherwise it is rebuilt.
+
+    With `time_bucket` set, link costs are frozen at the start of every bucket
+    of that many time steps. All vehicles routed in the same bucket then share
+    one tree per destination.
+
+    Attributes:
+        graph (Graph_Generator): Network with the link cost arrays
+        tolerance (float): Largest relative change of any link cost that still reuses a tree
+        time_bucket (int): Length of the cost snapshot period (None = live costs)
+        trees (dict): Maps destination to (link costs, next node per node)
+        hits (int): Queries answered from a cached tree
+        misses (int): Queries that built a tree
+
+    Example:
+        >>> router = Router(graph, tolerance=0.05, time_bucket=5)
+        >>> router.advance(time=0)
+        >>> router.next_hop("1", "20")
+        ['1', '3']
+        >>> router.report()
+        {'hits': 0, 'misses': 1, 'hit_rate': 0.0, 'trees': 1}
+    """
+
+    def __init__(self, graph, tolerance: float = 0.0, time_bucket: int = None):
+        """Initialize the router.
+
+        Args:
+            graph (Graph_Generator): Network with the link cost arrays
+            tolerance (float, optional): Relative cost change that invalidates a tree. Defaults to 0.0.
+            time_bucket (int, optional): Snapshot link costs every `time_bucket` steps. Defaults to None (live costs).
+        """
+        self.graph = graph
+        self.tolerance = tolerance
+        self.time_bucket = time_bucket
+        self.trees = {}
+        self.hits = 0
+        self.misses = 0
+        self._snapshot = None
+        self._bucket = None
+
+    def advance(self, time: int) -> None:
+        """Tell the router the current simulation time.
+
+        In bucket mode this takes a new cost snapshot when a new bucket starts.
+        Call it at the start of every time step, before any vehicle is routed.
+
+        Args:
+            time (int): Current simulation time
+        """
+        if self.time_bucket is None:
+            return
+        bucket = int(time // self.time_bucket)
+        if bucket != self._bucket:
+            self._bucket = bucket
+            self._snapshot = self.graph.link_costs()
+
+    def costs(self) -> np.ndarray:
+        """Link costs used for routing right now.
+
+        Returns:
+            np.ndarray: Travel time per link, indexed by the edge "index" attribute
+        """
+        if self.time_bucket is None or self._snapshot is None:
+            return self.graph.link_costs()
+        return self._snapshot
+
+    def next_hop(self, from_: str, to_: str) -> list:
+        """Next link on the shortest path from from_ to to_.
+
+        Args:
+            from_ (str): Current node
+            to_ (str): Final destination
+
+        Returns:
+            list: [from_, next_node], or None if from_ is the destination
+
+        Raises:
+            nx.NetworkXNoPath: If to_ cannot be reached from from_
+        """
+        if from_ == to_:
+            return None
+        costs = self.costs()
+        tree = self.trees.get(to_)
+        if tree is not None and self._is_valid(tree[0], costs):
+            self.hits += 1
+        else:
+            self.misses += 1
+            tree = (costs, self._build_tree(to_, costs))
+            self.trees[to_] = tree
+        if from_ not in tree[1]:
+            raise nx.NetworkXNoPath(f"Node {to_} not reachable from {from_}")
+        return [from_, tree[1][from_]]
+
+    def _is_valid(self, tree_costs: np.ndarray, costs: np.ndarray) -> bool:
+        """Check whether the costs a tree was built with are still close enough."""
+        if tree_costs is costs:
+            return True
+        if self.tolerance <= 0:
+            return np.array_equal(tree_costs, costs)
+        return bool(np.all(np.abs(costs - tree_costs) <= self.tolerance * tree_costs))
+
+    def _build_tree(self, destination: str, costs: np.ndarray) -> dict:
+        """Shortest-path tree towards one destination.
+
+        Args:
+            destination (str): Destination node
+            costs (np.ndarray): Link costs
+
+        Returns:
+            dict: Maps every node that reaches the destination to its next node
+        """
+        paths = nx.shortest_path(self.graph.graph, target=destination,
+                                 weight=lambda u, v, data: costs[data["index"]])
+        return {node: path[1] for node, path in paths.items() if len(path) >= 2}
+
+    def report(self) -> dict:
+        """Cache counters for tuning the tolerance.
+
+        Returns:
+            dict: hits, misses, hit_rate and number of cached trees
+        """
+        queries = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / queries if queries else 0.0,
+                "trees": len(self.trees)}
@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+
+
+class State_Store:
+    """Columnar in-memory store for vehicle states and their movement history.
+
+    The store keeps two things apart:
+    - The current state of every vehicle, held in preallocated NumPy arrays
+      indexed by a vehicle slot. Updating a vehicle is O(1).
+    - The history log, an append-only list of fixed-size chunks. A chunk is a
+      NumPy structured array, so appending a row never copies old rows.
+
+    Node ids, lights and vehicle types are stored as integer codes and only
+    decoded when the history is exported with `to_frame()`.
+
+    Attributes:
+        node_ids (list): Node id (str) for each node code
+        node_index (dict): Maps node ids to node codes
+        ids (list): Vehicle id (str) for each slot
+        slots (dict): Maps vehicle ids to slots
+        capacity (int): Number of preallocated vehicle slots
+        chunk_size (int): Number of rows in each history chunk
+
+    Example:
+        >>> store = State_Store(nodes=["1", "2", "3"])
+        >>> slot = store.add(vehicle_id="7", type_="AV")
+        >>> store.record(slot, time=0, origin="1", destination="2", lane=3, block=0,
+        ...              arrival_time=0, stuck_time=0, light="none")
+        >>> store.sorted_active_ids()
+        ['7']
+        >>> store.link_counts()
+        {('1', '2'): 1}
+    """
+
+    COLUMNS = ["time", "vehicle_id", "origin", "destination", "lane", "block",
+               "arrival_time", "stuck_time", "active", "light", "type"]
+    LIGHTS = ["none", "red", "green"]
+    TYPES = ["HDV", "AV"]
+    ROW = np.dtype([("time", np.int64),
+                    ("slot", np.int32),
+                    ("origin", np.int32),
+                    ("destination", np.int32),
+                    ("lane", np.int8),
+                    ("block", np.int32),
+                    ("arrival_time", np.int64),
+                    ("stuck_time", np.int64),
+                    ("light", np.int8)])
+
+    def __init__(self, nodes: list, capacity: int = 1024, chunk_size: int = 65536):
+        """Initialize an empty store.
+
+        Args:
+            nodes (list): Node ids of the network graph
+            capacity (int, optional): Initial number of vehicle slots. Grows on demand. Defaults to 1024.
+            chunk_size (int, optional): Rows per history chunk. Defaults to 65536.
+        """
+        self.node_ids = [str(node) for node in nodes]
+        self.node_index = {node: i for i, node in enumerate(self.node_ids)}
+        self._light_index = {light: i for i, light in enumerate(self.LIGHTS)}
+        self.ids = []
+        self.slots = {}
+        self.capacity = 0
+        self.chunk_size = int(chunk_size)
+        self._chunks = []
+        self._rows = 0
+
+        # Current state, one entry per vehicle slot
+        self.time = np.zeros(0, dtype=np.int64)
+        self.origin = np.zeros(0, dtype=np.int32)
+        self.destination = np.zeros(0, dtype=np.int32)
+        self.lane = np.zeros(0, dtype=np.int8)
+        self.block = np.zeros(0, dtype=np.int32)
+        self.arrival_time = np.zeros(0, dtype=np.int64)
+        self.stuck_time = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        self.light = np.zeros(0, dtype=np.int8)
+        self.type = np.zeros(0, dtype=np.int8)
+        self.last_row = np.zeros(0, dtype=np.int64)
+        self.reserve(capacity)
+
+    def __len__(self) -> int:
+        """Number of rows in the history log."""
+        return self._rows
+
+    @property
+    def empty(self) -> bool:
+        """True if nothing has been recorded yet (same meaning as `DataFrame.empty`)."""
+        return self._rows == 0
+
+    def reserve(self, capacity: int) -> None:
+        """Make sure at least `capacity` vehicle slots are preallocated.
+
+        Args:
+            capacity (int): Required number of slots
+        """
+        if capacity <= self.capacity:
+            return
+        for name in ["time", "origin", "destination", "lane", "block", "arrival_time",
+                     "stuck_time", "active", "light", "type", "last_row"]:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def add(self, vehicle_id: str, type_: str) -> int:
+        """Register a new vehicle and return its slot.
+
+        Args:
+            vehicle_id (str): Unique vehicle identifier
+            type_ (str): Vehicle type ("HDV" or "AV")
+
+        Returns:
+            int: Slot of the vehicle in the state arrays
+        """
+        slot = len(self.ids)
+        if slot >= self.capacity:
+            self.reserve(max(2 * self.capacity, 1))
+        self.ids.append(vehicle_id)
+        self.slots[vehicle_id] = slot
+        self.type[slot] = self.TYPES.index(type_.upper())
+        self.last_row[slot] = -1
+        return slot
+
+    def record(self, slot: int, time: int, origin: str, destination: str, lane: int, block: int,
+               arrival_time: int, stuck_time: int, light: str) -> None:
+        """Set the current state of a vehicle and append it to the history log.
+
+        This replaces marking the old rows of the vehicle inactive and appending a new
+        active row to the statistics frame. Both steps are O(1) here.
+
+        Args:
+            slot (int): Slot of the vehicle
+            time (int): Current simulation time
+            origin (str): Current node
+            destination (str): Next node
+            lane (int): Current lane (0-4)
+            block (int): Block position in lane
+            arrival_time (int): Time the vehicle arrived at the current link
+            stuck_time (int): Time the vehicle has been stuck
+            light (str): Light status ("none", "red" or "green")
+        """
+        origin = self.node_index[origin]
+        destination = self.node_index[destination]
+        light = self._light_index[light]
+        self.time[slot] = time
+        self.origin[slot] = origin
+        self.destination[slot] = destination
+        self.lane[slot] = lane
+        self.block[slot] = block
+        self.arrival_time[slot] = arrival_time
+        self.stuck_time[slot] = stuck_time
+        self.light[slot] = light
+        self.active[slot] = True
+
+        position = self._rows % self.chunk_size
+        if position == 0:
+            self._chunks.append(np.zeros(self.chunk_size, dtype=self.ROW))
+        self._chunks[-1][position] = (time, slot, origin, destination, lane, block,
+                                      arrival_time, stuck_time, light)
+        self.last_row[slot] = self._rows
+        self._rows += 1
+
+    def deactivate(self, slot: int) -> None:
+        """Mark a vehicle as out of the system.
+
+        Args:
+            slot (int): Slot of the vehicle
+        """
+        self.active[slot] = False
+
+    def active_slots(self) -> np.ndarray:
+        """Slots of the active vehicles, ordered by their last record.
+
+        This is the order in which the active rows appeared in the old statistics frame.
+
+        Returns:
+            np.ndarray: Slots of active vehicles
+        """
+        n = len(self.ids)
+        slots = np.flatnonzero(self.active[:n])
+        return slots[np.argsort(self.last_row[slots], kind="stable")]
+
+    def sorted_active_ids(self) -> list:
+        """Active vehicle ids sorted by arrival time plus stuck time.
+
+        Ties keep the order of the last record (stable sort).
+
+        Returns:
+            list: Sorted vehicle ids
+        """
+        slots = self.active_slots()
+        key = self.arrival_time[slots] + self.stuck_time[slots]
+        slots = slots[np.argsort(key, kind="stable")]
+        return [self.ids[slot] for slot in slots]
+
+    def link_counts(self) -> dict:
+        """Number of active vehicles on each link.
+
+        Returns:
+            dict: Maps (origin, destination) node ids to vehicle counts
+        """
+        slots = np.flatnonzero(self.active[:len(self.ids)])
+        links = self.origin[slots].astype(np.int64) * len(self.node_ids) + self.destination[slots]
+        links, counts = np.unique(links, return_counts=True)
+        n = len(self.node_ids)
+        return {(self.node_ids[link // n], self.node_ids[link % n]): int(count)
+                for link, count in zip(links, counts)}
+
+    def active_blocks(self, origin: str, destination: str, lanes: list) -> np.ndarray:
+        """Block positions of the active vehicles on one link and a group of lanes.
+
+        Args:
+            origin (str): Link start node
+            destination (str): Link end node
+            lanes (list): Lane numbers to include
+
+        Returns:
+            np.ndarray: Block positions of the matching vehicles
+        """
+        n = len(self.ids)
+        mask = (self.active[:n]
+                & (self.origin[:n] == self.node_index[str(origin)])
+                & (self.destination[:n] == self.node_index[str(destination)])
+                & np.isin(self.lane[:n], lanes))
+        return self.block[:n][mask]
+
+    def history(self) -> np.ndarray:
+        """The history log as one structured array.
+
+        Returns:
+            np.ndarray: History rows (see `ROW` for the fields)
+        """
+        if not self._chunks:
+            return np.zeros(0, dtype=self.ROW)
+        rows = np.concatenate(self._chunks)
+        return rows[:self._rows]
+
+    def to_frame(self) -> pd.DataFrame:
+        """Export the history log in the layout of the old statistics frame.
+
+        A row is active if it is the last record of a vehicle that is still in the system.
+
+        Returns:
+            pd.DataFrame: One row per record, with the columns in `COLUMNS`
+        """
+        rows = self.history()
+        slots = rows["slot"]
+        node_ids = np.array(self.node_ids, dtype=object)
+        ids = np.array(self.ids, dtype=object)
+        index = np.arange(len(rows))
+        return pd.DataFrame({
+            "time": rows["time"],
+            "vehicle_id": ids[slots],
+            "origin": node_ids[rows["origin"]],
+            "destination": node_ids[rows["destination"]],
+            "lane": rows["lane"],
+            "block": rows["block"],
+            "arrival_time": rows["arrival_time"],
+            "stuck_time": rows["stuck_time"],
+            "active": (self.last_row[slots] == index) & self.active[slots],
+            "light": np.array(self.LIGHTS, dtype=object)[rows["light"]],
+            "type": np.array(self.TYPES, dtype=object)[self.type[slots]],
+        }, columns=self.COLUMNS)